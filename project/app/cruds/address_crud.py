@@ -1,4 +1,16 @@
 from ..models import Address
+from django.utils import timezone
+
+ADDRESS_FIELDS = [
+    "street",
+    "number",
+    "complement",
+    "neighborhood",
+    "city",
+    "state",
+    "cep",
+    "country",
+]
 
 
 class AddressCrud:
@@ -26,15 +38,57 @@ class AddressCrud:
         except Address.DoesNotExist:
             raise ValueError("Address not found")
 
+    @staticmethod
+    def set_field(address, key, value):
+        # The cached coordinates belong to the old address
+        if key in ADDRESS_FIELDS and getattr(address, key) != value:
+            AddressCrud.clear_geocode(address)
+
+        setattr(address, key, value)
+
     @staticmethod
     def update(address_id, **kwargs):
         address = AddressCrud.read_by_id(address_id)
         for key, value in kwargs.items():
-            setattr(address, key, value)
+            AddressCrud.set_field(address, key, value)
 
         address.save()
         return address
 
+    @staticmethod
+    def save_geocode(address, latitude, longitude, level):
+        address.latitude = latitude
+        address.longitude = longitude
+        address.geocode_level = level
+        address.geocoded_at = timezone.now()
+        address.save(
+            update_fields=["latitude", "longitude", "geocode_level", "geocoded_at"]
+        )
+        return address
+
+    @staticmethod
+    def clear_geocode(address):
+        address.latitude = None
+        address.longitude = None
+        address.geocode_level = None
+        address.geocoded_at = None
+        address.graph_node = None
+        address.graph_version = None
+
+    @staticmethod
+    def read_geocoded_by_city(city, state, country):
+        return Address.objects.filter(
+            city=city, state=state, country=country, latitude__isnull=False
+        )
+
+    @staticmethod
+    def save_graph_nodes(addresses, nodes, version):
+        for address, node in zip(addresses, nodes):
+            address.graph_node = node
+            address.graph_version = version
+
+        Address.objects.bulk_update(addresses, ["graph_node", "graph_version"])
+
     @staticmethod
     def delete(address_id):
         address = AddressCrud.read_by_id(address_id)
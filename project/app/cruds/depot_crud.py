@@ -1,5 +1,5 @@
 from ..models import Depot
-from .address_crud import AddressCrud
+from .address_crud import AddressCrud, ADDRESS_FIELDS
 from .user_crud import UserCrud
 from ..exception_errors import UserRoleError, PlacePermissionError
 
@@ -52,22 +52,24 @@ class DepotCrud:
         user = UserCrud.read_by_email(user_email)
         return Depot.objects.filter(user=user)
 
+    @staticmethod
+    def read_cities():
+        """Distinct ``(city, state, country)`` of the depots."""
+        return (
+            Depot.objects.values_list(
+                "address__city", "address__state", "address__country"
+            )
+            .order_by("address__country", "address__state", "address__city")
+            .distinct()
+        )
+
     @staticmethod
     def update(depot_id, **kwargs):
         depot = DepotCrud.read_by_id(depot_id)
         address = depot.address
         for key, value in kwargs.items():
-            if key in [
-                "street",
-                "number",
-                "complement",
-                "neighborhood",
-                "city",
-                "state",
-                "cep",
-                "country",
-            ]:
-                setattr(address, key, value)
+            if key in ADDRESS_FIELDS:
+                AddressCrud.set_field(address, key, value)
             elif key == "user":
                 raise PlacePermissionError(
                     "Update user denied. Update user is a User Permission"
@@ -1,5 +1,5 @@
 from ..models import Store
-from .address_crud import AddressCrud
+from .address_crud import AddressCrud, ADDRESS_FIELDS
 from .user_crud import UserCrud
 from ..exception_errors import UserRoleError, PlacePermissionError
 
@@ -57,17 +57,8 @@ class StoreCrud:
         store = StoreCrud.read_by_id(store_id)
         address = store.address
         for key, value in kwargs.items():
-            if key in [
-                "street",
-                "number",
-                "complement",
-                "neighborhood",
-                "city",
-                "state",
-                "cep",
-                "country",
-            ]:
-                setattr(address, key, value)
+            if key in ADDRESS_FIELDS:
+                AddressCrud.set_field(address, key, value)
             elif key == "user":
                 raise PlacePermissionError(
                     "Update user denied. Update user is a User Permission"
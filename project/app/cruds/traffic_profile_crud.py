@@ -0,0 +1,20 @@
+from ..models import TrafficProfile
+
+
+class TrafficProfileCrud:
+    @staticmethod
+    def read():
+        return TrafficProfile.objects.all()
+
+    @staticmethod
+    def read_by_road_class(road_class):
+        return TrafficProfile.objects.filter(road_class=road_class).order_by("hour")
+
+    @staticmethod
+    def set_speed_factor(road_class, hour, speed_factor):
+        profile, _ = TrafficProfile.objects.get_or_create(
+            road_class=road_class, hour=hour, defaults={"speed_factor": speed_factor}
+        )
+        profile.speed_factor = speed_factor
+        profile.save()
+        return profile
@@ -2,6 +2,13 @@ from ..models import Trip
 from .depot_crud import DepotCrud
 from ..exception_errors import StatusError
 
+# Fields sent by the API: the packed route is served by the route endpoints
+TRIP_FIELDS = [
+    field.attname
+    for field in Trip._meta.concrete_fields
+    if field.name not in ["route_path", "route_edges"]
+]
+
 
 class TripCrud:
     @staticmethod
@@ -10,11 +17,14 @@ class TripCrud:
         total_loaded_weight_kg,
         total_loaded_volume_m3,
         total_distance_km,
+        route_path=None,
+        route_edges=None,
+        truck=None,
     ):
         depot = DepotCrud.read_by_id(depot_id)
 
         return Trip.objects.create(
-            truck=None,
+            truck=truck,
             origin_depot=depot,
             departure_date=None,
             arrival_date=None,
@@ -23,6 +33,8 @@ class TripCrud:
             total_distance_km=total_distance_km,
             carbon_kg_co2=None,
             status="Plan",
+            route_path=route_path,
+            route_edges=route_edges,
         )
 
     @staticmethod
@@ -0,0 +1,103 @@
+from ..models import TripJob
+from .depot_crud import DepotCrud
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+
+class TripJobCrud:
+    @staticmethod
+    def create(
+        user,
+        depot_id,
+        orders,
+        strategy=None,
+        render=False,
+        optimize=None,
+        departure=None,
+        kind="Trip",
+        trucks=None,
+    ):
+        depot = DepotCrud.read_by_id(depot_id)
+
+        return TripJob.objects.create(
+            user=user,
+            depot=depot,
+            kind=kind,
+            orders=orders,
+            trucks=trucks,
+            strategy=strategy,
+            render=render,
+            optimize=optimize,
+            departure=departure,
+            status="Queu",
+        )
+
+    @staticmethod
+    def read_by_id(job_id):
+        try:
+            return TripJob.objects.get(id=job_id)
+        except TripJob.DoesNotExist:
+            raise ValueError("Trip job not found")
+
+    @staticmethod
+    def claim_next():
+        """Marks the oldest queued job as running, or returns None if there is none."""
+        TripJobCrud.fail_stopped()
+        with transaction.atomic():
+            # skip_locked lets several workers poll the same table
+            job = (
+                TripJob.objects.select_for_update(skip_locked=True)
+                .filter(status="Queu")
+                .order_by("created_at", "id")
+                .first()
+            )
+            if job is None:
+                return None
+
+            job.status = "Runn"
+            job.started_at = timezone.now()
+            job.save()
+            return job
+
+    @staticmethod
+    def fail_stopped():
+        """Fails the jobs running for over ``ROUTING_JOB_TIMEOUT`` seconds.
+
+        Their worker stopped (crashed, killed, redeployed) without finishing
+        them. They are not queued again: part of the trip may have been
+        created. Returns how many jobs were failed.
+        """
+        if not settings.ROUTING_JOB_TIMEOUT:
+            return 0
+
+        started = timezone.now() - timedelta(seconds=settings.ROUTING_JOB_TIMEOUT)
+        return TripJob.objects.filter(status="Runn", started_at__lt=started).update(
+            status="Fail",
+            error="The worker stopped before finishing the job",
+            finished_at=timezone.now(),
+        )
+
+    @staticmethod
+    def set_phase(job, phase):
+        job.phase = phase
+        job.save(update_fields=["phase"])
+        return job
+
+    @staticmethod
+    def finish(job, trip, result):
+        job.status = "Done"
+        job.trip = trip
+        job.result = result
+        job.finished_at = timezone.now()
+        job.save()
+        return job
+
+    @staticmethod
+    def fail(job, error):
+        job.status = "Fail"
+        job.error = error
+        job.finished_at = timezone.now()
+        job.save()
+        return job
@@ -0,0 +1,23 @@
+from ..models import TripStop
+
+
+class TripStopCrud:
+    @staticmethod
+    def create_stops(trip, stops):
+        """Stores the stops of the trip in visiting order.
+
+        Each stop is a dict with its ``address``, ``order`` (None for the
+        depot), ``leg_distance_m`` and ``leg_duration_s``.
+        """
+        return TripStop.objects.bulk_create(
+            TripStop(trip=trip, position=position, **stop)
+            for position, stop in enumerate(stops)
+        )
+
+    @staticmethod
+    def read_by_trip(trip_id):
+        return list(
+            TripStop.objects.filter(trip_id=trip_id)
+            .select_related("address")
+            .order_by("position")
+        )
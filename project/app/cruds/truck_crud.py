@@ -65,6 +65,20 @@ class TruckCrud:
         except Truck.DoesNotExist:
             raise ValueError("Truck not found")
 
+    @staticmethod
+    def read_available_trucks():
+        return Truck.objects.filter(is_active=False).exclude(trip__status="Plan")
+
+    @staticmethod
+    def read_reserved_trucks():
+        """Trucks a planned trip was packed for."""
+        return Truck.objects.filter(trip__status="Plan").distinct()
+
+    @staticmethod
+    def lock_trucks(truck_ids):
+        """The trucks, locked until the end of the current transaction."""
+        return list(Truck.objects.select_for_update().filter(id__in=truck_ids))
+
     @staticmethod
     def read_trucks_by_carrier(carrier_id):
         carrier = CarrierCrud.read_by_id(carrier_id)
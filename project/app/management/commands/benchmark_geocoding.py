@@ -0,0 +1,71 @@
+import time
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from app.models import Address
+from app.services.geocoding_service import GeocodingService
+from .geocoder_standin import StandInGeocoder
+
+
+class Command(BaseCommand):
+    help = "Benchmarks batch geocoding against a local stand-in geocoder."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--addresses", type=int, default=40)
+        parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+        parser.add_argument(
+            "--latency", type=float, default=0.2, help="Seconds per answer."
+        )
+        parser.add_argument(
+            "--rate", type=float, default=20, help="Requests per second allowed."
+        )
+        parser.add_argument("--miss-rate", type=float, default=0.3)
+        parser.add_argument("--error-rate", type=float, default=0.05)
+
+    def handle(self, *args, **options):
+        server = StandInGeocoder(
+            ("127.0.0.1", 0),
+            options["latency"],
+            options["miss_rate"],
+            options["error_rate"],
+        ).start()
+
+        addresses = [
+            Address(
+                street=f"Rua {i}",
+                number=str(i),
+                neighborhood=f"Bairro {i % 7}",
+                city="Macaé",
+                state="RJ",
+                cep="27910-000",
+                country="Brasil",
+            )
+            for i in range(options["addresses"])
+        ]
+
+        self.stdout.write(
+            f"{len(addresses)} addresses, {options['latency'] * 1000:.0f} ms per "
+            f"answer, at most {options['rate']:g} requests/s"
+        )
+        self.stdout.write("  workers       time   requests   found   speedup")
+
+        with override_settings(
+            GEOCODING_DOMAIN=server.domain,
+            GEOCODING_SCHEME="http",
+            GEOCODING_RATE_LIMIT=options["rate"],
+            GEOCODING_BACKOFF=0.05,
+        ):
+            serial_time = None
+            for workers in options["workers"]:
+                server.requests = 0
+                start = time.perf_counter()
+                results = GeocodingService.resolve_batch(addresses, workers)
+                elapsed = time.perf_counter() - start
+                serial_time = serial_time or elapsed
+
+                found = sum(level is not None for level, _ in results)
+                self.stdout.write(
+                    f"  {workers:>7} {elapsed:>9.2f}s {server.requests:>10} "
+                    f"{found:>7} {serial_time / elapsed:>8.1f}x"
+                )
+
+        server.shutdown()
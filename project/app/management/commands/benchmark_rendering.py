@@ -0,0 +1,83 @@
+import os
+import random
+import tempfile
+import time
+import matplotlib.pyplot as plt
+from django.core.management.base import BaseCommand
+from app.management.commands.benchmark_routing import grid_graph
+from app.services.render_service import RENDER_PRESETS, RenderService
+from app.services.routing_service import CompactGraph, distance_matrix
+from app.services.trip_service import TripService
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the route images of the whole city against the route area."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=150, help="Grid side.")
+        parser.add_argument("--stops", type=int, default=8)
+        parser.add_argument(
+            "--spread",
+            type=int,
+            default=15,
+            help="Grid cells around the depot where the stops are drawn.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--preset", nargs="*", choices=list(RENDER_PRESETS), default=[]
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        size, spread = options["size"], options["spread"]
+        G = grid_graph(size, options["seed"])
+        G.graph["crs"] = "epsg:4326"
+        self.stdout.write(f"Grid {size}x{size}: {len(G)} nodes")
+
+        # A trip covers a neighbourhood, not the whole city
+        ci, cj = rng.randrange(size), rng.randrange(size)
+        area = [
+            i * size + j
+            for i in range(max(ci - spread, 0), min(ci + spread, size))
+            for j in range(max(cj - spread, 0), min(cj + spread, size))
+        ]
+        nodes = rng.sample(area, options["stops"] + 1)
+        matrix = distance_matrix(CompactGraph.from_graph(G), nodes)
+        route_order = list(range(len(nodes))) + [0]
+        geometry = TripService.route_geometry(
+            G,
+            nodes,
+            route_order,
+            [matrix.path(a, b) for a, b in zip(route_order, route_order[1:])],
+            [f"Stop {i}" for i in range(len(nodes))],
+        )
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+
+            def draw(preset, area, dpi):
+                path = os.path.join(tmp_dir, f"{preset}-{area}.png")
+                start = time.perf_counter()
+                fig = RenderService.plot_route(G, geometry, preset, area)
+                fig.savefig(path, dpi=dpi)
+                plt.close(fig)
+                elapsed = time.perf_counter() - start
+                size_kb = os.path.getsize(path) / 1024
+
+                self.stdout.write(
+                    f"  {preset:<10} {area:<6} {dpi:>4} {elapsed:>8.2f}s "
+                    f"{size_kb:>8.0f} KB"
+                )
+                return elapsed, size_kb
+
+            self.stdout.write("  preset     area    dpi      time        size")
+            # What every planned trip used to draw: the whole city at 300 dpi
+            city_time, city_size = draw("standard", "city", 300)
+
+            for preset in options["preset"] or RENDER_PRESETS:
+                elapsed, size_kb = draw(preset, "route", RENDER_PRESETS[preset]["dpi"])
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"  {preset}: {city_time / elapsed:.1f}x faster, "
+                        f"{city_size / size_kb:.1f}x smaller"
+                    )
+                )
@@ -0,0 +1,380 @@
+import heapq
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+import networkx as nx
+from django.core.management.base import BaseCommand, CommandError
+from app.services.hierarchy_service import ContractionHierarchy
+from app.services.tour_service import (
+    held_karp,
+    improve_tour,
+    nearest_neighbour_tour,
+    tour_length,
+)
+from app.services.routing_service import (
+    CompactGraph,
+    SEARCH_STRATEGIES,
+    dijkstra,
+    distance_matrix,
+    shortest_path,
+)
+
+
+def grid_graph(size, seed=0):
+    """Synthetic street grid: two-way streets with random lengths in meters."""
+    rng = random.Random(seed)
+    G = nx.MultiDiGraph()
+
+    for i in range(size):
+        for j in range(size):
+            node = i * size + j
+            G.add_node(node, x=-41.3 + j * 0.001, y=-21.75 + i * 0.001)
+            for di, dj in ((0, 1), (1, 0)):
+                a, b = i + di, j + dj
+                if a < size and b < size:
+                    length = rng.uniform(100.0, 140.0)
+                    G.add_edge(node, a * size + b, length=length)
+                    G.add_edge(a * size + b, node, length=length)
+
+    return G
+
+
+def legacy_dijkstra(G, start, target, weight="length"):
+    """Dijkstra over the NetworkX graph, as define_route used to run it."""
+    dist = {node: float("inf") for node in G.nodes()}
+    dist[start] = 0
+    prev = {}
+    pq = [(0, start)]
+
+    while pq:
+        current_dist, u = heapq.heappop(pq)
+
+        if u == target:
+            path = []
+            while u is not None:
+                path.append(u)
+                u = prev.get(u)
+            return current_dist, list(reversed(path))
+
+        if current_dist > dist[u]:
+            continue
+
+        for v in G.neighbors(u):
+            edge_data = G.get_edge_data(u, v)
+            w = min(ed.get(weight, 1) for ed in edge_data.values())
+            new_dist = current_dist + w
+
+            if new_dist < dist[v]:
+                dist[v] = new_dist
+                prev[v] = u
+                heapq.heappush(pq, (new_dist, v))
+
+    return float("inf"), []
+
+
+def graph_memory(path):
+    """MB this process spends on the graph file at ``path``.
+
+    Its private pages, plus its share of the pages of ``path`` it maps,
+    split evenly with the other processes mapping them. Linux only: read
+    from ``/proc/self/smaps``.
+    """
+    private = shared = 0
+    in_file = False
+    with open("/proc/self/smaps") as f:
+        for line in f:
+            fields = line.split()
+            if not fields[0].endswith(":"):
+                # Header of the next mapping, ending with its file, if any
+                in_file = fields[-1] == os.path.realpath(path)
+            elif in_file and fields[0] == "Pss:":
+                shared += int(fields[1])
+            elif not in_file and fields[0] in ("Private_Clean:", "Private_Dirty:"):
+                private += int(fields[1])
+
+    return private / 1024, shared / 1024
+
+
+def memory_worker(path, mmap, barrier, results):
+    """Loads the graph file like a web worker would and reports the memory it took."""
+    before, _ = graph_memory(path)
+    graph = CompactGraph.load(path, mmap)
+    # Touch every page, as searches all over the city eventually do
+    arrays = [graph.node_ids, graph.offsets, graph.targets, graph.weights]
+    arrays += [graph.lats, graph.lons, graph.index.sorted_ids, graph.index.positions]
+    for array in arrays + list(graph.reverse()):
+        array.sum()
+
+    # Measure only once every worker holds the graph, so mapped pages are split
+    barrier.wait()
+    private, shared = graph_memory(path)
+    results.put(private - before + shared)
+    barrier.wait()
+
+
+def workers_memory(path, workers, mmap):
+    """Total memory, in MB, that ``workers`` processes take to load the graph.
+
+    The workers are spawned, so none starts out sharing pages with this one.
+    """
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=memory_worker, args=(path, mmap, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+
+    return total
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the routing algorithms on a synthetic grid graph."
+
+    suites = [
+        "dijkstra",
+        "matrix",
+        "parallel",
+        "search",
+        "hierarchy",
+        "held_karp",
+        "memory",
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "suite", nargs="*", help=f"Suites to run: {', '.join(self.suites)}."
+        )
+        parser.add_argument("--size", type=int, default=100, help="Grid side.")
+        parser.add_argument("--queries", type=int, default=20)
+        parser.add_argument("--stops", type=int, default=15)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Largest process pool of the parallel and memory suites.",
+        )
+
+    def handle(self, *args, **options):
+        for suite in options["suite"]:
+            if suite not in self.suites:
+                raise CommandError(f"Unknown suite: {suite}")
+
+        self.rng = random.Random(options["seed"])
+        self.options = options
+
+        start = time.perf_counter()
+        self.G = grid_graph(options["size"], options["seed"])
+        self.stdout.write(
+            f"Grid {options['size']}x{options['size']}: {len(self.G)} nodes, "
+            f"{self.G.number_of_edges()} edges ({time.perf_counter() - start:.2f}s)"
+        )
+
+        for suite in options["suite"] or self.suites:
+            getattr(self, f"bench_{suite}")()
+
+    def random_pairs(self):
+        nodes = list(self.G.nodes)
+        return [
+            (self.rng.choice(nodes), self.rng.choice(nodes))
+            for _ in range(self.options["queries"])
+        ]
+
+    def random_stops(self):
+        return self.rng.sample(list(self.G.nodes), self.options["stops"])
+
+    def bench_dijkstra(self):
+        self.stdout.write(self.style.MIGRATE_HEADING("Dijkstra: NetworkX x CSR"))
+
+        start = time.perf_counter()
+        graph = CompactGraph.from_graph(self.G)
+        self.stdout.write(f"  CSR build: {time.perf_counter() - start:.3f}s")
+
+        pairs = self.random_pairs()
+
+        start = time.perf_counter()
+        legacy = [legacy_dijkstra(self.G, s, t) for s, t in pairs]
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        compact = [dijkstra(graph, s, t) for s, t in pairs]
+        compact_time = time.perf_counter() - start
+
+        for (expected, _), (found, _) in zip(legacy, compact):
+            if abs(expected - found) > 1e-6:
+                raise CommandError(f"Distance mismatch: {expected} != {found}")
+
+        queries = len(pairs)
+        self.stdout.write(f"  NetworkX: {legacy_time / queries * 1000:.1f} ms/query")
+        self.stdout.write(f"  CSR:      {compact_time / queries * 1000:.1f} ms/query")
+        self.stdout.write(
+            self.style.SUCCESS(f"  Speedup:  {legacy_time / compact_time:.1f}x")
+        )
+
+    def bench_matrix(self):
+        self.stdout.write(
+            self.style.MIGRATE_HEADING("Stop matrix: pairwise x one-to-many")
+        )
+        graph = CompactGraph.from_graph(self.G)
+        stops = self.random_stops()
+
+        start = time.perf_counter()
+        pairwise = [[dijkstra(graph, s, t)[0] for t in stops] for s in stops]
+        pairwise_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        matrix = distance_matrix(graph, stops)
+        matrix_time = time.perf_counter() - start
+
+        if abs(matrix.distances - pairwise).max() > 1e-6:
+            raise CommandError("Distance matrix does not match pairwise searches")
+
+        self.stdout.write(f"  {len(stops)} stops, pairwise: {pairwise_time:.2f}s")
+        self.stdout.write(f"  {len(stops)} stops, one-to-many: {matrix_time:.2f}s")
+        self.stdout.write(
+            self.style.SUCCESS(f"  Speedup:  {pairwise_time / matrix_time:.1f}x")
+        )
+
+    def bench_parallel(self):
+        self.stdout.write(
+            self.style.MIGRATE_HEADING("Stop matrix: 1 to N worker processes")
+        )
+        graph = CompactGraph.from_graph(self.G)
+        stops = self.random_stops()
+        expected = None
+
+        self.stdout.write(f"  {len(stops)} stops, {os.cpu_count()} CPU cores")
+        self.stdout.write("  workers       time   speedup")
+        for workers in range(1, self.options["workers"] + 1):
+            start = time.perf_counter()
+            matrix = distance_matrix(graph, stops, workers=workers)
+            elapsed = time.perf_counter() - start
+
+            if expected is None:
+                expected = matrix.distances
+                serial_time = elapsed
+            elif abs(matrix.distances - expected).max() > 1e-6:
+                raise CommandError(f"{workers} workers found different distances")
+
+            self.stdout.write(
+                f"  {workers:>7} {elapsed:>9.2f}s {serial_time / elapsed:>8.1f}x"
+            )
+
+    def bench_search(self):
+        self.stdout.write(
+            self.style.MIGRATE_HEADING("Point-to-point search strategies")
+        )
+        graph = CompactGraph.from_graph(self.G)
+        pairs = self.random_pairs()
+        expected = None
+
+        for strategy in SEARCH_STRATEGIES:
+            settled = 0
+            distances = []
+            start = time.perf_counter()
+            for s, t in pairs:
+                stats = {}
+                dist, _ = shortest_path(graph, s, t, strategy, stats)
+                settled += stats["settled"]
+                distances.append(dist)
+            elapsed = time.perf_counter() - start
+
+            if expected is None:
+                expected = distances
+            elif max(abs(a - b) for a, b in zip(expected, distances)) > 1e-6:
+                raise CommandError(f"{strategy} found a different distance")
+
+            self.stdout.write(
+                f"  {strategy:<14} {settled / len(pairs):>10.0f} settled/query "
+                f"{elapsed / len(pairs) * 1000:>8.1f} ms/query"
+            )
+
+    def bench_hierarchy(self):
+        self.stdout.write(self.style.MIGRATE_HEADING("Contraction hierarchy"))
+        graph = CompactGraph.from_graph(self.G)
+
+        start = time.perf_counter()
+        hierarchy = ContractionHierarchy.build(graph)
+        self.stdout.write(f"  Preprocessing: {time.perf_counter() - start:.1f}s")
+
+        pairs = self.random_pairs()
+        start = time.perf_counter()
+        for s, t in pairs:
+            hierarchy.shortest_path(s, t)
+        self.stdout.write(
+            f"  Point-to-point: "
+            f"{(time.perf_counter() - start) / len(pairs) * 1000:.2f} ms/query"
+        )
+
+        stops = self.random_stops()
+        start = time.perf_counter()
+        matrix = distance_matrix(graph, stops)
+        dijkstra_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ch_matrix = hierarchy.distance_matrix(stops)
+        ch_time = time.perf_counter() - start
+
+        if abs(matrix.distances - ch_matrix.distances).max() > 1e-6:
+            raise CommandError("Hierarchy matrix does not match Dijkstra")
+
+        self.stdout.write(
+            f"  {len(stops)} stops, Dijkstra matrix: {dijkstra_time:.3f}s"
+        )
+        self.stdout.write(f"  {len(stops)} stops, hierarchy matrix: {ch_time:.3f}s")
+
+    def bench_held_karp(self):
+        self.stdout.write(self.style.MIGRATE_HEADING("Held-Karp x heuristic tours"))
+        graph = CompactGraph.from_graph(self.G)
+        stops = self.rng.sample(list(self.G.nodes), 17)
+        distances = distance_matrix(graph, stops).distances
+
+        self.stdout.write("  stops   exact time   heuristic gap")
+        for count in range(4, len(stops)):
+            matrix = distances[: count + 1, : count + 1]
+
+            start = time.perf_counter()
+            exact = tour_length(matrix, held_karp(matrix))
+            elapsed = time.perf_counter() - start
+
+            heuristic = tour_length(
+                matrix, improve_tour(matrix, nearest_neighbour_tour(matrix))
+            )
+            self.stdout.write(
+                f"  {count:>5} {elapsed * 1000:>10.1f}ms "
+                f"{(heuristic / exact - 1) * 100:>14.1f}%"
+            )
+
+    def bench_memory(self):
+        self.stdout.write(
+            self.style.MIGRATE_HEADING("Graph memory: private copies x mapped file")
+        )
+        if not os.path.isfile("/proc/self/smaps"):
+            self.stdout.write("  Skipped: needs Linux /proc/self/smaps")
+            return
+
+        graph = CompactGraph.from_graph(self.G)
+        counts = sorted(
+            {1, self.options["workers"]}
+            | {2**i for i in range(self.options["workers"].bit_length())}
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "compact-length.bin")
+            graph.save(path)
+            self.stdout.write(f"  Graph file: {os.path.getsize(path) / 2**20:.1f} MB")
+
+            self.stdout.write("  workers   private copies   mapped file")
+            for workers in counts:
+                private = workers_memory(path, workers, mmap=False)
+                mapped = workers_memory(path, workers, mmap=True)
+                self.stdout.write(
+                    f"  {workers:>7} {private:>13.1f} MB {mapped:>10.1f} MB"
+                )
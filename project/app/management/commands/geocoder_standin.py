@@ -0,0 +1,108 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from django.core.management.base import BaseCommand
+
+
+class StandInGeocoder(ThreadingHTTPServer):
+    """Nominatim-compatible ``/search`` endpoint answering from a hash of the query.
+
+    Every answer waits ``latency`` seconds. A ``miss_rate`` share of the
+    queries is not found and an ``error_rate`` share fails with HTTP 503, so
+    the retries and the negative cache can be exercised too. Misses always
+    hit the same queries, errors are drawn again for every request.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.2, miss_rate=0.0, error_rate=0.0):
+        super().__init__(address, StandInHandler)
+        self.latency = latency
+        self.miss_rate = miss_rate
+        self.error_rate = error_rate
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def domain(self):
+        host, port = self.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        time.sleep(server.latency)
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query).get("q", [""])[0]
+        # Same query, same answer: a fraction in [0, 1) from its hash
+        digest = hashlib.sha256(query.encode()).digest()
+        draw = int.from_bytes(digest[:4]) / 2**32
+
+        if url.path != "/search":
+            self.send_error(404)
+            return
+        if random.random() < server.error_rate:
+            self.send_error(503)
+            return
+
+        places = []
+        if draw >= server.miss_rate:
+            places.append(
+                {
+                    "lat": str(-21.75 - int.from_bytes(digest[8:12]) / 2**32 * 0.1),
+                    "lon": str(-41.30 - int.from_bytes(digest[12:16]) / 2**32 * 0.1),
+                    "display_name": query,
+                }
+            )
+
+        body = json.dumps(places).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Runs a local stand-in for the Nominatim geocoder."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8080)
+        parser.add_argument(
+            "--latency", type=float, default=0.2, help="Seconds per answer."
+        )
+        parser.add_argument("--miss-rate", type=float, default=0.0)
+        parser.add_argument("--error-rate", type=float, default=0.0)
+
+    def handle(self, *args, **options):
+        server = StandInGeocoder(
+            (options["host"], options["port"]),
+            options["latency"],
+            options["miss_rate"],
+            options["error_rate"],
+        )
+        self.stdout.write(
+            f"Stand-in geocoder on http://{server.domain}/search "
+            f"(use GEOCODING_DOMAIN={server.domain} GEOCODING_SCHEME=http)"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
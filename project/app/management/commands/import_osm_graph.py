@@ -0,0 +1,53 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from app.services.graph_service import GraphService
+from app.services.tile_service import TileService
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the road graph of a city from a local OpenStreetMap extract "
+        "(.osm XML or .pbf) and its boundary polygon (GeoJSON or .poly), and "
+        "stores it in the graph cache used to plan trips."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--city", required=True)
+        parser.add_argument("--state", required=True)
+        parser.add_argument("--country", default="Brasil")
+        parser.add_argument("--network-type", default="drive")
+        parser.add_argument("--osm", required=True, help="Path of the OSM extract")
+        parser.add_argument(
+            "--boundary", required=True, help="Path of the city boundary polygon"
+        )
+        parser.add_argument(
+            "--tiles",
+            action="store_true",
+            help="Also store the graph in the map tiles used by trips between cities.",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Importing the road graph of {options['city']}...")
+        start = time.perf_counter()
+
+        try:
+            G = GraphService.import_graph(
+                options["city"],
+                options["state"],
+                options["country"],
+                options["osm"],
+                options["boundary"],
+                options["network_type"],
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+        if options["tiles"]:
+            tiles = TileService.split_graph(G, options["network_type"], imported=True)
+            self.stdout.write(f"Stored in {len(tiles)} map tiles")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Road graph imported in {time.perf_counter() - start:.1f}s: "
+                f"{len(G)} nodes, {G.number_of_edges()} edges"
+            )
+        )
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from app.services.graph_service import GraphService
+from app.services.tile_service import TileService
+
+
+class Command(BaseCommand):
+    help = "Removes cached road graphs so the next trip downloads them again."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--city")
+        parser.add_argument("--state")
+        parser.add_argument("--country", default="Brasil")
+        parser.add_argument("--network-type", default="drive")
+        parser.add_argument(
+            "--all", action="store_true", help="Remove every cached road graph."
+        )
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            removed = GraphService.invalidate() + TileService.invalidate()
+        elif options["city"] and options["state"]:
+            removed = GraphService.invalidate(
+                options["city"],
+                options["state"],
+                options["country"],
+                options["network_type"],
+            )
+        else:
+            raise CommandError("Inform --city and --state, or use --all")
+
+        if not removed:
+            self.stdout.write("No cached graph found.")
+            return
+
+        for key in removed:
+            self.stdout.write(self.style.SUCCESS(f"Removed cached graph: {key}"))
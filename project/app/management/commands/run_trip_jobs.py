@@ -0,0 +1,59 @@
+import time
+from django.core.management.base import BaseCommand
+from app.cruds.trip_job_crud import TripJobCrud
+from app.services.job_service import JobService
+from app.services.warmup_service import WarmupService
+
+
+class Command(BaseCommand):
+    help = "Runs the queued trip planning jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Exit once the queue is empty."
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Seconds between polls of an empty queue.",
+        )
+        parser.add_argument(
+            "--warm",
+            action="store_true",
+            help="Load the routing caches of every depot city before the first job.",
+        )
+
+    def handle(self, *args, **options):
+        if options["warm"]:
+            self.stdout.write("Warming the routing caches of the depot cities...")
+            WarmupService.warm(log=self.stdout.write)
+
+        self.stdout.write("Waiting for trip jobs...")
+
+        while True:
+            job = TripJobCrud.claim_next()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["interval"])
+                continue
+
+            self.stdout.write(f"Running trip job {job.id}...")
+            job = JobService.run(job)
+            if job.status == "Done" and job.trip_id is None:
+                trips = ", ".join(str(trip["id"]) for trip in job.result["trips"])
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Trip job {job.id} planned {len(job.result['trips'])} "
+                        f"trips: {trips}"
+                    )
+                )
+            elif job.status == "Done":
+                self.stdout.write(
+                    self.style.SUCCESS(f"Trip job {job.id} planned trip {job.trip_id}")
+                )
+            else:
+                self.stdout.write(
+                    self.style.ERROR(f"Trip job {job.id} failed: {job.error}")
+                )
@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from app.services.warmup_service import WarmupService
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads the road graph, snapping index and search preprocessing of every "
+        "depot city, downloading or building what is not cached yet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Cities warmed at once. Defaults to the number of CPU cores.",
+        )
+        parser.add_argument(
+            "--build-hierarchies",
+            action="store_true",
+            help="Also build the contraction hierarchies that are missing.",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Warming the routing caches of the depot cities...")
+        start = time.perf_counter()
+
+        results = WarmupService.warm(
+            options["workers"], options["build_hierarchies"], log=self.stdout.write
+        )
+
+        failed = [place for place, result in results.items() if "error" in result]
+        if failed:
+            raise CommandError(
+                f"{len(failed)} of {len(results)} cities could not be warmed"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(results)} cities warmed in {time.perf_counter() - start:.1f}s"
+            )
+        )
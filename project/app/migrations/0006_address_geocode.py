@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0005_remove_order_scheduled"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="address",
+            name="geocode_level",
+            field=models.CharField(
+                choices=[
+                    ("Full", "Street, number and neighborhood"),
+                    ("Numb", "Street and number"),
+                    ("Stre", "Street"),
+                    ("Neig", "Neighborhood"),
+                ],
+                max_length=4,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="address",
+            name="geocoded_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name="address",
+            name="latitude",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="address",
+            name="longitude",
+            field=models.FloatField(null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0006_address_geocode"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="address",
+            name="graph_node",
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="address",
+            name="graph_version",
+            field=models.CharField(max_length=14, null=True),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0007_address_graph_node"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TripJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("orders", models.JSONField()),
+                ("strategy", models.CharField(max_length=20, null=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("Queu", "Queued"),
+                            ("Runn", "Running"),
+                            ("Done", "Done"),
+                            ("Fail", "Failed"),
+                        ],
+                        max_length=4,
+                    ),
+                ),
+                (
+                    "phase",
+                    models.CharField(
+                        choices=[
+                            ("Geoc", "Geocode"),
+                            ("Grap", "Graph"),
+                            ("Rout", "Route"),
+                            ("Rend", "Render"),
+                        ],
+                        max_length=4,
+                        null=True,
+                    ),
+                ),
+                ("result", models.JSONField(null=True)),
+                ("error", models.TextField(null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(null=True)),
+                ("finished_at", models.DateTimeField(null=True)),
+                (
+                    "depot",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="app.depot"
+                    ),
+                ),
+                (
+                    "trip",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="app.trip",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0008_tripjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tripjob",
+            name="render",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0009_tripjob_render"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trip",
+            name="route_path",
+            field=models.BinaryField(null=True),
+        ),
+        migrations.CreateModel(
+            name="TripStop",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("position", models.PositiveIntegerField()),
+                ("leg_distance_m", models.FloatField(default=0.0)),
+                ("leg_duration_s", models.FloatField(default=0.0)),
+                (
+                    "address",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="app.address",
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="app.order",
+                    ),
+                ),
+                (
+                    "trip",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stops",
+                        to="app.trip",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0010_trip_stops"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tripjob",
+            name="optimize",
+            field=models.CharField(max_length=20, null=True),
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:54
+
+import django.core.validators
+from django.db import migrations, models
+
+# Speed factor of the busy hours of each group of road classes; the other
+# hours run at free-flow speed
+ARTERIALS = [
+    "motorway",
+    "motorway_link",
+    "trunk",
+    "trunk_link",
+    "primary",
+    "primary_link",
+    "secondary",
+    "secondary_link",
+]
+LOCAL_ROADS = ["tertiary", "tertiary_link", "unclassified", "residential", "other"]
+DEFAULT_PROFILES = [
+    (
+        ARTERIALS,
+        {
+            6: 0.8,
+            7: 0.55,
+            8: 0.5,
+            9: 0.65,
+            10: 0.85,
+            12: 0.85,
+            13: 0.85,
+            16: 0.75,
+            17: 0.55,
+            18: 0.5,
+            19: 0.65,
+            20: 0.85,
+        },
+    ),
+    (LOCAL_ROADS, {7: 0.8, 8: 0.75, 9: 0.85, 12: 0.9, 17: 0.8, 18: 0.75, 19: 0.85}),
+]
+
+
+def create_traffic_profiles(apps, schema_editor):
+    TrafficProfile = apps.get_model("app", "TrafficProfile")
+    TrafficProfile.objects.bulk_create(
+        TrafficProfile(road_class=road_class, hour=hour, speed_factor=factor)
+        for road_classes, hours in DEFAULT_PROFILES
+        for road_class in road_classes
+        for hour, factor in hours.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0011_tripjob_optimize"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trip",
+            name="route_edges",
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name="tripjob",
+            name="departure",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.CreateModel(
+            name="TrafficProfile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("road_class", models.CharField(max_length=20)),
+                (
+                    "hour",
+                    models.PositiveSmallIntegerField(
+                        validators=[django.core.validators.MaxValueValidator(23)]
+                    ),
+                ),
+                (
+                    "speed_factor",
+                    models.FloatField(
+                        validators=[django.core.validators.MinValueValidator(0.01)]
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("road_class", "hour"),
+                        name="unique_traffic_profile_hour",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(create_traffic_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0012_traffic_profiles"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tripjob",
+            name="kind",
+            field=models.CharField(
+                choices=[("Trip", "Trip"), ("Plan", "Trip plan")],
+                default="Trip",
+                max_length=4,
+            ),
+        ),
+        migrations.AddField(
+            model_name="tripjob",
+            name="trucks",
+            field=models.JSONField(null=True),
+        ),
+        migrations.AlterField(
+            model_name="tripjob",
+            name="orders",
+            field=models.JSONField(null=True),
+        ),
+    ]
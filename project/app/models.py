@@ -71,6 +71,13 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
     #     super().save(*args, **kwargs)
 
 
+class GeocodeLevel(models.TextChoices):
+    FULL = "Full", "Street, number and neighborhood"
+    NUMB = "Numb", "Street and number"
+    STRE = "Stre", "Street"
+    NEIG = "Neig", "Neighborhood"
+
+
 class Address(models.Model):
     street = models.CharField(max_length=150)
     number = models.CharField(max_length=20)
@@ -80,6 +87,14 @@ class Address(models.Model):
     state = models.CharField(max_length=50)
     cep = models.CharField(max_length=10)
     country = models.CharField(max_length=100, default="Brasil")
+    latitude = models.FloatField(null=True)
+    longitude = models.FloatField(null=True)
+    geocode_level = models.CharField(
+        max_length=4, choices=GeocodeLevel.choices, null=True
+    )
+    geocoded_at = models.DateTimeField(null=True)
+    graph_node = models.BigIntegerField(null=True)
+    graph_version = models.CharField(max_length=14, null=True)
 
 
 class Store(models.Model):
@@ -148,6 +163,11 @@ class Trip(models.Model):
     total_distance_km = models.FloatField(default=0.0)
     carbon_kg_co2 = models.FloatField(null=True)
     status = models.CharField(max_length=4, choices=TripStatus.choices)
+    # Street path of every leg of the route, packed by geometry_service.pack_path
+    route_path = models.BinaryField(null=True)
+    # Free-flow time and road class of every street of the route, packed by
+    # TrafficService.pack_edges
+    route_edges = models.BinaryField(null=True)
 
     def save(self, *args, **kwargs):
         if self.status not in [choice[0] for choice in TripStatus.choices]:
@@ -212,3 +232,85 @@ class Box(models.Model):
             raise ValueError(f"Invalid Size: {self.size}")
 
         super().save(*args, **kwargs)
+
+
+class TripStop(models.Model):
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name="stops")
+    position = models.PositiveIntegerField()
+    address = models.ForeignKey(Address, on_delete=models.SET_NULL, null=True)
+    # The depot (first and last stops) has no order
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True)
+    # Leg from the previous stop
+    leg_distance_m = models.FloatField(default=0.0)
+    leg_duration_s = models.FloatField(default=0.0)
+
+
+class TrafficProfile(models.Model):
+    # OSM highway class, or "other" for the roads of any other class
+    road_class = models.CharField(max_length=20)
+    hour = models.PositiveSmallIntegerField(validators=[MaxValueValidator(23)])
+    # Speed at this hour as a fraction of the free-flow speed
+    speed_factor = models.FloatField(validators=[MinValueValidator(0.01)])
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["road_class", "hour"], name="unique_traffic_profile_hour"
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        if not 0 <= self.hour <= 23:
+            raise ValueError(f"Invalid Hour: {self.hour}")
+
+        if self.speed_factor <= 0:
+            raise ValueError(f"Invalid Speed Factor: {self.speed_factor}")
+
+        super().save(*args, **kwargs)
+
+
+class JobStatus(models.TextChoices):
+    QUEU = "Queu", "Queued"
+    RUNN = "Runn", "Running"
+    DONE = "Done", "Done"
+    FAIL = "Fail", "Failed"
+
+
+class JobPhase(models.TextChoices):
+    GEOC = "Geoc", "Geocode"
+    GRAP = "Grap", "Graph"
+    ROUT = "Rout", "Route"
+    REND = "Rend", "Render"
+
+
+class JobKind(models.TextChoices):
+    TRIP = "Trip", "Trip"
+    PLAN = "Plan", "Trip plan"
+
+
+class TripJob(models.Model):
+    user = models.ForeignKey(Usuario, on_delete=models.CASCADE)
+    depot = models.ForeignKey(Depot, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=4, choices=JobKind.choices, default="Trip")
+    orders = models.JSONField(null=True)
+    trucks = models.JSONField(null=True)
+    strategy = models.CharField(max_length=20, null=True)
+    render = models.BooleanField(default=False)
+    optimize = models.CharField(max_length=20, null=True)
+    departure = models.DateTimeField(null=True)
+    status = models.CharField(max_length=4, choices=JobStatus.choices)
+    phase = models.CharField(max_length=4, choices=JobPhase.choices, null=True)
+    trip = models.ForeignKey(Trip, on_delete=models.SET_NULL, null=True)
+    result = models.JSONField(null=True)
+    error = models.TextField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    def save(self, *args, **kwargs):
+        if self.status not in [choice[0] for choice in JobStatus.choices]:
+            raise ValueError(f"Invalid Status: {self.status}")
+        if self.kind not in [choice[0] for choice in JobKind.choices]:
+            raise ValueError(f"Invalid Kind: {self.kind}")
+
+        super().save(*args, **kwargs)
@@ -0,0 +1,20 @@
+from contextlib import contextmanager
+import os
+import uuid
+
+
+@contextmanager
+def atomic_path(path):
+    """Temporary path to write ``path`` to, moved in place once written.
+
+    Readers, in this process or another, never see half a file. The name is
+    unique to each write, so threads writing the same file do not share it;
+    a write that fails leaves ``path`` untouched.
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
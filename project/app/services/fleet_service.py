@@ -0,0 +1,213 @@
+import time
+import numpy as np
+from .tour_service import IMPROVEMENT_EPSILON, solve_tour, tour_length
+from ..exception_errors import CapacityError
+
+
+def route_length(distances, route):
+    """Cost of leaving the depot (index 0), visiting ``route`` and returning."""
+    return tour_length(distances, [0] + list(route) + [0])
+
+
+def route_load(demands, route):
+    return demands[np.array(route, dtype=np.int64) - 1].sum(axis=0)
+
+
+def clarke_wright(distances, demands, capacity, customers=None):
+    """Clarke-Wright savings over the depot at index 0.
+
+    ``demands[c - 1]`` is the load of customer ``c`` (one column per capacity
+    dimension, e.g. weight and volume) and ``capacity`` the limit of a single
+    vehicle. Every customer starts on its own route and the routes are joined
+    tail to head, largest saving ``d[i, 0] + d[0, j] - d[i, j]`` first, while
+    the joined load still fits the vehicle. Works with asymmetric distances.
+    """
+    distances = np.asarray(distances, dtype=float)
+    demands = np.asarray(demands, dtype=float).reshape(len(distances) - 1, -1)
+    capacity = np.asarray(capacity, dtype=float)
+    if customers is None:
+        customers = range(1, len(distances))
+    customers = np.array(list(customers), dtype=np.int64)
+
+    routes = {c: [c] for c in customers.tolist()}
+    loads = {c: demands[c - 1] for c in customers.tolist()}
+    route_of = {c: c for c in customers.tolist()}
+
+    savings = (
+        distances[customers, :1]
+        + distances[:1, customers]
+        - distances[np.ix_(customers, customers)]
+    )
+    np.fill_diagonal(savings, -np.inf)
+    savings[~np.isfinite(savings)] = -np.inf
+
+    pairs = np.argwhere(savings >= 0)
+    order = np.argsort(-savings[pairs[:, 0], pairs[:, 1]], kind="stable")
+
+    for i, j in customers[pairs[order]].tolist():
+        a, b = route_of[i], route_of[j]
+        if a == b or routes[a][-1] != i or routes[b][0] != j:
+            continue
+
+        load = loads[a] + loads[b]
+        if np.any(load > capacity):
+            continue
+
+        for c in routes[b]:
+            route_of[c] = a
+        routes[a].extend(routes.pop(b))
+        loads[a] = load
+        del loads[b]
+
+    return list(routes.values())
+
+
+def _best_fit(load, capacities, free):
+    """Free vehicle with the least spare room that still carries ``load``."""
+    best, best_slack = None, float("inf")
+    for t in free:
+        if np.any(load > capacities[t]):
+            continue
+
+        slack = float(np.sum((capacities[t] - load) / capacities[t]))
+        if slack < best_slack:
+            best, best_slack = t, slack
+
+    return best
+
+
+def assign_vehicles(distances, demands, capacities):
+    """Split the customers into routes, each one carried by its own vehicle.
+
+    ``capacities[t]`` is the capacity of vehicle ``t``. Each round builds
+    savings routes bounded by the biggest free vehicle and hands them out,
+    heaviest first, to the free vehicle they fill the most. Customers left
+    without a vehicle go to the next round, until everyone is on a route.
+
+    Returns a list of ``(vehicle, route)`` pairs.
+    """
+    scale = capacities.max(axis=0)
+    free = list(range(len(capacities)))
+    pending = list(range(1, len(distances)))
+    plan = []
+
+    while pending:
+        if not free:
+            raise CapacityError(
+                f"Not enough available trucks: {len(pending)} orders left over"
+            )
+
+        biggest = max(free, key=lambda t: float(np.prod(capacities[t] / scale)))
+        routes = clarke_wright(distances, demands, capacities[biggest], pending)
+        routes.sort(
+            key=lambda route: float(np.sum(route_load(demands, route) / scale)),
+            reverse=True,
+        )
+
+        assigned = False
+        for route in routes:
+            vehicle = _best_fit(route_load(demands, route), capacities, free)
+            if vehicle is None:
+                continue
+
+            free.remove(vehicle)
+            plan.append((vehicle, route))
+            for c in route:
+                pending.remove(c)
+            assigned = True
+
+        if not assigned:
+            raise CapacityError("Some orders do not fit in any available truck")
+
+    return plan
+
+
+def relocate(distances, demands, capacities, plan, deadline=None):
+    """Move single customers to the route where they cost the least.
+
+    A customer leaves its route when inserting it somewhere in another route
+    costs less than what removing it saves, and only if the vehicle of the
+    other route can still carry it. Routes left empty are dropped.
+    """
+    vehicles = [vehicle for vehicle, _ in plan]
+    routes = [list(route) for _, route in plan]
+    loads = [route_load(demands, route) for route in routes]
+
+    improved = True
+    while improved and (deadline is None or time.perf_counter() < deadline):
+        improved = False
+        for a in range(len(routes)):
+            position = 0
+            while position < len(routes[a]):
+                route = routes[a]
+                c = route[position]
+                before = route[position - 1] if position else 0
+                after = route[position + 1] if position + 1 < len(route) else 0
+                gain = (
+                    distances[before, c]
+                    + distances[c, after]
+                    - distances[before, after]
+                )
+
+                best = None
+                for b, other in enumerate(routes):
+                    if b == a or np.any(
+                        loads[b] + demands[c - 1] > capacities[vehicles[b]]
+                    ):
+                        continue
+
+                    stops = np.array([0] + other + [0])
+                    costs = (
+                        distances[stops[:-1], c]
+                        + distances[c, stops[1:]]
+                        - distances[stops[:-1], stops[1:]]
+                    )
+                    k = int(np.argmin(costs))
+                    if gain - costs[k] > IMPROVEMENT_EPSILON and (
+                        best is None or costs[k] < best[0]
+                    ):
+                        best = (costs[k], b, k)
+
+                if best is None:
+                    position += 1
+                    continue
+
+                _, b, k = best
+                route.pop(position)
+                routes[b].insert(k, c)
+                loads[a] = loads[a] - demands[c - 1]
+                loads[b] = loads[b] + demands[c - 1]
+                improved = True
+
+    return [(vehicle, route) for vehicle, route in zip(vehicles, routes) if route]
+
+
+def plan_routes(distances, demands, capacities, time_budget=None, exact_max_stops=0):
+    """Capacitated routes from the depot at index 0 for a fleet of vehicles.
+
+    Clarke-Wright savings build the routes, customers are then relocated
+    between routes and each route is ordered on its own with ``solve_tour``.
+    Returns ``(vehicle, tour)`` pairs where each tour starts and ends at 0.
+    """
+    distances = np.asarray(distances, dtype=float)
+    demands = np.asarray(demands, dtype=float).reshape(len(distances) - 1, -1)
+    capacities = np.asarray(capacities, dtype=float).reshape(-1, demands.shape[1])
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+
+    plan = assign_vehicles(distances, demands, capacities)
+    plan = relocate(distances, demands, capacities, plan, deadline)
+
+    tours = []
+    for vehicle, route in plan:
+        stops = [0] + route
+        remaining = None if deadline is None else deadline - time.perf_counter()
+        if remaining is not None and remaining <= 0:
+            # Out of time: keep the order the savings built
+            tour = list(range(len(stops))) + [0]
+        else:
+            tour = solve_tour(
+                distances[np.ix_(stops, stops)], remaining, exact_max_stops
+            )
+        tours.append((vehicle, [stops[i] for i in tour]))
+
+    return tours
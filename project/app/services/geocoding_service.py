@@ -0,0 +1,214 @@
+from ..cruds.address_crud import AddressCrud
+from ..models import GeocodeLevel
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from geopy.exc import GeocoderRateLimited, GeocoderTimedOut, GeocoderUnavailable
+from geopy.geocoders import Nominatim
+import threading
+import time
+
+# Failures worth another try: the service is slow, down or asking us to wait
+RETRYABLE_ERRORS = (GeocoderTimedOut, GeocoderUnavailable, GeocoderRateLimited)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` requests per second, bursts of ``capacity``."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class GeocodingService:
+    # Shared by every request of this process, so together they keep the limit
+    _bucket = None
+
+    @staticmethod
+    def bucket():
+        rate = settings.GEOCODING_RATE_LIMIT
+        if GeocodingService._bucket is None or GeocodingService._bucket.rate != rate:
+            GeocodingService._bucket = TokenBucket(rate)
+
+        return GeocodingService._bucket
+
+    @staticmethod
+    def geolocator():
+        return Nominatim(
+            user_agent="cheaptracker",
+            domain=settings.GEOCODING_DOMAIN,
+            scheme=settings.GEOCODING_SCHEME,
+            timeout=settings.GEOCODING_TIMEOUT,
+        )
+
+    @staticmethod
+    def queries(addr):
+        # List of queries from most specific to least specific
+        return [
+            (
+                GeocodeLevel.FULL,
+                f"{addr.street}, {addr.number}, {addr.neighborhood}, {addr.city}, {addr.state}, {addr.country}",
+            ),
+            (
+                GeocodeLevel.NUMB,
+                f"{addr.street}, {addr.number}, {addr.city}, {addr.state}, {addr.country}",
+            ),
+            (
+                GeocodeLevel.STRE,
+                f"{addr.street}, {addr.city}, {addr.state}, {addr.country}",
+            ),
+            (
+                GeocodeLevel.NEIG,  # Fallback to neighborhood center
+                f"{addr.neighborhood}, {addr.city}, {addr.state}, {addr.country}",
+            ),
+        ]
+
+    @staticmethod
+    def query(geolocator, q):
+        """Runs a single query, retrying with exponential backoff."""
+        for attempt in range(settings.GEOCODING_RETRIES + 1):
+            GeocodingService.bucket().acquire()
+            try:
+                return geolocator.geocode(q)
+            except RETRYABLE_ERRORS as e:
+                if attempt == settings.GEOCODING_RETRIES:
+                    raise
+
+                delay = settings.GEOCODING_BACKOFF * 2**attempt
+                if isinstance(e, GeocoderRateLimited) and e.retry_after:
+                    delay = max(delay, e.retry_after)
+                print(f"   [WARN] Retrying '{q}' in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+    @staticmethod
+    def resolve(geolocator, queries):
+        """First query that finds the address, as ``(level, location)``.
+
+        Returns ``(None, None)`` when every query answered that the address
+        does not exist, and ``(None, error)`` when some query failed instead.
+        """
+        error = None
+        for level, q in queries:
+            try:
+                loc = GeocodingService.query(geolocator, q)
+            except Exception as e:
+                print(f"   [WARN] Error geocoding '{q}': {e}")
+                error = e
+                continue
+
+            if loc:
+                print(f"   [OK] Address found: {q}")
+                return level, loc
+
+        return None, error
+
+    @staticmethod
+    def display_address(addr):
+        if addr is None:
+            return ""
+        return f"{addr.street}, {addr.number}, {addr.neighborhood}, {addr.city}, {addr.state}, {addr.cep}, {addr.country}"
+
+    @staticmethod
+    def is_known_miss(addr):
+        return (
+            addr.latitude is None
+            and addr.geocoded_at is not None
+            and timezone.now() - addr.geocoded_at
+            < timedelta(seconds=settings.GEOCODING_NEGATIVE_TTL)
+        )
+
+    @staticmethod
+    def resolve_batch(address_objects, workers=None):
+        """``resolve`` for every address, each one in a worker thread.
+
+        The token bucket keeps all the threads together under the geocoder's
+        rate limit.
+        """
+        if not address_objects:
+            return []
+
+        geolocator = GeocodingService.geolocator()
+        workers = min(workers or settings.GEOCODING_WORKERS, len(address_objects))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(
+                pool.map(
+                    lambda addr: GeocodingService.resolve(
+                        geolocator, GeocodingService.queries(addr)
+                    ),
+                    address_objects,
+                )
+            )
+
+    @staticmethod
+    def geocode_batch(address_objects):
+        """Geocodes the addresses concurrently, storing the results on them.
+
+        Addresses no query could find are stored as misses, so they are not
+        looked up again before ``GEOCODING_NEGATIVE_TTL``.
+        """
+        results = GeocodingService.resolve_batch(address_objects)
+
+        # Saved from this thread: the workers only talk to the geocoder
+        for addr, (level, result) in zip(address_objects, results):
+            if level is not None:
+                AddressCrud.save_geocode(addr, result.latitude, result.longitude, level)
+            elif result is None:
+                AddressCrud.save_geocode(addr, None, None, None)
+
+    @staticmethod
+    def locate_addresses(address_objects):
+        """Coordinates of each address, calling the geocoder only on a cache miss.
+
+        Returns the ``(latitude, longitude)`` pairs and the formatted addresses
+        used for display.
+        """
+        # Orders of the same store bring separate copies of its address
+        unique = {}
+        for addr in address_objects:
+            unique.setdefault(addr.id, addr)
+
+        GeocodingService.geocode_batch(
+            [
+                addr
+                for addr in unique.values()
+                if addr.latitude is None and not GeocodingService.is_known_miss(addr)
+            ]
+        )
+
+        locations = []
+        addresses = []  # For display purposes
+
+        for addr in address_objects:
+            resolved = unique[addr.id]
+            if resolved.latitude is None:
+                raise ValueError(
+                    f"   [ERROR] Address not found after retries: {addr.street}, {addr.number}"
+                )
+
+            addr.latitude, addr.longitude = resolved.latitude, resolved.longitude
+            locations.append((addr.latitude, addr.longitude))
+            # Reconstruct the full formatted address for display consistency
+            addresses.append(GeocodingService.display_address(addr))
+
+        return locations, addresses
@@ -0,0 +1,212 @@
+from ..cruds.trip_stop_crud import TripStopCrud
+from ..services.geocoding_service import GeocodingService
+import math
+import struct
+import zlib
+import numpy as np
+
+# Web map zoom levels (Leaflet / OpenStreetMap tiles)
+MIN_ZOOM, MAX_ZOOM = 0, 22
+
+# Header of a packed route path: format tag, decimal places, number of legs
+PATH_HEADER = struct.Struct("<4sBI")
+PATH_FORMAT = b"RTP1"
+
+
+def pixel_size(zoom, lat):
+    """Size of a 256 px web map tile pixel at ``zoom``, in degrees of latitude."""
+    return 360 / (256 * 2**zoom) * math.cos(math.radians(lat))
+
+
+def douglas_peucker(points, tolerance):
+    """Drops the ``(lat, lon)`` points closer than ``tolerance`` to the line.
+
+    Ramer-Douglas-Peucker, iterative: the point farthest from the line
+    between the ends of a stretch is kept when it is farther than
+    ``tolerance`` (degrees of latitude) and splits the stretch in two.
+    Longitudes are scaled by the cosine of the latitude so both axes measure
+    the same distance. The first and last points are always kept.
+    """
+    if len(points) < 3 or tolerance <= 0:
+        return [list(point) for point in points]
+
+    coords = np.asarray(points, dtype=float)
+    plane = coords.copy()
+    plane[:, 1] *= math.cos(math.radians(coords[:, 0].mean()))
+
+    keep = np.zeros(len(coords), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(coords) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        start, end = plane[first], plane[last]
+        inner = plane[first + 1 : last] - start
+        direction = end - start
+        norm = math.hypot(*direction)
+        if norm == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = (
+                np.abs(direction[0] * inner[:, 1] - direction[1] * inner[:, 0]) / norm
+            )
+
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    return coords[keep].tolist()
+
+
+def encode_polyline(points, precision=5):
+    """``(lat, lon)`` points in Google's encoded polyline format."""
+    factor = 10**precision
+    encoded = []
+    prev_lat = prev_lon = 0
+
+    for lat, lon in points:
+        lat, lon = round(lat * factor), round(lon * factor)
+        for delta in (lat - prev_lat, lon - prev_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                encoded.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            encoded.append(chr(value + 63))
+        prev_lat, prev_lon = lat, lon
+
+    return "".join(encoded)
+
+
+def pack_path(segments, precision=6):
+    """Street paths of the legs of a route as compact bytes.
+
+    Coordinates become integers with ``precision`` decimal places, stored as
+    the difference from the previous point: along a street the differences
+    are tiny and repeat, so zlib shrinks them to a few bytes per point.
+    """
+    counts = np.array([len(segment) for segment in segments], dtype="<u4")
+    points = np.array(
+        [point for segment in segments for point in segment], dtype=float
+    ).reshape(-1, 2)
+    coords = np.round(points * 10**precision).astype(np.int64)
+    deltas = np.diff(coords, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+
+    header = PATH_HEADER.pack(PATH_FORMAT, precision, len(counts))
+    return header + zlib.compress(counts.tobytes() + deltas.astype("<i4").tobytes())
+
+
+def unpack_path(data):
+    """Street paths packed by ``pack_path``, as lists of ``[lat, lon]``."""
+    data = bytes(data)
+    tag, precision, legs = PATH_HEADER.unpack_from(data)
+    if tag != PATH_FORMAT:
+        raise ValueError("Unknown route path format")
+    if not legs:
+        return []
+
+    body = zlib.decompress(data[PATH_HEADER.size :])
+    counts = np.frombuffer(body, dtype="<u4", count=legs)
+    deltas = np.frombuffer(body, dtype="<i4", offset=counts.nbytes).reshape(-1, 2)
+    points = np.round(np.cumsum(deltas, axis=0) / 10**precision, precision)
+
+    return [segment.tolist() for segment in np.split(points, np.cumsum(counts)[:-1])]
+
+
+def trip_geometry(trip):
+    """Stops and street paths stored for the trip, or None before it has a route."""
+    stops = TripStopCrud.read_by_trip(trip.id)
+    if not trip.route_path or not stops:
+        return None
+
+    segments = unpack_path(trip.route_path)
+    # Every leg starts at a stop, and the last one ends at the depot
+    points = [segment[0] for segment in segments] + [segments[-1][-1]]
+    return {
+        "stops": [
+            {
+                "lat": lat,
+                "lon": lon,
+                "address": GeocodingService.display_address(stop.address),
+            }
+            for stop, (lat, lon) in zip(stops, points)
+        ],
+        "segments": segments,
+    }
+
+
+def simplify_route(geometry, zoom=None):
+    """Route geometry with the street paths simplified to one pixel at ``zoom``.
+
+    Without a zoom the paths are returned untouched.
+    """
+    if zoom is None:
+        return geometry
+
+    stops = geometry["stops"]
+    lat = sum(stop["lat"] for stop in stops) / len(stops)
+    tolerance = pixel_size(zoom, lat)
+    return {
+        "stops": stops,
+        "segments": [
+            douglas_peucker(segment, tolerance) for segment in geometry["segments"]
+        ],
+    }
+
+
+def route_stops(geometry):
+    """Stops to mark on a map: the depot, then every delivery.
+
+    The last stop of a route is the return to the depot, already marked.
+    """
+    stops = geometry["stops"][:-1]
+    return [
+        {
+            "stop": number,
+            "role": "depot" if number == 0 else "delivery",
+            "address": stop["address"],
+            "lat": stop["lat"],
+            "lon": stop["lon"],
+        }
+        for number, stop in enumerate(stops)
+    ]
+
+
+def route_geojson(geometry, zoom=None):
+    """GeoJSON ``FeatureCollection`` with a line per leg and a point per stop."""
+    geometry = simplify_route(geometry, zoom)
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {
+                "type": "LineString",
+                "coordinates": [[lon, lat] for lat, lon in segment],
+            },
+            "properties": {"leg": leg},
+        }
+        for leg, segment in enumerate(geometry["segments"])
+    ]
+    for stop in route_stops(geometry):
+        lat, lon = stop.pop("lat"), stop.pop("lon")
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": stop,
+            }
+        )
+
+    return {"type": "FeatureCollection", "features": features}
+
+
+def route_polylines(geometry, zoom=None):
+    """Stops and one encoded polyline per leg."""
+    geometry = simplify_route(geometry, zoom)
+    return {
+        "stops": route_stops(geometry),
+        "legs": [encode_polyline(segment) for segment in geometry["segments"]],
+    }
@@ -0,0 +1,374 @@
+from django.conf import settings
+from django.utils import timezone
+from django.utils.text import slugify
+from ..cruds.address_crud import AddressCrud
+from .file_service import atomic_path
+from .routing_service import CompactGraph, SnapIndex
+from .hierarchy_service import ContractionHierarchy
+from .osm_file_service import OsmFileService
+import osmnx as ox
+import json
+import pickle
+import re
+import shutil
+import time
+import os
+
+# Typical driving speed (km/h) of each OSM road class without a speed limit
+HIGHWAY_SPEEDS = {
+    "motorway": 90,
+    "motorway_link": 50,
+    "trunk": 70,
+    "trunk_link": 40,
+    "primary": 50,
+    "primary_link": 40,
+    "secondary": 40,
+    "secondary_link": 30,
+    "tertiary": 35,
+    "tertiary_link": 30,
+    "unclassified": 30,
+    "residential": 25,
+    "living_street": 10,
+    "service": 15,
+}
+
+# Speed (km/h) of the roads whose class is unknown too
+FALLBACK_SPEED = 30
+
+MPH_TO_KPH = 1.609344
+
+
+class GraphService:
+    # Graphs already loaded by this process, keyed by cache key: (mtime, graph)
+    _graphs = {}
+    # Compact routing graphs, keyed by (cache key, weight): (graph mtime, graph)
+    _compact_graphs = {}
+    # Contraction hierarchies, keyed by (cache key, weight): (file mtime, hierarchy)
+    _hierarchies = {}
+    # Nearest node indexes, keyed by cache key: (graph mtime, index)
+    _snap_indexes = {}
+
+    @staticmethod
+    def cache_key(city, state, country, network_type="drive"):
+        return slugify(f"{city}-{state}-{country}-{network_type}")
+
+    @staticmethod
+    def cache_dir(key):
+        return os.path.join(settings.ROUTING_GRAPH_CACHE_DIR, key)
+
+    @staticmethod
+    def graph_path(key):
+        return os.path.join(GraphService.cache_dir(key), "graph.pickle")
+
+    @staticmethod
+    def compact_path(key, weight="length"):
+        return os.path.join(GraphService.cache_dir(key), f"compact-{weight}.bin")
+
+    @staticmethod
+    def hierarchy_path(key, weight="length"):
+        return os.path.join(GraphService.cache_dir(key), f"hierarchy-{weight}.bin")
+
+    @staticmethod
+    def import_path(key):
+        return os.path.join(GraphService.cache_dir(key), "import.json")
+
+    @staticmethod
+    def snap_index_path(key):
+        return os.path.join(GraphService.cache_dir(key), "snap-index.pickle")
+
+    @staticmethod
+    def is_expired(mtime):
+        ttl = settings.ROUTING_GRAPH_CACHE_TTL
+        if not ttl:
+            return False
+
+        return time.time() - mtime > ttl
+
+    @staticmethod
+    def build_graph(city, state, country, network_type="drive"):
+        area = f"{city}, {state}, {country}"
+        return ox.graph_from_place(area, network_type=network_type)
+
+    @staticmethod
+    def parse_speed(maxspeed):
+        """Speed limit in km/h from an OSM ``maxspeed`` tag, or None.
+
+        Tags like ``"60"``, ``"40 mph"`` or a list of them (an edge merged
+        from several ways) are understood; the mean of a list is used.
+        """
+        values = maxspeed if isinstance(maxspeed, list) else [maxspeed]
+        speeds = []
+        for value in values:
+            match = re.search(r"\d+(\.\d+)?", str(value))
+            if match:
+                speed = float(match.group())
+                speeds.append(speed * MPH_TO_KPH if "mph" in str(value) else speed)
+
+        return sum(speeds) / len(speeds) if speeds else None
+
+    @staticmethod
+    def road_speed(data):
+        """Driving speed (km/h) of an edge: its speed limit or its road class's."""
+        speed = GraphService.parse_speed(data.get("maxspeed"))
+        if speed:
+            return speed
+
+        highways = data.get("highway")
+        highways = highways if isinstance(highways, list) else [highways]
+        speeds = [HIGHWAY_SPEEDS[h] for h in highways if h in HIGHWAY_SPEEDS]
+        return sum(speeds) / len(speeds) if speeds else FALLBACK_SPEED
+
+    @staticmethod
+    def add_travel_times(G):
+        """Stores ``speed_kph`` and ``travel_time`` (seconds) on every edge."""
+        for _, _, data in G.edges(data=True):
+            data["speed_kph"] = GraphService.road_speed(data)
+            data["travel_time"] = data["length"] / (data["speed_kph"] / 3.6)
+
+        G.graph["travel_times"] = True
+        return G
+
+    @staticmethod
+    def save_graph(key, G):
+        G.graph["version"] = timezone.now().strftime("%Y%m%d%H%M%S")
+
+        os.makedirs(GraphService.cache_dir(key), exist_ok=True)
+        path = GraphService.graph_path(key)
+        with atomic_path(path) as tmp_path, open(tmp_path, "wb") as f:
+            pickle.dump(G, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        GraphService._graphs[key] = (os.path.getmtime(path), G)
+        return G
+
+    @staticmethod
+    def cached_mtime(key):
+        """Modification time of the cached graph, or None when it must be built."""
+        try:
+            mtime = os.path.getmtime(GraphService.graph_path(key))
+        except FileNotFoundError:
+            return None
+
+        # Imported graphs, and every graph when offline, are never downloaded
+        keep = settings.ROUTING_GRAPH_OFFLINE or os.path.isfile(
+            GraphService.import_path(key)
+        )
+        if GraphService.is_expired(mtime) and not keep:
+            return None
+
+        return mtime
+
+    @staticmethod
+    def read_graph(key):
+        path = GraphService.graph_path(key)
+        mtime = GraphService.cached_mtime(key)
+        if mtime is None:
+            return None
+
+        cached = GraphService._graphs.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        with open(path, "rb") as f:
+            G = pickle.load(f)
+        # Graphs cached before travel times existed get them on load
+        if not G.graph.get("travel_times"):
+            GraphService.add_travel_times(G)
+
+        GraphService._graphs[key] = (mtime, G)
+        return G
+
+    @staticmethod
+    def load_graph(city, state, country, network_type="drive", refresh=False):
+        key = GraphService.cache_key(city, state, country, network_type)
+
+        if not refresh:
+            G = GraphService.read_graph(key)
+            if G is not None:
+                return G
+
+        if settings.ROUTING_GRAPH_OFFLINE:
+            raise ValueError(
+                f"No road graph of {city} is cached; "
+                "import one with the import_osm_graph command"
+            )
+
+        G = GraphService.build_graph(city, state, country, network_type)
+        return GraphService.store_graph(city, state, country, G, network_type)
+
+    @staticmethod
+    def store_graph(city, state, country, G, network_type="drive"):
+        """Caches a new graph of the city, with the travel time of its edges."""
+        key = GraphService.cache_key(city, state, country, network_type)
+        GraphService.add_travel_times(G)
+        GraphService.save_graph(key, G)
+        # Node ids may change with the new graph
+        GraphService.snap_addresses(city, state, country, network_type)
+        return G
+
+    @staticmethod
+    def import_graph(
+        city, state, country, osm_path, boundary_path, network_type="drive"
+    ):
+        """Caches the city graph read from a local OSM extract and its boundary.
+
+        Imported graphs are not downloaded again when they expire.
+        """
+        G = OsmFileService.build_graph(osm_path, boundary_path, network_type)
+        key = GraphService.cache_key(city, state, country, network_type)
+        os.makedirs(GraphService.cache_dir(key), exist_ok=True)
+        with open(GraphService.import_path(key), "w") as f:
+            json.dump(
+                {
+                    "osm": os.path.abspath(osm_path),
+                    "boundary": os.path.abspath(boundary_path),
+                },
+                f,
+            )
+
+        return GraphService.store_graph(city, state, country, G, network_type)
+
+    @staticmethod
+    def snap(city, state, country, addresses, network_type="drive"):
+        """Nearest graph node of each geocoded address, stored on the address."""
+        if not addresses:
+            return []
+
+        G = GraphService.load_graph(city, state, country, network_type)
+        index = GraphService.load_snap_index(city, state, country, network_type)
+        nodes = index.nearest(
+            [address.latitude for address in addresses],
+            [address.longitude for address in addresses],
+        )
+        AddressCrud.save_graph_nodes(addresses, nodes, G.graph.get("version"))
+        return nodes
+
+    @staticmethod
+    def snap_addresses(city, state, country, network_type="drive"):
+        """Recomputes in bulk the nearest node of every geocoded address of the city."""
+        addresses = list(AddressCrud.read_geocoded_by_city(city, state, country))
+        GraphService.snap(city, state, country, addresses, network_type)
+        return len(addresses)
+
+    @staticmethod
+    def load_compact_graph(city, state, country, network_type="drive", weight="length"):
+        """Compact graph of the cached city graph, mapped from its file.
+
+        The city graph itself is only read when the file must be written.
+        """
+        key = GraphService.cache_key(city, state, country, network_type)
+        graph_mtime = GraphService.cached_mtime(key)
+        if graph_mtime is None:
+            GraphService.load_graph(city, state, country, network_type)
+            graph_mtime = GraphService._graphs[key][0]
+
+        cached = GraphService._compact_graphs.get((key, weight))
+        if cached and cached[0] == graph_mtime:
+            return cached[1]
+
+        path = GraphService.compact_path(key, weight)
+        if not os.path.isfile(path) or os.path.getmtime(path) < graph_mtime:
+            G = GraphService.load_graph(city, state, country, network_type)
+            with atomic_path(path) as tmp_path:
+                CompactGraph.from_graph(G, weight).save(tmp_path)
+        compact = CompactGraph.load(path)
+
+        GraphService._compact_graphs[(key, weight)] = (graph_mtime, compact)
+        return compact
+
+    @staticmethod
+    def load_snap_index(city, state, country, network_type="drive"):
+        """KD-tree over the nodes of the cached city graph, built once per download."""
+        compact = GraphService.load_compact_graph(city, state, country, network_type)
+        key = GraphService.cache_key(city, state, country, network_type)
+        graph_mtime = GraphService._compact_graphs[(key, "length")][0]
+
+        cached = GraphService._snap_indexes.get(key)
+        if cached and cached[0] == graph_mtime:
+            return cached[1]
+
+        path = GraphService.snap_index_path(key)
+        if os.path.isfile(path) and os.path.getmtime(path) >= graph_mtime:
+            index = SnapIndex.load(path)
+        else:
+            index = SnapIndex.from_graph(compact)
+            with atomic_path(path) as tmp_path:
+                index.save(tmp_path)
+
+        GraphService._snap_indexes[key] = (graph_mtime, index)
+        return index
+
+    @staticmethod
+    def build_hierarchy(
+        city, state, country, network_type="drive", weight="length", log=None
+    ):
+        compact = GraphService.load_compact_graph(
+            city, state, country, network_type, weight
+        )
+        hierarchy = ContractionHierarchy.build(compact, log=log)
+
+        key = GraphService.cache_key(city, state, country, network_type)
+        path = GraphService.hierarchy_path(key, weight)
+        with atomic_path(path) as tmp_path:
+            hierarchy.save(tmp_path)
+        hierarchy = ContractionHierarchy.load(compact, path)
+
+        GraphService._hierarchies[(key, weight)] = (os.path.getmtime(path), hierarchy)
+        return hierarchy
+
+    @staticmethod
+    def load_hierarchy(city, state, country, network_type="drive", weight="length"):
+        """Contraction hierarchy of the cached city graph, or None if not built."""
+        key = GraphService.cache_key(city, state, country, network_type)
+        path = GraphService.hierarchy_path(key, weight)
+        try:
+            mtime = os.path.getmtime(path)
+        except FileNotFoundError:
+            return None
+
+        graph_path = GraphService.graph_path(key)
+        # A hierarchy older than the graph was built for a previous download
+        if not os.path.isfile(graph_path) or mtime < os.path.getmtime(graph_path):
+            return None
+
+        cached = GraphService._hierarchies.get((key, weight))
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        compact = GraphService.load_compact_graph(
+            city, state, country, network_type, weight
+        )
+        hierarchy = ContractionHierarchy.load(compact, path)
+        GraphService._hierarchies[(key, weight)] = (mtime, hierarchy)
+        return hierarchy
+
+    @staticmethod
+    def cached_keys():
+        if not os.path.isdir(settings.ROUTING_GRAPH_CACHE_DIR):
+            return []
+
+        return sorted(
+            key
+            for key in os.listdir(settings.ROUTING_GRAPH_CACHE_DIR)
+            if os.path.isfile(GraphService.graph_path(key))
+        )
+
+    @staticmethod
+    def invalidate(city=None, state=None, country=None, network_type="drive"):
+        if city is None:
+            keys = GraphService.cached_keys()
+        else:
+            keys = [GraphService.cache_key(city, state, country, network_type)]
+
+        removed = []
+        for key in keys:
+            GraphService._graphs.pop(key, None)
+            GraphService._snap_indexes.pop(key, None)
+            for memo in [GraphService._compact_graphs, GraphService._hierarchies]:
+                for cached in list(memo):
+                    if cached[0] == key:
+                        memo.pop(cached)
+            if os.path.isdir(GraphService.cache_dir(key)):
+                shutil.rmtree(GraphService.cache_dir(key))
+                removed.append(key)
+
+        return removed
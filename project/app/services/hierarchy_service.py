@@ -0,0 +1,325 @@
+import heapq
+import numpy as np
+from .routing_service import DistanceMatrix, map_arrays, save_arrays
+
+CSR_FIELDS = ["offsets", "nodes", "weights", "middles"]
+
+
+class ContractionHierarchy:
+    """Contraction hierarchy built over a ``CompactGraph``.
+
+    Nodes are contracted one by one, adding shortcut edges that keep the
+    shortest distances between their neighbours. Each edge is then stored
+    only on its lower ranked endpoint: ``forward`` holds the edges leaving a
+    node towards higher ranks and ``backward`` the edges arriving at a node
+    from higher ranks, both as CSR arrays ``(offsets, nodes, weights,
+    middles)``. ``middles`` is the contracted node a shortcut skips over, or
+    -1 for an edge of the road graph.
+    """
+
+    def __init__(self, graph, rank, forward, backward):
+        self.graph = graph
+        self.rank = rank
+        self.forward = forward
+        self.backward = backward
+
+    @classmethod
+    def build(cls, graph, witness_limit=500, log=None):
+        out_edges = [dict() for _ in range(len(graph))]
+        in_edges = [dict() for _ in range(len(graph))]
+        for u, v, w in zip(
+            graph.edge_sources().tolist(),
+            graph.targets.tolist(),
+            graph.weights.tolist(),
+        ):
+            if u != v:
+                out_edges[u][v] = (w, -1)
+                in_edges[v][u] = (w, -1)
+
+        deleted_neighbours = [0] * len(graph)
+        upward_forward = [[] for _ in range(len(graph))]
+        upward_backward = [[] for _ in range(len(graph))]
+        rank = np.zeros(len(graph), dtype=np.int32)
+
+        def shortcuts(v):
+            needed = []
+            for u, (w_in, _) in in_edges[v].items():
+                costs = {
+                    x: w_in + w_out for x, (w_out, _) in out_edges[v].items() if x != u
+                }
+                if not costs:
+                    continue
+
+                dist = cls._witness_search(
+                    out_edges, u, v, costs, max(costs.values()), witness_limit
+                )
+                for x, cost in costs.items():
+                    if dist.get(x, float("inf")) > cost:
+                        needed.append((u, x, cost))
+
+            return needed
+
+        def priority(v, added):
+            edge_difference = len(added) - len(in_edges[v]) - len(out_edges[v])
+            return edge_difference + deleted_neighbours[v]
+
+        pq = [(priority(v, shortcuts(v)), v) for v in range(len(graph))]
+        heapq.heapify(pq)
+
+        contracted = 0
+        while pq:
+            _, v = heapq.heappop(pq)
+
+            # Lazy update: contract only if the node is still the cheapest one
+            added = shortcuts(v)
+            current = priority(v, added)
+            if pq and current > pq[0][0]:
+                heapq.heappush(pq, (current, v))
+                continue
+
+            for x, (w, middle) in out_edges[v].items():
+                upward_forward[v].append((x, w, middle))
+                del in_edges[x][v]
+                deleted_neighbours[x] += 1
+            for u, (w, middle) in in_edges[v].items():
+                upward_backward[v].append((u, w, middle))
+                del out_edges[u][v]
+                deleted_neighbours[u] += 1
+            out_edges[v] = {}
+            in_edges[v] = {}
+
+            for u, x, cost in added:
+                if cost < out_edges[u].get(x, (float("inf"),))[0]:
+                    out_edges[u][x] = (cost, v)
+                    in_edges[x][u] = (cost, v)
+
+            rank[v] = contracted
+            contracted += 1
+            if log and contracted % 10000 == 0:
+                log(f"   {contracted}/{len(graph)} nodes contracted")
+
+        return cls(
+            graph, rank, cls._to_csr(upward_forward), cls._to_csr(upward_backward)
+        )
+
+    @staticmethod
+    def _witness_search(out_edges, source, skip, targets, limit, max_settled):
+        """Distances from ``source`` that avoid ``skip``, bounded by ``limit``."""
+        remaining = set(targets)
+        dist = {source: 0.0}
+        pq = [(0.0, source)]
+        settled = 0
+
+        while pq:
+            current_dist, u = heapq.heappop(pq)
+
+            if current_dist > dist[u]:
+                continue
+            if current_dist > limit or settled >= max_settled:
+                break
+
+            settled += 1
+            remaining.discard(u)
+            if not remaining:
+                break
+
+            for v, (w, _) in out_edges[u].items():
+                new_dist = current_dist + w
+                if v != skip and new_dist < dist.get(v, float("inf")):
+                    dist[v] = new_dist
+                    heapq.heappush(pq, (new_dist, v))
+
+        return dist
+
+    @staticmethod
+    def _to_csr(adjacency):
+        offsets = np.zeros(len(adjacency) + 1, dtype=np.int64)
+        np.cumsum([len(edges) for edges in adjacency], out=offsets[1:])
+        edges = [edge for node_edges in adjacency for edge in node_edges]
+
+        return (
+            offsets,
+            np.array([edge[0] for edge in edges], dtype=np.int32),
+            np.array([edge[1] for edge in edges], dtype=np.float64),
+            np.array([edge[2] for edge in edges], dtype=np.int32),
+        )
+
+    def save(self, path):
+        arrays = {"rank": self.rank}
+        for direction, csr in (("forward", self.forward), ("backward", self.backward)):
+            for name, array in zip(CSR_FIELDS, csr):
+                arrays[f"{direction}_{name}"] = array
+        save_arrays(path, arrays)
+
+    @classmethod
+    def load(cls, graph, path):
+        """Hierarchy saved by ``save``, mapped read-only like its graph."""
+        data, _ = map_arrays(path)
+        return cls(
+            graph,
+            data["rank"],
+            tuple(data[f"forward_{name}"] for name in CSR_FIELDS),
+            tuple(data[f"backward_{name}"] for name in CSR_FIELDS),
+        )
+
+    def upward_search(self, source, backward=False):
+        """Full search over the upward edges from the node index ``source``.
+
+        Returns the distances and, for every reached node, the ``(node, edge
+        position)`` it was reached from.
+        """
+        up, down = (
+            (self.backward, self.forward) if backward else (self.forward, self.backward)
+        )
+        offsets, nodes, weights, _ = up
+        down_offsets, down_nodes, down_weights, _ = down
+        dist = {source: 0.0}
+        prev = {source: None}
+        pq = [(0.0, source)]
+
+        while pq:
+            current_dist, u = heapq.heappop(pq)
+
+            if current_dist > dist[u]:
+                continue
+
+            # Stall on demand: a higher node already reaches u for less, so
+            # nothing found from u can be part of a shortest path
+            first, last = down_offsets[u], down_offsets[u + 1]
+            if any(
+                dist.get(v, float("inf")) + w < current_dist
+                for v, w in zip(
+                    down_nodes[first:last].tolist(), down_weights[first:last].tolist()
+                )
+            ):
+                continue
+
+            first, last = offsets[u], offsets[u + 1]
+            for k, v, w in zip(
+                range(first, last),
+                nodes[first:last].tolist(),
+                weights[first:last].tolist(),
+            ):
+                new_dist = current_dist + w
+
+                if new_dist < dist.get(v, float("inf")):
+                    dist[v] = new_dist
+                    prev[v] = (u, k)
+                    heapq.heappush(pq, (new_dist, v))
+
+        return dist, prev
+
+    def _find_middle(self, u, v):
+        """Middle node of the hierarchy edge ``u -> v``."""
+        if self.rank[u] < self.rank[v]:
+            offsets, nodes, _, middles = self.forward
+            owner, other = u, v
+        else:
+            offsets, nodes, _, middles = self.backward
+            owner, other = v, u
+
+        first, last = offsets[owner], offsets[owner + 1]
+        position = first + nodes[first:last].tolist().index(other)
+        return middles[position]
+
+    def unpack(self, u, v, middle):
+        """Road graph node indexes of the hierarchy edge ``u -> v``."""
+        path = [u]
+        stack = [(u, v, middle)]
+
+        while stack:
+            a, b, mid = stack.pop()
+            if mid == -1:
+                path.append(b)
+                continue
+
+            stack.append((mid, b, self._find_middle(mid, b)))
+            stack.append((a, mid, self._find_middle(a, mid)))
+
+        return path
+
+    def _path(self, forward_prev, backward_prev, meeting):
+        edges = []
+        u = meeting
+        while forward_prev[u] is not None:
+            w, k = forward_prev[u]
+            edges.append((w, u, self.forward[3][k]))
+            u = w
+        edges.reverse()
+
+        u = meeting
+        while backward_prev[u] is not None:
+            w, k = backward_prev[u]
+            edges.append((u, w, self.backward[3][k]))
+            u = w
+
+        path = [meeting] if not edges else [edges[0][0]]
+        for a, b, mid in edges:
+            path.extend(self.unpack(a, b, mid)[1:])
+
+        return self.graph.node_ids[path].tolist()
+
+    def shortest_path(self, start, target):
+        forward_dist, forward_prev = self.upward_search(self.graph.index[start])
+        backward_dist, backward_prev = self.upward_search(
+            self.graph.index[target], backward=True
+        )
+
+        best, meeting = float("inf"), -1
+        for u, dist in forward_dist.items():
+            total = dist + backward_dist.get(u, float("inf"))
+            if total < best:
+                best, meeting = total, u
+
+        if meeting == -1:
+            return float("inf"), []
+
+        return best, self._path(forward_prev, backward_prev, meeting)
+
+    def distance_matrix(self, nodes):
+        """Many-to-many distances using buckets of the backward searches."""
+        indexes = [self.graph.index[node] for node in nodes]
+        distances = np.full((len(nodes), len(nodes)), np.inf)
+        meetings = np.full((len(nodes), len(nodes)), -1, dtype=np.int64)
+
+        backward = [self.upward_search(index, backward=True) for index in indexes]
+        buckets = {}
+        for j, (dist, _) in enumerate(backward):
+            for u, d in dist.items():
+                buckets.setdefault(u, []).append((j, d))
+
+        forward = [self.upward_search(index) for index in indexes]
+        for i, (dist, _) in enumerate(forward):
+            row, row_meetings = distances[i], meetings[i]
+            for u, forward_dist in dist.items():
+                for j, backward_dist in buckets.get(u, ()):
+                    if forward_dist + backward_dist < row[j]:
+                        row[j] = forward_dist + backward_dist
+                        row_meetings[j] = u
+
+        return HierarchyMatrix(
+            self, list(nodes), distances, forward, backward, meetings
+        )
+
+
+class HierarchyMatrix(DistanceMatrix):
+    """Distance matrix filled by the contraction hierarchy.
+
+    Legs are rebuilt from the upward searches that produced the matrix and
+    their shortcuts unpacked into road graph nodes.
+    """
+
+    def __init__(self, hierarchy, nodes, distances, forward, backward, meetings):
+        super().__init__(hierarchy.graph, nodes, distances, strategy="ch")
+        self.hierarchy = hierarchy
+        self.forward = forward
+        self.backward = backward
+        self.meetings = meetings
+
+    def path(self, i, j):
+        if self.distances[i][j] == float("inf"):
+            return []
+
+        return self.hierarchy._path(
+            self.forward[i][1], self.backward[j][1], int(self.meetings[i][j])
+        )
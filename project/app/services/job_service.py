@@ -0,0 +1,164 @@
+from ..cruds.trip_job_crud import TripJobCrud
+from ..services.depot_service import DepotService
+from ..services.routing_service import SEARCH_STRATEGIES
+from ..services.trip_service import TripService
+from django.forms.models import model_to_dict
+from django.urls import reverse
+
+
+class JobService:
+    @staticmethod
+    def enqueue_trip(
+        user,
+        depot_id,
+        orders_id_list,
+        strategy=None,
+        render=False,
+        optimize=None,
+        departure=None,
+    ):
+        # What is cheap to check fails right away, inside the request
+        DepotService.select_orders(depot_id, orders_id_list)
+        JobService.check_options(strategy, optimize)
+
+        return TripJobCrud.create(
+            user, depot_id, list(orders_id_list), strategy, render, optimize, departure
+        )
+
+    @staticmethod
+    def enqueue_plan(
+        user,
+        depot_id,
+        orders_id_list=None,
+        truck_plates=None,
+        strategy=None,
+        optimize=None,
+        departure=None,
+    ):
+        TripService.plan_orders(depot_id, orders_id_list)
+        TripService.select_fleet(truck_plates)
+        JobService.check_options(strategy, optimize)
+
+        return TripJobCrud.create(
+            user,
+            depot_id,
+            list(orders_id_list) if orders_id_list else None,
+            strategy,
+            optimize=optimize,
+            departure=departure,
+            kind="Plan",
+            trucks=list(truck_plates) if truck_plates else None,
+        )
+
+    @staticmethod
+    def check_options(strategy, optimize):
+        if strategy not in [None, "ch", *SEARCH_STRATEGIES]:
+            raise ValueError(
+                f"Search strategy must be one of: ch, {', '.join(SEARCH_STRATEGIES)}"
+            )
+        TripService.routing_weight(optimize)
+
+    @staticmethod
+    def run(job):
+        if job.kind == "Plan":
+            return JobService.run_plan(job)
+
+        try:
+            trip, route = TripService.define_trip(
+                job.depot_id,
+                job.orders,
+                job.strategy,
+                progress=lambda phase: TripJobCrud.set_phase(job, phase),
+                render=job.render,
+                optimize=job.optimize,
+                departure=job.departure,
+            )
+        except Exception as e:
+            return TripJobCrud.fail(job, str(e.args[0] if e.args else e))
+
+        return TripJobCrud.finish(
+            job,
+            trip,
+            {
+                "route_order": [int(stop) for stop in route["route_order"]],
+                "initial_distance_km": float(route["initial_distance_km"]),
+                "total_distance_km": float(route["total_distance_km"]),
+                "total_duration_min": float(route["total_duration_min"]),
+                "route_url": reverse("Trip Route Geometry", kwargs={"id": trip.id}),
+                "figure_url": reverse(
+                    "Trip Route Render", kwargs={"id": trip.id, "kind": "image"}
+                ),
+                "map_url": reverse(
+                    "Trip Route Render", kwargs={"id": trip.id, "kind": "map"}
+                ),
+            },
+        )
+
+    @staticmethod
+    def run_plan(job):
+        try:
+            planned = TripService.plan_trips(
+                job.depot_id,
+                job.orders,
+                job.trucks,
+                job.strategy,
+                job.optimize,
+                job.departure,
+                progress=lambda phase: TripJobCrud.set_phase(job, phase),
+            )
+        except Exception as e:
+            return TripJobCrud.fail(job, str(e.args[0] if e.args else e))
+
+        return TripJobCrud.finish(
+            job,
+            None,
+            {
+                "trips": [
+                    {
+                        "id": plan["trip"].id,
+                        "truck": plan["truck"].plate,
+                        "orders": plan["orders"],
+                        "total_distance_km": float(plan["trip"].total_distance_km),
+                        "route_url": reverse(
+                            "Trip Route Geometry", kwargs={"id": plan["trip"].id}
+                        ),
+                    }
+                    for plan in planned
+                ]
+            },
+        )
+
+    @staticmethod
+    def run_pending(limit=None):
+        """Runs queued jobs until the queue is empty (or ``limit`` jobs ran)."""
+        jobs = []
+        while limit is None or len(jobs) < limit:
+            job = TripJobCrud.claim_next()
+            if job is None:
+                break
+            jobs.append(JobService.run(job))
+
+        return jobs
+
+    @staticmethod
+    def describe(job):
+        data = {
+            "id": job.id,
+            "kind": job.get_kind_display(),
+            "status": job.get_status_display(),
+            "phase": job.get_phase_display() if job.phase else None,
+            "status_url": reverse("Trip Job Route", kwargs={"id": job.id}),
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+        }
+
+        if job.status == "Fail":
+            data["error"] = job.error
+        if job.status == "Done":
+            # Plan jobs create several trips, listed in their result
+            if job.trip is not None:
+                data["trip"] = model_to_dict(job.trip)
+            data.update(job.result)
+
+        return data
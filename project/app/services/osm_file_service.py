@@ -0,0 +1,170 @@
+from shapely.geometry import MultiPolygon, Polygon, shape
+from shapely.ops import unary_union
+import json
+import os
+import tempfile
+import networkx as nx
+import osmnx as ox
+
+# Ways left out of the "drive" network, the same ones osmnx's Overpass
+# query for network_type="drive" leaves out
+EXCLUDED_HIGHWAYS = {
+    "abandoned",
+    "bridleway",
+    "bus_guideway",
+    "construction",
+    "corridor",
+    "cycleway",
+    "elevator",
+    "escalator",
+    "footway",
+    "no",
+    "path",
+    "pedestrian",
+    "planned",
+    "platform",
+    "proposed",
+    "raceway",
+    "razed",
+    "rest_area",
+    "service",
+    "services",
+    "steps",
+    "track",
+}
+EXCLUDED_SERVICES = {
+    "alley",
+    "driveway",
+    "emergency_access",
+    "parking",
+    "parking_aisle",
+    "private",
+}
+
+# Way tags the filter needs besides the ones osmnx keeps by default
+FILTER_TAGS = ["access", "area", "highway", "motor_vehicle", "motorcar", "service"]
+
+
+class OsmFileService:
+    @staticmethod
+    def read_boundary(path):
+        """City boundary from a GeoJSON file or an Osmosis ``.poly`` file."""
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".poly"):
+                boundary = OsmFileService.parse_poly(f.read())
+            else:
+                data = json.load(f)
+                features = data.get("features", [data])
+                boundary = unary_union(
+                    [shape(feature.get("geometry", feature)) for feature in features]
+                )
+
+        if not isinstance(boundary, (Polygon, MultiPolygon)) or boundary.is_empty:
+            raise ValueError("The boundary file must hold a polygon")
+
+        return boundary
+
+    @staticmethod
+    def parse_poly(text):
+        """Polygon of an Osmosis ``.poly`` file.
+
+        The first line names the file; then each section is a ring of
+        ``lon lat`` lines closed by ``END``, and rings named with a leading
+        ``!`` are holes of the ring before them.
+        """
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        polygons = []
+        ring, hole = None, False
+        for line in lines[1:]:
+            if ring is None:
+                if line == "END":
+                    break
+                ring, hole = [], line.startswith("!")
+            elif line == "END":
+                if hole and polygons:
+                    shell, holes = polygons[-1]
+                    polygons[-1] = (shell, holes + [ring])
+                elif not hole:
+                    polygons.append((ring, []))
+                ring = None
+            else:
+                lon, lat = line.split()[:2]
+                ring.append((float(lon), float(lat)))
+
+        return unary_union([Polygon(shell, holes) for shell, holes in polygons])
+
+    @staticmethod
+    def pbf_to_xml(path, directory):
+        """Copy of a ``.pbf`` extract as ``.osm`` XML, the format osmnx reads."""
+        try:
+            import osmium
+        except ImportError:
+            raise ValueError("Reading .pbf extracts needs pyosmium: pip install osmium")
+
+        xml_path = os.path.join(directory, "extract.osm")
+        writer = osmium.SimpleWriter(xml_path)
+        try:
+            for obj in osmium.FileProcessor(path):
+                writer.add(obj)
+        finally:
+            writer.close()
+
+        return xml_path
+
+    @staticmethod
+    def is_drivable(data):
+        highway = data.get("highway")
+        if highway is None or highway in EXCLUDED_HIGHWAYS:
+            return False
+
+        return not (
+            data.get("area") == "yes"
+            or data.get("access") == "private"
+            or data.get("motor_vehicle") == "no"
+            or data.get("motorcar") == "no"
+            or data.get("service") in EXCLUDED_SERVICES
+        )
+
+    @staticmethod
+    def read_osm(path):
+        """Unsimplified graph of every way of an ``.osm`` (or ``.pbf``) file."""
+        useful_tags = ox.settings.useful_tags_way
+        ox.settings.useful_tags_way = sorted(set(useful_tags) | set(FILTER_TAGS))
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                if path.endswith(".pbf"):
+                    path = OsmFileService.pbf_to_xml(path, directory)
+                return ox.graph_from_xml(path, simplify=False, retain_all=True)
+        finally:
+            ox.settings.useful_tags_way = useful_tags
+
+    @staticmethod
+    def build_graph(osm_path, boundary_path, network_type="drive"):
+        """Road graph of the area inside the boundary, read from a local extract.
+
+        The result matches what ``ox.graph_from_place`` downloads: drivable
+        streets only, cut at the boundary, its largest connected part and
+        simplified.
+        """
+        if network_type != "drive":
+            raise ValueError("Only the drive network can be read from a file")
+
+        boundary = OsmFileService.read_boundary(boundary_path)
+        G = OsmFileService.read_osm(osm_path)
+
+        G.remove_edges_from(
+            [
+                (u, v, k)
+                for u, v, k, data in G.edges(keys=True, data=True)
+                if not OsmFileService.is_drivable(data)
+            ]
+        )
+        G.remove_nodes_from(list(nx.isolates(G)))
+        if not len(G):
+            raise ValueError("The extract has no drivable streets")
+
+        G = ox.truncate.truncate_graph_polygon(G, boundary)
+        if not len(G):
+            raise ValueError("The extract has no drivable streets inside the boundary")
+        G = ox.truncate.largest_component(G)
+        return ox.simplify_graph(G)
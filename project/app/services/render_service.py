@@ -0,0 +1,243 @@
+from ..cruds.trip_stop_crud import TripStopCrud
+from ..services.file_service import atomic_path
+from ..services.geometry_service import trip_geometry
+from ..services.graph_service import GraphService
+from ..services.tile_service import TileService
+from django.conf import settings
+import folium
+import hashlib
+import html
+import json
+import matplotlib
+import matplotlib.pyplot as plt
+import os
+import osmnx as ox
+
+# File extension of each kind of route artifact
+RENDER_FORMATS = {"image": "png", "map": "html"}
+
+# Figure size (inches) and resolution of the route images
+RENDER_PRESETS = {
+    "thumbnail": {"figsize": (4, 4), "dpi": 72},
+    "standard": {"figsize": (8, 8), "dpi": 150},
+    "print": {"figsize": (12, 12), "dpi": 300},
+}
+
+# Drawn area: the surroundings of the route or the whole city
+RENDER_AREAS = ["route", "city"]
+
+# Smallest margin around the route, in degrees (about 200 m)
+MIN_RENDER_MARGIN = 0.002
+
+
+class RenderService:
+    @staticmethod
+    def route_bounds(geometry, margin):
+        """Route bounds as ``(west, south, east, north)``.
+
+        Every side grows by ``margin`` times the route's size, and by at least
+        ``MIN_RENDER_MARGIN``.
+        """
+        points = [point for segment in geometry["segments"] for point in segment]
+        points += [[stop["lat"], stop["lon"]] for stop in geometry["stops"]]
+        lats = [lat for lat, _ in points]
+        lons = [lon for _, lon in points]
+
+        pad_lat = max((max(lats) - min(lats)) * margin, MIN_RENDER_MARGIN)
+        pad_lon = max((max(lons) - min(lons)) * margin, MIN_RENDER_MARGIN)
+        return (
+            min(lons) - pad_lon,
+            min(lats) - pad_lat,
+            max(lons) + pad_lon,
+            max(lats) + pad_lat,
+        )
+
+    @staticmethod
+    def crop_graph(G, bounds):
+        """Streets of ``G`` with at least one end inside ``bounds``."""
+        west, south, east, north = bounds
+        inside = [
+            node
+            for node, data in G.nodes(data=True)
+            if west <= data["x"] <= east and south <= data["y"] <= north
+        ]
+
+        # The neighbours keep the streets that cross the border, the axes
+        # limits cut them at the edge of the picture
+        keep = set(inside)
+        for node in inside:
+            keep.update(G.successors(node))
+            keep.update(G.predecessors(node))
+
+        return G.subgraph(keep)
+
+    @staticmethod
+    def drawing_graph(trip, geometry):
+        """Streets to draw the route on, the same ones it was planned on.
+
+        That is the depot city or, for a route that leaves it, the map tiles
+        around the route. Stops whose address was deleted since are drawn
+        from their stored coordinates, wherever they are.
+        """
+        if trip.origin_depot is not None:
+            depot = trip.origin_depot.address
+            place = (depot.city, depot.state, depot.country)
+            if all(
+                (stop.address.city, stop.address.state, stop.address.country) == place
+                for stop in TripStopCrud.read_by_trip(trip.id)
+                if stop.address is not None
+            ):
+                return GraphService.load_graph(*place)
+
+        points = [point for segment in geometry["segments"] for point in segment]
+        points += [[stop["lat"], stop["lon"]] for stop in geometry["stops"]]
+        return TileService.load_region(
+            [lat for lat, _ in points], [lon for _, lon in points]
+        )
+
+    @staticmethod
+    def plot_route(G, geometry, preset="standard", area="route"):
+        matplotlib.use("Agg")
+        bounds = None
+        if area == "route":
+            bounds = RenderService.route_bounds(
+                geometry, settings.ROUTING_RENDER_MARGIN
+            )
+            G = RenderService.crop_graph(G, bounds)
+
+        fig, ax = ox.plot_graph(
+            G,
+            figsize=RENDER_PRESETS[preset]["figsize"],
+            bbox=bounds,
+            node_size=0,
+            show=False,
+            close=False,
+        )
+
+        colors = ["cyan", "orange", "lime", "magenta", "yellow", "white"]
+        for i, segment in enumerate(geometry["segments"]):
+            lats, lons = zip(*segment)
+            ax.plot(
+                lons,
+                lats,
+                color=colors[i % len(colors)],
+                linewidth=3,
+                alpha=0.5,
+                solid_capstyle="round",
+                zorder=4,
+            )
+
+        stops = geometry["stops"]
+        ax.scatter(
+            [stop["lon"] for stop in stops],
+            [stop["lat"] for stop in stops],
+            s=120,
+            c="red",
+            zorder=5,
+            edgecolors="white",
+        )
+        for stop_number, stop in enumerate(stops):
+            ax.text(
+                stop["lon"],
+                stop["lat"],
+                str(stop_number),
+                fontsize=11,
+                color="yellow",
+                weight="bold",
+                zorder=10,
+            )
+
+        return fig
+
+    @staticmethod
+    def map_route(geometry):
+        stops = geometry["stops"]
+        center_lat = sum(stop["lat"] for stop in stops) / len(stops)
+        center_lon = sum(stop["lon"] for stop in stops) / len(stops)
+
+        graph_map = folium.Map(location=[center_lat, center_lon], zoom_start=13)
+
+        folium_colors = [
+            "#00FFFF",
+            "#FFA500",
+            "#00FF00",
+            "#FF00FF",
+            "#FFFF00",
+            "#0000FF",
+        ]
+
+        for i, segment in enumerate(geometry["segments"]):
+            c = folium_colors[i % len(folium_colors)]
+            folium.PolyLine(segment, color=c, weight=5, opacity=0.7).add_to(graph_map)
+
+        for i, stop in enumerate(stops):
+            if i == 0:
+                folium.Marker(
+                    [stop["lat"], stop["lon"]],
+                    popup=f"Origem/Fim: {html.escape(stop['address'])}",
+                    icon=folium.Icon(color="red", icon="home"),
+                ).add_to(graph_map)
+            elif i == len(stops) - 1:
+                pass
+            else:
+                folium.Marker(
+                    [stop["lat"], stop["lon"]],
+                    popup=f"Parada {i}: {html.escape(stop['address'])}",
+                    icon=folium.Icon(color="blue", icon="info-sign"),
+                ).add_to(graph_map)
+
+        return graph_map
+
+    @staticmethod
+    def artifact_name(geometry, kind, options=()):
+        # Same route, same file: trips sharing a route share the render too
+        content = json.dumps([kind, geometry, *options], sort_keys=True).encode()
+        digest = hashlib.sha256(content).hexdigest()[:24]
+        return f"route-{digest}.{RENDER_FORMATS[kind]}"
+
+    @staticmethod
+    def render(trip, kind, preset=None, area="route"):
+        """Path of the trip's route image or map, drawn on its first request.
+
+        Images are drawn with one of the ``RENDER_PRESETS`` (by default the
+        ``ROUTING_RENDER_PRESET`` setting), showing only the surroundings of
+        the route or, with ``area="city"``, the whole city.
+        """
+        if kind not in RENDER_FORMATS:
+            raise ValueError(
+                f"Route render must be one of: {', '.join(RENDER_FORMATS)}"
+            )
+        preset = preset or settings.ROUTING_RENDER_PRESET
+        if preset not in RENDER_PRESETS:
+            raise ValueError(
+                f"Render preset must be one of: {', '.join(RENDER_PRESETS)}"
+            )
+        if area not in RENDER_AREAS:
+            raise ValueError(f"Render area must be one of: {', '.join(RENDER_AREAS)}")
+        geometry = trip_geometry(trip)
+        if geometry is None:
+            raise ValueError("Trip has no route to render")
+
+        # The map is interactive: presets and areas only change the images
+        options = (preset, area) if kind == "image" else ()
+        path = os.path.join(
+            settings.ROUTING_RENDER_DIR,
+            RenderService.artifact_name(geometry, kind, options),
+        )
+        if os.path.exists(path):
+            return path
+
+        print(f"Rendering the route {kind} of trip {trip.id}...")
+        os.makedirs(settings.ROUTING_RENDER_DIR, exist_ok=True)
+        # A concurrent request never serves a half written file
+        if kind == "image":
+            G = RenderService.drawing_graph(trip, geometry)
+            fig = RenderService.plot_route(G, geometry, preset, area)
+            with atomic_path(path) as tmp_path:
+                fig.savefig(tmp_path, format="png", dpi=RENDER_PRESETS[preset]["dpi"])
+            plt.close(fig)
+        else:
+            with atomic_path(path) as tmp_path:
+                RenderService.map_route(geometry).save(tmp_path)
+
+        return path
@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from django.conf import settings
+import threading
+
+
+class RouteCacheService:
+    """Routes planned by this process, reused when the same stops are planned again.
+
+    A route is keyed by the depot node, the sorted stop nodes, the graph
+    version and the routing weight, so a new download of the city graph or
+    another objective plans it again. At most ``ROUTING_ROUTE_CACHE_SIZE``
+    routes are kept; the least recently used go first.
+    """
+
+    # key: route, least recently used first
+    _routes = OrderedDict()
+    # Threads planning at once must not reorder it while another evicts
+    _lock = threading.Lock()
+
+    @staticmethod
+    def key(nodes, version, weight):
+        """Cache key of the stops ``nodes`` (the depot first), or None.
+
+        Graphs without a version (stitched from map tiles) are not cached.
+        """
+        if version is None:
+            return None
+
+        return (nodes[0], tuple(sorted(nodes[1:])), version, weight)
+
+    @staticmethod
+    def get(key):
+        with RouteCacheService._lock:
+            route = RouteCacheService._routes.get(key)
+            if route is not None:
+                RouteCacheService._routes.move_to_end(key)
+            return route
+
+    @staticmethod
+    def put(key, route):
+        if key is None or settings.ROUTING_ROUTE_CACHE_SIZE <= 0:
+            return
+
+        with RouteCacheService._lock:
+            RouteCacheService._routes[key] = route
+            RouteCacheService._routes.move_to_end(key)
+            while len(RouteCacheService._routes) > settings.ROUTING_ROUTE_CACHE_SIZE:
+                RouteCacheService._routes.popitem(last=False)
+
+    @staticmethod
+    def tour_positions(tour, nodes):
+        """Positions in ``nodes`` of a tour given as node ids.
+
+        The tour starts and ends at the depot, ``nodes[0]``; stops sharing a
+        node are visited in the order they appear in ``nodes``.
+        """
+        positions = {}
+        for position, node in enumerate(nodes[1:], 1):
+            positions.setdefault(node, []).append(position)
+
+        return [0] + [positions[node].pop(0) for node in tour[1:-1]] + [0]
@@ -0,0 +1,664 @@
+import heapq
+import json
+import multiprocessing
+import os
+import pickle
+import struct
+import numpy as np
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.neighbors import KDTree
+
+EARTH_RADIUS_M = 6371008.8
+
+# Header of a mapped array file: format tag, size of the JSON table of contents
+ARRAYS_HEADER = struct.Struct("<4sI")
+ARRAYS_FORMAT = b"RGA1"
+# Arrays start at multiples of this many bytes, so every dtype is aligned
+ARRAYS_ALIGNMENT = 64
+
+
+def aligned(size):
+    return -(-size // ARRAYS_ALIGNMENT) * ARRAYS_ALIGNMENT
+
+
+def save_arrays(path, arrays, attrs=None):
+    """Writes NumPy arrays to a single file that ``map_arrays`` maps back.
+
+    A JSON table of contents with the dtype, shape and offset of each array
+    (plus the ``attrs`` dict) is followed by the raw bytes of the arrays,
+    exactly as they sit in memory.
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    entries, offset = {}, 0
+    for name, array in arrays.items():
+        entries[name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+        }
+        offset = aligned(offset + array.nbytes)
+
+    contents = json.dumps({"arrays": entries, "attrs": attrs or {}}).encode()
+    start = aligned(ARRAYS_HEADER.size + len(contents))
+    with open(path, "wb") as f:
+        f.write(ARRAYS_HEADER.pack(ARRAYS_FORMAT, len(contents)) + contents)
+        for name, array in arrays.items():
+            f.seek(start + entries[name]["offset"])
+            array.tofile(f)
+
+
+def map_arrays(path, mmap=True):
+    """Arrays and attrs of a file written by ``save_arrays``.
+
+    With ``mmap`` the arrays are read-only views of the file mapped in
+    memory: every process mapping it shares the same pages, loaded by the
+    OS only when touched. Otherwise the file is read into a private copy.
+    """
+    with open(path, "rb") as f:
+        tag, size = ARRAYS_HEADER.unpack(f.read(ARRAYS_HEADER.size))
+        if tag != ARRAYS_FORMAT:
+            raise ValueError("Unknown array file format")
+        contents = json.loads(f.read(size))
+
+    if mmap:
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+    else:
+        data = np.fromfile(path, dtype=np.uint8)
+
+    start = aligned(ARRAYS_HEADER.size + size)
+    arrays = {}
+    for name, entry in contents["arrays"].items():
+        dtype = np.dtype(entry["dtype"])
+        offset = start + entry["offset"]
+        nbytes = int(np.prod(entry["shape"])) * dtype.itemsize
+        arrays[name] = (
+            data[offset : offset + nbytes].view(dtype).reshape(entry["shape"])
+        )
+
+    return arrays, contents["attrs"]
+
+
+def great_circle(lat1, lon1, lat2, lon2):
+    """Haversine distance in meters, vectorized over NumPy arrays."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    h = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+class NodeIndex(Mapping):
+    """Position in a ``CompactGraph`` of each node id.
+
+    The ids are kept sorted in an array and searched by bisection: unlike a
+    dict, it is stored in the graph file and shared when the file is mapped.
+    """
+
+    def __init__(self, sorted_ids, positions):
+        self.sorted_ids = sorted_ids
+        self.positions = positions
+
+    @classmethod
+    def from_ids(cls, node_ids):
+        order = np.argsort(node_ids, kind="stable")
+        return cls(node_ids[order], order)
+
+    def __getitem__(self, node):
+        i = np.searchsorted(self.sorted_ids, node)
+        if i < len(self.sorted_ids) and self.sorted_ids[i] == node:
+            return int(self.positions[i])
+        raise KeyError(node)
+
+    def __iter__(self):
+        return iter(self.sorted_ids.tolist())
+
+    def __len__(self):
+        return len(self.sorted_ids)
+
+
+class CompactGraph:
+    """Road graph stored as CSR arrays, built once from the OSMnx graph.
+
+    The outgoing edges of the node at index ``u`` are
+    ``targets[offsets[u]:offsets[u + 1]]`` with costs in the same slice of
+    ``weights``. Parallel edges are collapsed to the cheapest one.
+
+    A graph loaded from its file maps it read-only, so every worker process
+    routing on the same city shares one copy of the arrays.
+    """
+
+    def __init__(
+        self, node_ids, offsets, targets, weights, lats, lons, weight, index=None
+    ):
+        self.node_ids = node_ids
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.lats = lats
+        self.lons = lons
+        self.weight = weight
+        self.index = NodeIndex.from_ids(node_ids) if index is None else index
+        self.mapped_from = None
+        self._reverse = None
+        self._bound_scale = None
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @classmethod
+    def from_graph(cls, G, weight="length"):
+        node_ids = np.fromiter(G.nodes, dtype=np.int64, count=len(G))
+        index = {node: i for i, node in enumerate(node_ids.tolist())}
+
+        collapsed = {}
+        for u, v, w in G.edges(data=weight):
+            if w is None:
+                raise ValueError(f"Edge ({u}, {v}) has no {weight} attribute")
+            edge = (index[u], index[v])
+            if w < collapsed.get(edge, float("inf")):
+                collapsed[edge] = w
+
+        edges = np.array(list(collapsed.keys()), dtype=np.int64).reshape(-1, 2)
+        costs = np.array(list(collapsed.values()), dtype=np.float64)
+        order = np.lexsort((edges[:, 1], edges[:, 0]))
+
+        offsets = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edges[:, 0], minlength=len(node_ids)), out=offsets[1:])
+
+        lats = np.array([G.nodes[n].get("y", np.nan) for n in G.nodes], dtype=float)
+        lons = np.array([G.nodes[n].get("x", np.nan) for n in G.nodes], dtype=float)
+
+        return cls(
+            node_ids,
+            offsets,
+            edges[order, 1].astype(np.int32),
+            costs[order],
+            lats,
+            lons,
+            weight,
+        )
+
+    def __reduce_ex__(self, protocol):
+        # A mapped graph travels as its file name: spawned matrix workers map
+        # the same pages instead of unpickling a copy
+        if self.mapped_from is None:
+            return super().__reduce_ex__(protocol)
+        return (CompactGraph.load, (self.mapped_from,))
+
+    def save(self, path):
+        """Writes the graph, its node index and its reverse edges to one file."""
+        reverse_offsets, reverse_sources, reverse_weights = self.reverse()
+        save_arrays(
+            path,
+            {
+                "node_ids": self.node_ids,
+                "offsets": self.offsets,
+                "targets": self.targets,
+                "weights": self.weights,
+                "lats": self.lats,
+                "lons": self.lons,
+                "sorted_ids": self.index.sorted_ids,
+                "positions": self.index.positions,
+                "reverse_offsets": reverse_offsets,
+                "reverse_sources": reverse_sources,
+                "reverse_weights": reverse_weights,
+            },
+            {"weight": self.weight, "bound_scale": self.bound_scale()},
+        )
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Graph saved by ``save``, mapped read-only unless ``mmap`` is False."""
+        arrays, attrs = map_arrays(path, mmap)
+        graph = cls(
+            arrays["node_ids"],
+            arrays["offsets"],
+            arrays["targets"],
+            arrays["weights"],
+            arrays["lats"],
+            arrays["lons"],
+            attrs["weight"],
+            NodeIndex(arrays["sorted_ids"], arrays["positions"]),
+        )
+        graph._reverse = (
+            arrays["reverse_offsets"],
+            arrays["reverse_sources"],
+            arrays["reverse_weights"],
+        )
+        graph._bound_scale = attrs["bound_scale"]
+        if mmap:
+            graph.mapped_from = os.path.abspath(path)
+        return graph
+
+    def edge_sources(self):
+        return np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.offsets))
+
+    def reverse(self):
+        """Incoming edges as ``(offsets, sources, weights)`` CSR arrays."""
+        if self._reverse is None:
+            order = np.argsort(self.targets, kind="stable")
+            offsets = np.zeros(len(self) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.targets, minlength=len(self)), out=offsets[1:])
+            self._reverse = (offsets, self.edge_sources()[order], self.weights[order])
+
+        return self._reverse
+
+    def bound_scale(self):
+        """Smallest edge cost per meter of great-circle distance.
+
+        Multiplying a great-circle distance by it never overestimates the
+        real cost, whatever the edge weight is (length, travel time...).
+        """
+        if self._bound_scale is None:
+            sources = self.edge_sources()
+            span = great_circle(
+                self.lats[sources],
+                self.lons[sources],
+                self.lats[self.targets],
+                self.lons[self.targets],
+            )
+            valid = span > 0
+            ratios = self.weights[valid] / span[valid]
+            self._bound_scale = float(ratios.min()) if ratios.size else 0.0
+
+        return self._bound_scale
+
+    def lower_bounds(self, goal):
+        """Admissible estimate of the cost from every node to ``goal``."""
+        span = great_circle(self.lats, self.lons, self.lats[goal], self.lons[goal])
+        return np.nan_to_num(span * self.bound_scale(), nan=0.0)
+
+    def build_path(self, prev, target):
+        path = []
+        u = target
+        while u != -1:
+            path.append(u)
+            u = prev[u]
+        path.reverse()
+        return self.node_ids[path].tolist()
+
+
+class SnapIndex:
+    """KD-tree over the graph nodes for nearest node queries.
+
+    Coordinates are projected to meters with an equirectangular projection
+    centered on the city, accurate enough at city scale and cheap to apply
+    to a whole batch of points at once.
+    """
+
+    def __init__(self, node_ids, lat0, tree):
+        self.node_ids = node_ids
+        self.lat0 = lat0
+        self.tree = tree
+
+    @staticmethod
+    def project(lats, lons, lat0):
+        lats = np.radians(np.asarray(lats, dtype=float))
+        lons = np.radians(np.asarray(lons, dtype=float))
+        x = EARTH_RADIUS_M * lons * np.cos(np.radians(lat0))
+        return np.column_stack((x, EARTH_RADIUS_M * lats))
+
+    @classmethod
+    def from_graph(cls, graph):
+        valid = ~(np.isnan(graph.lats) | np.isnan(graph.lons))
+        lat0 = float(graph.lats[valid].mean())
+        points = cls.project(graph.lats[valid], graph.lons[valid], lat0)
+        return cls(graph.node_ids[valid], lat0, KDTree(points))
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def nearest(self, lats, lons):
+        """Ids of the nodes closest to each point, for any number of points."""
+        _, index = self.tree.query(self.project(lats, lons, self.lat0), k=1)
+        return self.node_ids[index[:, 0]].tolist()
+
+
+def dijkstra(graph, start, target, stats=None):
+    source = graph.index[start]
+    goal = graph.index[target]
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+
+    # Flat lists indexed by node position: far cheaper than dicts keyed by OSM id
+    dist = [float("inf")] * len(graph)
+    prev = [-1] * len(graph)
+    dist[source] = 0.0
+    pq = [(0.0, source)]
+    settled = 0
+
+    while pq:
+        current_dist, u = heapq.heappop(pq)
+
+        if current_dist > dist[u]:
+            continue
+
+        settled += 1
+        if u == goal:
+            break
+
+        first, last = offsets[u], offsets[u + 1]
+        for v, w in zip(targets[first:last].tolist(), weights[first:last].tolist()):
+            new_dist = current_dist + w
+
+            if new_dist < dist[v]:
+                dist[v] = new_dist
+                prev[v] = u
+                heapq.heappush(pq, (new_dist, v))
+
+    if stats is not None:
+        stats["settled"] = settled
+
+    if dist[goal] == float("inf"):
+        return float("inf"), []
+
+    return dist[goal], graph.build_path(prev, goal)
+
+
+def astar(graph, start, target, stats=None, bounds=None):
+    """A* guided by the great-circle lower bound to the target.
+
+    ``bounds``, the ``lower_bounds`` of the target as a list, saves computing
+    them again when several searches share the target.
+    """
+    source = graph.index[start]
+    goal = graph.index[target]
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    if bounds is None:
+        bounds = graph.lower_bounds(goal).tolist()
+
+    dist = [float("inf")] * len(graph)
+    prev = [-1] * len(graph)
+    dist[source] = 0.0
+    pq = [(bounds[source], source)]
+    settled = 0
+
+    while pq:
+        estimate, u = heapq.heappop(pq)
+
+        current_dist = dist[u]
+        if estimate > current_dist + bounds[u]:
+            continue
+
+        settled += 1
+        if u == goal:
+            break
+
+        first, last = offsets[u], offsets[u + 1]
+        for v, w in zip(targets[first:last].tolist(), weights[first:last].tolist()):
+            new_dist = current_dist + w
+
+            if new_dist < dist[v]:
+                dist[v] = new_dist
+                prev[v] = u
+                heapq.heappush(pq, (new_dist + bounds[v], v))
+
+    if stats is not None:
+        stats["settled"] = settled
+
+    if dist[goal] == float("inf"):
+        return float("inf"), []
+
+    return dist[goal], graph.build_path(prev, goal)
+
+
+def bidirectional_dijkstra(graph, start, target, stats=None):
+    """Dijkstra from both ends at once, meeting around the middle of the leg."""
+    source = graph.index[start]
+    goal = graph.index[target]
+    inf = float("inf")
+
+    # Index 0 searches forward from the source, index 1 backward from the goal
+    arrays = ((graph.offsets, graph.targets, graph.weights), graph.reverse())
+    dist = ([inf] * len(graph), [inf] * len(graph))
+    prev = ([-1] * len(graph), [-1] * len(graph))
+    dist[0][source] = 0.0
+    dist[1][goal] = 0.0
+    queues = ([(0.0, source)], [(0.0, goal)])
+
+    best, meeting = (0.0, source) if source == goal else (inf, -1)
+    settled = 0
+
+    while queues[0] and queues[1]:
+        if queues[0][0][0] + queues[1][0][0] >= best:
+            break
+
+        side = 0 if len(queues[0]) <= len(queues[1]) else 1
+        current_dist, u = heapq.heappop(queues[side])
+
+        if current_dist > dist[side][u]:
+            continue
+
+        settled += 1
+        offsets, targets, weights = arrays[side]
+        side_dist, other_dist, side_prev = dist[side], dist[1 - side], prev[side]
+
+        first, last = offsets[u], offsets[u + 1]
+        for v, w in zip(targets[first:last].tolist(), weights[first:last].tolist()):
+            new_dist = current_dist + w
+
+            if new_dist < side_dist[v]:
+                side_dist[v] = new_dist
+                side_prev[v] = u
+                heapq.heappush(queues[side], (new_dist, v))
+
+            if new_dist + other_dist[v] < best:
+                best = new_dist + other_dist[v]
+                meeting = v
+
+    if stats is not None:
+        stats["settled"] = settled
+
+    if best == inf:
+        return inf, []
+
+    path = graph.build_path(prev[0], meeting)
+    u = prev[1][meeting]
+    while u != -1:
+        path.append(graph.node_ids[u].item())
+        u = prev[1][u]
+
+    return best, path
+
+
+# Edge attribute minimized by each routing objective
+ROUTING_WEIGHTS = {"distance": "length", "time": "travel_time"}
+
+SEARCH_STRATEGIES = {
+    "dijkstra": dijkstra,
+    "astar": astar,
+    "bidirectional": bidirectional_dijkstra,
+}
+
+
+def shortest_path(graph, start, target, strategy="dijkstra", stats=None):
+    if strategy not in SEARCH_STRATEGIES:
+        raise ValueError(
+            f"Search strategy must be one of: {', '.join(SEARCH_STRATEGIES)}"
+        )
+
+    return SEARCH_STRATEGIES[strategy](graph, start, target, stats)
+
+
+def pathing_route_dijkstra(G, start, target, weight="length"):
+    if not isinstance(G, CompactGraph):
+        G = CompactGraph.from_graph(G, weight)
+
+    return dijkstra(G, start, target)
+
+
+def shortest_path_tree(graph, source, targets=None):
+    """Single-source Dijkstra from the node index ``source``.
+
+    Stops as soon as every node index in ``targets`` is settled (or runs over
+    the whole graph when no targets are given) and returns the ``dist`` and
+    ``prev`` lists indexed by node position.
+    """
+    offsets, targets_array, weights = graph.offsets, graph.targets, graph.weights
+    remaining = set(targets) if targets is not None else None
+
+    dist = [float("inf")] * len(graph)
+    prev = [-1] * len(graph)
+    dist[source] = 0.0
+    pq = [(0.0, source)]
+
+    while pq:
+        current_dist, u = heapq.heappop(pq)
+
+        if current_dist > dist[u]:
+            continue
+
+        if remaining is not None:
+            remaining.discard(u)
+            if not remaining:
+                break
+
+        first, last = offsets[u], offsets[u + 1]
+        for v, w in zip(
+            targets_array[first:last].tolist(), weights[first:last].tolist()
+        ):
+            new_dist = current_dist + w
+
+            if new_dist < dist[v]:
+                dist[v] = new_dist
+                prev[v] = u
+                heapq.heappush(pq, (new_dist, v))
+
+    return dist, prev
+
+
+class DistanceMatrix:
+    """Shortest distances between every pair of stops.
+
+    ``distances[i][j]`` is the cost from ``nodes[i]`` to ``nodes[j]``.
+    ``path(i, j)`` rebuilds the node ids of that leg from the predecessor tree
+    of the search that started at ``nodes[i]`` or, when the matrix was filled
+    by point-to-point searches, runs that search again for the leg.
+    """
+
+    def __init__(self, graph, nodes, distances, trees=None, strategy="dijkstra"):
+        self.graph = graph
+        self.nodes = nodes
+        self.distances = distances
+        self.trees = trees
+        self.strategy = strategy
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def path(self, i, j):
+        if self.distances[i][j] == float("inf"):
+            return []
+
+        if self.trees is None:
+            _, path = shortest_path(
+                self.graph, self.nodes[i], self.nodes[j], self.strategy
+            )
+            return path
+
+        target = self.graph.index[self.nodes[j]]
+        return self.graph.build_path(self.trees[i], target)
+
+
+# Graph of the current matrix worker process, set once when the worker starts
+_worker_graph = None
+
+
+def _init_matrix_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _matrix_rows(graph, sources, indexes, strategy):
+    """Rows of the distance matrix for the stop positions in ``sources``."""
+    rows, trees = [], []
+
+    if strategy == "astar":
+        # The bounds only depend on the target: computed once per column
+        rows = [[0.0] * len(indexes) for _ in sources]
+        for j, target in enumerate(indexes):
+            bounds = graph.lower_bounds(target).tolist()
+            goal = graph.node_ids[target].item()
+            for row, i in zip(rows, sources):
+                start = graph.node_ids[indexes[i]].item()
+                row[j] = astar(graph, start, goal, bounds=bounds)[0]
+        return rows, trees
+
+    for i in sources:
+        if strategy != "dijkstra":
+            start = graph.node_ids[indexes[i]].item()
+            rows.append(
+                [
+                    shortest_path(
+                        graph, start, graph.node_ids[target].item(), strategy
+                    )[0]
+                    for target in indexes
+                ]
+            )
+            continue
+
+        dist, prev = shortest_path_tree(graph, indexes[i], indexes)
+        rows.append([dist[target] for target in indexes])
+        trees.append(np.array(prev, dtype=np.int32))
+
+    return rows, trees
+
+
+def _worker_matrix_rows(sources, indexes, strategy):
+    return _matrix_rows(_worker_graph, sources, indexes, strategy)
+
+
+def matrix_pool(graph, workers):
+    """Process pool whose workers all hold ``graph``.
+
+    The graph goes to each worker once, when it starts: forked workers share
+    the parent's arrays copy-on-write, spawned ones map its file again or,
+    for a graph built in memory, unpickle it a single time.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_matrix_worker,
+        initargs=(graph,),
+    )
+
+
+def distance_matrix(graph, nodes, strategy="dijkstra", workers=1):
+    """Distances between every pair of ``nodes``.
+
+    The default strategy runs one search per stop over the whole stop set;
+    the others run a point-to-point search for each pair of stops. With more
+    than one worker the source stops are split across a process pool.
+    """
+    indexes = [graph.index[node] for node in nodes]
+    workers = min(workers, len(nodes))
+
+    if workers <= 1:
+        rows, trees = _matrix_rows(graph, range(len(nodes)), indexes, strategy)
+    else:
+        chunks = np.array_split(np.arange(len(nodes)), workers)
+        rows, trees = [], []
+        with matrix_pool(graph, workers) as pool:
+            for chunk_rows, chunk_trees in pool.map(
+                _worker_matrix_rows,
+                [chunk.tolist() for chunk in chunks],
+                [indexes] * workers,
+                [strategy] * workers,
+            ):
+                rows.extend(chunk_rows)
+                trees.extend(chunk_trees)
+
+    distances = np.array(rows, dtype=np.float64).reshape(len(nodes), len(nodes))
+    if strategy != "dijkstra":
+        return DistanceMatrix(graph, list(nodes), distances, strategy=strategy)
+
+    return DistanceMatrix(graph, list(nodes), distances, trees)
@@ -0,0 +1,232 @@
+from collections import OrderedDict
+from django.conf import settings
+from .file_service import atomic_path
+from .graph_service import GraphService
+import math
+import os
+import pickle
+import shutil
+import threading
+import networkx as nx
+import osmnx as ox
+
+
+class TileService:
+    """Road graph cut in fixed square tiles of ``ROUTING_TILE_SIZE`` degrees.
+
+    Each tile holds the streets that start inside it, with both of their
+    ends, so the tiles around a set of stops stitch back into one graph.
+    Every tile is cached in its own file and at most ``ROUTING_TILE_CACHE_SIZE``
+    of them stay loaded in the process.
+    """
+
+    # Tiles loaded by this process, least recently used first:
+    # (network type, tile): (file mtime, graph)
+    _tiles = OrderedDict()
+    # Threads loading tiles at once must not reorder it while another evicts
+    _lock = threading.Lock()
+
+    @staticmethod
+    def tile_of(lat, lon):
+        size = settings.ROUTING_TILE_SIZE
+        return (math.floor(lon / size), math.floor(lat / size))
+
+    @staticmethod
+    def tile_bounds(tile):
+        """Tile bounds as ``(west, south, east, north)``."""
+        size = settings.ROUTING_TILE_SIZE
+        x, y = tile
+        return (x * size, y * size, (x + 1) * size, (y + 1) * size)
+
+    @staticmethod
+    def tiles_covering(lats, lons):
+        """Tiles of the bounding box of the points, grown by ``ROUTING_TILE_MARGIN``.
+
+        The margin leaves room for the streets a route takes around the
+        points.
+        """
+        margin = settings.ROUTING_TILE_MARGIN
+        west, south = TileService.tile_of(min(lats) - margin, min(lons) - margin)
+        east, north = TileService.tile_of(max(lats) + margin, max(lons) + margin)
+        return [(x, y) for x in range(west, east + 1) for y in range(south, north + 1)]
+
+    @staticmethod
+    def tile_dir(network_type="drive"):
+        return os.path.join(settings.ROUTING_GRAPH_CACHE_DIR, f"tiles-{network_type}")
+
+    @staticmethod
+    def tile_path(tile, network_type="drive"):
+        x, y = tile
+        return os.path.join(TileService.tile_dir(network_type), f"{x}_{y}.pickle")
+
+    @staticmethod
+    def import_path(tile, network_type="drive"):
+        """Marks a tile holding an imported graph, never downloaded again."""
+        x, y = tile
+        return os.path.join(TileService.tile_dir(network_type), f"{x}_{y}.import")
+
+    @staticmethod
+    def cut_tile(G, tile):
+        """Streets of ``G`` that start inside the tile, with both of their ends."""
+        west, south, east, north = TileService.tile_bounds(tile)
+        inside = {
+            node
+            for node, data in G.nodes(data=True)
+            if west <= data["x"] < east and south <= data["y"] < north
+        }
+        edges = [(u, v, k) for u, v, k in G.edges(keys=True) if u in inside]
+
+        tile_graph = G.edge_subgraph(edges).copy()
+        tile_graph.add_nodes_from((node, G.nodes[node]) for node in inside)
+        return tile_graph
+
+    @staticmethod
+    def build_tile(tile, network_type="drive"):
+        """Downloads the streets of a tile, with travel times."""
+        # Streets that cross the border keep their far end
+        buffer = settings.ROUTING_TILE_MARGIN
+        west, south, east, north = TileService.tile_bounds(tile)
+        try:
+            G = ox.graph_from_bbox(
+                (west - buffer, south - buffer, east + buffer, north + buffer),
+                network_type=network_type,
+                retain_all=True,
+                truncate_by_edge=True,
+            )
+        except ox._errors.InsufficientResponseError:
+            # Nothing to drive on in this tile (sea, forest...)
+            return nx.MultiDiGraph(crs="epsg:4326")
+
+        GraphService.add_travel_times(G)
+        return TileService.cut_tile(G, tile)
+
+    @staticmethod
+    def save_tile(tile, G, network_type="drive"):
+        os.makedirs(TileService.tile_dir(network_type), exist_ok=True)
+        path = TileService.tile_path(tile, network_type)
+        with atomic_path(path) as tmp_path, open(tmp_path, "wb") as f:
+            pickle.dump(G, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        TileService.remember((network_type, tile), os.path.getmtime(path), G)
+        return G
+
+    @staticmethod
+    def split_graph(G, network_type="drive", imported=False):
+        """Stores a city graph into the tiles it covers, joined with what they hold.
+
+        Tiles of an ``imported`` graph are marked so they do not expire.
+        Returns the tiles written.
+        """
+        tiles = sorted(
+            {
+                TileService.tile_of(data["y"], data["x"])
+                for _, data in G.nodes(data=True)
+            }
+        )
+        for tile in tiles:
+            tile_graph = TileService.cut_tile(G, tile)
+            path = TileService.tile_path(tile, network_type)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    tile_graph = nx.compose(pickle.load(f), tile_graph)
+            TileService.save_tile(tile, tile_graph, network_type)
+            if imported:
+                open(TileService.import_path(tile, network_type), "w").close()
+
+        return tiles
+
+    @staticmethod
+    def remember(key, mtime, G):
+        with TileService._lock:
+            TileService._tiles[key] = (mtime, G)
+            TileService._tiles.move_to_end(key)
+            while len(TileService._tiles) > settings.ROUTING_TILE_CACHE_SIZE:
+                TileService._tiles.popitem(last=False)
+
+    @staticmethod
+    def recall(key, mtime):
+        """Graph of a tile loaded from its file at ``mtime``, or None."""
+        with TileService._lock:
+            cached = TileService.recall(key, mtime)
+            if cached is not None:
+                return cached
+
+        return None
+
+    @staticmethod
+    def load_tile(tile, network_type="drive", required=True):
+        """Graph of a tile: from memory, from its file, or downloaded.
+
+        Imported tiles, and every tile when offline, are never downloaded.
+        Offline, a tile that was never imported raises ``ValueError``, or is
+        empty when not ``required``.
+        """
+        key = (network_type, tile)
+        path = TileService.tile_path(tile, network_type)
+        try:
+            mtime = os.path.getmtime(path)
+        except FileNotFoundError:
+            mtime = None
+
+        keep = settings.ROUTING_GRAPH_OFFLINE or os.path.isfile(
+            TileService.import_path(tile, network_type)
+        )
+        if mtime is not None and (keep or not GraphService.is_expired(mtime)):
+            cached = TileService._tiles.get(key)
+            if cached and cached[0] == mtime:
+                TileService._tiles.move_to_end(key)
+                return cached[1]
+
+            with open(path, "rb") as f:
+                G = pickle.load(f)
+            TileService.remember(key, mtime, G)
+            return G
+
+        if settings.ROUTING_GRAPH_OFFLINE:
+            if required:
+                raise ValueError(
+                    f"No road graph tile {tile} is cached; "
+                    "import one with the import_osm_graph command"
+                )
+            return nx.MultiDiGraph(crs="epsg:4326")
+
+        return TileService.save_tile(
+            tile, TileService.build_tile(tile, network_type), network_type
+        )
+
+    @staticmethod
+    def invalidate():
+        """Removes every cached tile. Returns the tile folders removed."""
+        with TileService._lock:
+            TileService._tiles.clear()
+        if not os.path.isdir(settings.ROUTING_GRAPH_CACHE_DIR):
+            return []
+
+        removed = []
+        for name in sorted(os.listdir(settings.ROUTING_GRAPH_CACHE_DIR)):
+            if name.startswith("tiles-"):
+                shutil.rmtree(os.path.join(settings.ROUTING_GRAPH_CACHE_DIR, name))
+                removed.append(name)
+
+        return removed
+
+    @staticmethod
+    def load_region(lats, lons, network_type="drive"):
+        """One graph stitched from the tiles around the points.
+
+        Only the tiles holding the points must exist offline; the ones in
+        the margin around them may be outside every imported city.
+        """
+        tiles = TileService.tiles_covering(lats, lons)
+        stops = {TileService.tile_of(lat, lon) for lat, lon in zip(lats, lons)}
+        G = nx.compose_all(
+            [
+                TileService.load_tile(tile, network_type, required=tile in stops)
+                for tile in tiles
+            ]
+        )
+        # Imported tiles keep the version of the city graph cut into them,
+        # which says nothing of the other tiles: regions are never versioned
+        G.graph.pop("version", None)
+        G.graph.update(crs="epsg:4326", tiles=tiles)
+        return G
@@ -0,0 +1,153 @@
+import time
+import numpy as np
+
+# Smallest saving that counts as an improvement, avoids cycling on float noise
+IMPROVEMENT_EPSILON = 1e-9
+
+
+def tour_length(distances, tour):
+    return float(sum(distances[a][b] for a, b in zip(tour, tour[1:])))
+
+
+def nearest_neighbour_tour(distances):
+    """Greedy tour over the distance matrix, leaving from and returning to stop 0"""
+    tour = [0]
+    remaining = list(range(1, len(distances)))
+
+    while remaining:
+        last = tour[-1]
+        chosen = min(remaining, key=lambda stop: (distances[last][stop], stop))
+        tour.append(chosen)
+        remaining.remove(chosen)
+
+    tour.append(0)
+    return tour
+
+
+def _two_opt_pass(d, tour, deadline):
+    """Applies the first improving segment reversal found, if any.
+
+    Distances may be asymmetric, so the cost of the reversed segment is read
+    from prefix sums of the tour walked in both directions.
+    """
+    forward = [0.0]
+    backward = [0.0]
+    for a, b in zip(tour, tour[1:]):
+        forward.append(forward[-1] + d[a][b])
+        backward.append(backward[-1] + d[b][a])
+
+    last = len(tour) - 1
+    for i in range(1, last - 1):
+        if time.perf_counter() > deadline:
+            return False
+
+        before = tour[i - 1]
+        for j in range(i + 1, last):
+            after = tour[j + 1]
+            old = d[before][tour[i]] + forward[j] - forward[i] + d[tour[j]][after]
+            new = d[before][tour[j]] + backward[j] - backward[i] + d[tour[i]][after]
+
+            if new < old - IMPROVEMENT_EPSILON:
+                tour[i : j + 1] = reversed(tour[i : j + 1])
+                return True
+
+    return False
+
+
+def _or_opt_pass(d, tour, deadline):
+    """Moves a run of up to three stops to a cheaper place in the tour."""
+    last = len(tour) - 1
+    for length in (1, 2, 3):
+        for i in range(1, last - length + 1):
+            if time.perf_counter() > deadline:
+                return False
+
+            first, end = tour[i], tour[i + length - 1]
+            before, after = tour[i - 1], tour[i + length]
+            removal = d[before][first] + d[end][after] - d[before][after]
+
+            for p in range(last):
+                if i - 1 <= p <= i + length - 1:
+                    continue
+
+                a, b = tour[p], tour[p + 1]
+                insertion = d[a][first] + d[end][b] - d[a][b]
+                if insertion < removal - IMPROVEMENT_EPSILON:
+                    segment = tour[i : i + length]
+                    del tour[i : i + length]
+                    position = p + 1 if p < i else p + 1 - length
+                    tour[position:position] = segment
+                    return True
+
+    return False
+
+
+def improve_tour(distances, tour, time_budget=None):
+    """2-opt and Or-opt local search over a closed tour.
+
+    The depot stays at both ends. Stops when no move improves the tour or
+    after ``time_budget`` seconds; a budget of 0 leaves the tour as it is.
+    """
+    d = distances.tolist() if hasattr(distances, "tolist") else distances
+    tour = list(tour)
+    if time_budget is not None and time_budget <= 0:
+        return tour
+    deadline = (
+        float("inf") if time_budget is None else time.perf_counter() + time_budget
+    )
+
+    while _two_opt_pass(d, tour, deadline) or _or_opt_pass(d, tour, deadline):
+        pass
+
+    return tour
+
+
+def held_karp(distances):
+    """Optimal closed tour from stop 0 by bitmask dynamic programming.
+
+    ``cost[mask, j]`` is the cheapest way to leave the depot, visit the stops
+    in ``mask`` and end at stop ``j``. Masks are filled by number of stops, each
+    layer at once with NumPy, so the solver is only practical for a few stops.
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    stops = len(distances) - 1
+    if stops < 2:
+        return list(range(stops + 1)) + [0]
+
+    between = distances[1:, 1:]
+    full = (1 << stops) - 1
+    cost = np.full((1 << stops, stops), np.inf)
+    parent = np.full((1 << stops, stops), -1, dtype=np.int8)
+
+    bits = 1 << np.arange(stops)
+    cost[bits, np.arange(stops)] = distances[0, 1:]
+
+    masks = np.arange(1 << stops)
+    sizes = np.array([bin(mask).count("1") for mask in range(1 << stops)])
+
+    for size in range(2, stops + 1):
+        layer = masks[sizes == size]
+        for j in range(stops):
+            ending = layer[(layer & bits[j]) != 0]
+            candidates = cost[ending ^ bits[j]] + between[:, j]
+            parent[ending, j] = candidates.argmin(axis=1)
+            cost[ending, j] = candidates[np.arange(len(ending)), parent[ending, j]]
+
+    last = int((cost[full] + distances[1:, 0]).argmin())
+    tour = [0]
+    mask = full
+    while last != -1:
+        tour.append(last + 1)
+        mask, last = mask ^ (1 << last), int(parent[mask, last])
+    tour.append(0)
+    tour[1:-1] = reversed(tour[1:-1])
+
+    return tour
+
+
+def solve_tour(distances, time_budget=None, exact_max_stops=0):
+    """Optimal tour for small trips, improved nearest neighbour for larger ones."""
+    if len(distances) - 1 <= exact_max_stops:
+        return held_karp(distances)
+
+    return improve_tour(distances, nearest_neighbour_tour(distances), time_budget)
@@ -0,0 +1,149 @@
+from ..cruds.traffic_profile_crud import TrafficProfileCrud
+from .graph_service import HIGHWAY_SPEEDS
+from django.conf import settings
+from django.utils import timezone
+import struct
+import zlib
+import numpy as np
+
+# Road classes of the traffic profiles. Packed route edges store the index,
+# so new classes only ever go at the end
+ROAD_CLASSES = [*HIGHWAY_SPEEDS, "other"]
+ROAD_CLASS_INDEX = {road_class: i for i, road_class in enumerate(ROAD_CLASSES)}
+
+HOURS_PER_DAY = 24
+
+# Header of packed route edges: format tag, number of legs, number of edges
+EDGES_HEADER = struct.Struct("<4sII")
+EDGES_FORMAT = b"RTE1"
+
+
+class TrafficService:
+    @staticmethod
+    def road_class(data):
+        """Index in ``ROAD_CLASSES`` of the road class of an edge."""
+        highways = data.get("highway")
+        highways = highways if isinstance(highways, list) else [highways]
+        for highway in highways:
+            if highway in ROAD_CLASS_INDEX:
+                return ROAD_CLASS_INDEX[highway]
+
+        return ROAD_CLASS_INDEX["other"]
+
+    @staticmethod
+    def route_edges(G, paths, weight="length"):
+        """Length, free-flow travel time and road class of every edge of the paths.
+
+        Between two nodes the edge with the lowest ``weight`` is the one the
+        path took. Edges without a travel time are driven at
+        ``ROUTING_DEFAULT_SPEED_KMH``. ``legs`` is the number of edges of
+        each path.
+        """
+        speed = settings.ROUTING_DEFAULT_SPEED_KMH / 3.6
+        lengths, times, classes = [], [], []
+        for path in paths:
+            for u, v in zip(path, path[1:]):
+                edge = min(
+                    G[u][v].values(),
+                    key=lambda data: data.get(weight, data["length"]),
+                )
+                lengths.append(edge["length"])
+                times.append(edge.get("travel_time", edge["length"] / speed))
+                classes.append(TrafficService.road_class(edge))
+
+        return {
+            "length": np.array(lengths, dtype=float),
+            "travel_time": np.array(times, dtype=float),
+            "road_class": np.array(classes, dtype=np.uint8),
+            "legs": np.array([max(len(path) - 1, 0) for path in paths], dtype=int),
+        }
+
+    @staticmethod
+    def leg_sums(values, legs):
+        """Sum of ``values`` over the edges of each leg."""
+        ends = np.cumsum(legs)
+        totals = np.concatenate(([0.0], np.cumsum(values)))
+        return totals[ends] - totals[ends - legs]
+
+    @staticmethod
+    def pack_edges(edges):
+        """Free-flow time and road class of the route edges as compact bytes."""
+        header = EDGES_HEADER.pack(
+            EDGES_FORMAT, len(edges["legs"]), len(edges["travel_time"])
+        )
+        return header + zlib.compress(
+            edges["legs"].astype("<u4").tobytes()
+            + edges["travel_time"].astype("<f4").tobytes()
+            + edges["road_class"].astype(np.uint8).tobytes()
+        )
+
+    @staticmethod
+    def unpack_edges(data):
+        """Route edges packed by ``pack_edges``, without their lengths."""
+        data = bytes(data)
+        tag, legs, count = EDGES_HEADER.unpack_from(data)
+        if tag != EDGES_FORMAT:
+            raise ValueError("Unknown route edges format")
+
+        body = zlib.decompress(data[EDGES_HEADER.size :])
+        times_offset = 4 * legs
+        classes_offset = times_offset + 4 * count
+        return {
+            "legs": np.frombuffer(body, dtype="<u4", count=legs).astype(int),
+            "travel_time": np.frombuffer(
+                body, dtype="<f4", count=count, offset=times_offset
+            ).astype(float),
+            "road_class": np.frombuffer(
+                body, dtype=np.uint8, count=count, offset=classes_offset
+            ),
+        }
+
+    @staticmethod
+    def speed_factors():
+        """Speed factor of every road class (rows) at every hour (columns).
+
+        Hours without a stored profile run at free-flow speed.
+        """
+        table = np.ones((len(ROAD_CLASSES), HOURS_PER_DAY))
+        for profile in TrafficProfileCrud.read():
+            if profile.road_class in ROAD_CLASS_INDEX:
+                table[ROAD_CLASS_INDEX[profile.road_class], profile.hour] = (
+                    profile.speed_factor
+                )
+
+        return table
+
+    @staticmethod
+    def edge_durations(times, classes, departure=None, factors=None):
+        """Seconds to drive each edge when the route starts at ``departure``.
+
+        Every edge is slowed down by the speed factor of its road class at
+        the hour the vehicle enters it. That hour depends on every edge
+        before it, so the entry times are refined until they stop changing:
+        each pass is a single vectorized sweep, and after pass ``k`` at least
+        the first ``k`` edges are exact, so the loop ends with the same
+        result as driving the edges one by one, usually after a few passes.
+        """
+        if factors is None:
+            factors = TrafficService.speed_factors()
+        departure = timezone.localtime(departure or timezone.now())
+        start = departure.hour * 3600 + departure.minute * 60 + departure.second
+
+        hours = np.full(len(times), departure.hour)
+        for _ in range(len(times)):
+            durations = times / factors[classes, hours]
+            entries = start + np.concatenate(([0.0], np.cumsum(durations)[:-1]))
+            entry_hours = (entries // 3600).astype(int) % HOURS_PER_DAY
+            if np.array_equal(entry_hours, hours):
+                break
+            hours = entry_hours
+
+        return times / factors[classes, hours]
+
+    @staticmethod
+    def leg_durations(edges, departure=None, factors=None):
+        """Seconds to drive each leg of the route when it starts at ``departure``."""
+        durations = TrafficService.edge_durations(
+            edges["travel_time"], edges["road_class"], departure, factors
+        )
+        return TrafficService.leg_sums(durations, edges["legs"])
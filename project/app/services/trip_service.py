@@ -5,10 +5,25 @@ from ..cruds.address_crud import AddressCrud
 from ..cruds.box_crud import BoxCrud
 from ..cruds.truck_crud import TruckCrud
 from ..cruds.depot_crud import DepotCrud
+from ..cruds.trip_stop_crud import TripStopCrud
 from ..models import Trip, Truck, Depot, Delivery
 from ..services.depot_service import DepotService
+from ..services.geocoding_service import GeocodingService
+from ..services.geometry_service import pack_path
+from ..services.graph_service import GraphService
+from ..services.render_service import RENDER_FORMATS, RenderService
+from ..services.route_cache_service import RouteCacheService
+from ..services.traffic_service import TrafficService
+from ..services.routing_service import (
+    ROUTING_WEIGHTS,
+    CompactGraph,
+    SnapIndex,
+    distance_matrix,
+)
+from ..services.tile_service import TileService
+from ..services.fleet_service import plan_routes
+from ..services.tour_service import nearest_neighbour_tour, solve_tour, tour_length
 from ..exception_errors import (
-    RangeError,
     StatusError,
     CapacityError,
     BelongError,
@@ -16,51 +31,13 @@ from ..exception_errors import (
 )
 
 from datetime import timedelta
-from geopy.geocoders import Nominatim
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.conf import settings
-import osmnx as ox
-import heapq
-import matplotlib
-import matplotlib.pyplot as plt
+from django.db import transaction
 from django.forms.models import model_to_dict
 import os
-import folium
-
-
-def pathing_route_dijkstra(G, start, target, weight="length"):
-    dist = {node: float("inf") for node in G.nodes()}
-    dist[start] = 0
-    prev = {}
-    pq = [(0, start)]
-
-    while pq:
-        current_dist, u = heapq.heappop(pq)
-
-        if u == target:
-            path = []
-            while u is not None:
-                path.append(u)
-                u = prev.get(u)
-            return current_dist, list(reversed(path))
-
-        if current_dist > dist[u]:
-            continue
-
-        for v in G.neighbors(u):
-            edge_data = G.get_edge_data(u, v)
-            if edge_data is None:
-                continue
-
-            w = min(ed.get(weight, 1) for ed in edge_data.values())
-            new_dist = current_dist + w
-
-            if new_dist < dist[v]:
-                dist[v] = new_dist
-                prev[v] = u
-                heapq.heappush(pq, (new_dist, v))
-
-    return float("inf"), []
+import numpy as np
 
 
 class TripService:
@@ -77,104 +54,229 @@ class TripService:
         return remaining_deliveries_list
 
     @staticmethod
-    def define_route(origin_depot, selected_orders):
-        if not all(
-            (
-                order.store.address.city == origin_depot.address.city
-                and order.store.address.state == origin_depot.address.state
-                and order.store.address.country == origin_depot.address.country
-            )
-            for order in selected_orders
-        ):
-            raise RangeError(
-                "Addresses out of range — all addresses must be in the same city"
+    def routing_weight(optimize=None):
+        """Edge weight minimized for ``optimize`` ("distance" or "time")."""
+        optimize = optimize or settings.ROUTING_OPTIMIZE
+        if optimize not in ROUTING_WEIGHTS:
+            raise ValueError(f"Optimize must be one of: {', '.join(ROUTING_WEIGHTS)}")
+
+        return ROUTING_WEIGHTS[optimize]
+
+    @staticmethod
+    def parse_departure(value):
+        """Departure time sent to the API (ISO 8601), in local time if naive."""
+        if value is None:
+            return None
+
+        departure = parse_datetime(str(value))
+        if departure is None:
+            raise ValueError("Departure must be an ISO 8601 date and time")
+        if timezone.is_naive(departure):
+            departure = timezone.make_aware(departure)
+
+        return departure
+
+    @staticmethod
+    def stop_matrix(address, nodes, strategy=None, weight="length", region=None):
+        """Matrix between the stops on the city graph of ``address``.
+
+        With a ``region`` (a graph stitched from map tiles) it is used
+        instead; hierarchies are only built for whole cities.
+        """
+        place = (address.city, address.state, address.country)
+        hierarchy = None
+        if region is None:
+            hierarchy = GraphService.load_hierarchy(*place, weight=weight)
+        if strategy is None:
+            strategy = "ch" if hierarchy else settings.ROUTING_SEARCH_STRATEGY
+
+        print(f"3. Calculating the {weight} between the stops ({strategy})...")
+        if strategy != "ch":
+            if region is None:
+                routing_graph = GraphService.load_compact_graph(*place, weight=weight)
+            else:
+                routing_graph = CompactGraph.from_graph(region, weight)
+            workers = settings.ROUTING_MATRIX_WORKERS or os.cpu_count()
+            return distance_matrix(routing_graph, nodes, strategy, workers)
+
+        if hierarchy is None:
+            raise ValueError(
+                "No contraction hierarchy built for this city. "
+                "Run the build_contraction_hierarchy command first"
             )
+        return hierarchy.distance_matrix(nodes)
 
-        address_objects = [origin_depot.address] + [
-            order.store.address for order in selected_orders
-        ]
+    @staticmethod
+    def in_depot_city(origin_depot, address_objects):
+        depot = origin_depot.address
+        return all(
+            (addr.city, addr.state, addr.country)
+            == (depot.city, depot.state, depot.country)
+            for addr in address_objects
+        )
 
+    @staticmethod
+    def locate_stops(origin_depot, address_objects, progress=None):
+        """Geocodes the addresses and snaps them to the city graph nodes.
+
+        When some address is outside the depot's city, the graph is stitched
+        from the map tiles around the addresses instead. ``progress``, when
+        given, is called with each phase as it starts.
+        """
         area = f"{origin_depot.address.city}, {origin_depot.address.state}, {origin_depot.address.country}"
 
-        matplotlib.use("Agg")
+        if progress:
+            progress("Geoc")
         print(f"1. Geocoding addresses in {area}...")
-        geolocator = Nominatim(user_agent="cheaptracker", timeout=20)
+        _, addresses = GeocodingService.locate_addresses(address_objects)
+
+        if progress:
+            progress("Grap")
+        if not TripService.in_depot_city(origin_depot, address_objects):
+            print("2. Loading the map tiles around the stops...")
+            G = TileService.load_region(
+                [addr.latitude for addr in address_objects],
+                [addr.longitude for addr in address_objects],
+            )
+            index = SnapIndex.from_graph(CompactGraph.from_graph(G))
+            nodes = index.nearest(
+                [addr.latitude for addr in address_objects],
+                [addr.longitude for addr in address_objects],
+            )
+            return G, nodes, addresses
 
-        locations = []
-        addresses = []  # For display purposes
+        print("2. Loading the city map (downloaded only when not cached)...")
+        G = GraphService.load_graph(
+            origin_depot.address.city,
+            origin_depot.address.state,
+            origin_depot.address.country,
+        )
 
+        # Addresses snapped against this graph version keep their node
+        unique = {}
         for addr in address_objects:
-            # List of queries from most specific to least specific
-            queries = [
-                f"{addr.street}, {addr.number}, {addr.neighborhood}, {addr.city}, {addr.state}, {addr.country}",
-                f"{addr.street}, {addr.number}, {addr.city}, {addr.state}, {addr.country}",
-                f"{addr.street}, {addr.city}, {addr.state}, {addr.country}",
-                f"{addr.neighborhood}, {addr.city}, {addr.state}, {addr.country}",  # Fallback to neighborhood center
-            ]
-
-            loc = None
-            matched_query = ""
-
-            for q in queries:
-                try:
-                    loc = geolocator.geocode(q)
-                    if loc:
-                        matched_query = q
-                        break
-                except Exception as e:
-                    print(f"   [WARN] Error geocoding '{q}': {e}")
-                    continue
-
-            if loc:
-                locations.append(loc)
-                # Reconstruct the full formatted address for display consistency
-                full_display = f"{addr.street}, {addr.number}, {addr.neighborhood}, {addr.city}, {addr.state}, {addr.cep}, {addr.country}"
-                addresses.append(full_display)
-                print(
-                    f"   [OK] Address found: {matched_query} (Original: {addr.street}, {addr.number})"
-                )
-            else:
-                raise ValueError(
-                    f"   [ERROR] Address not found after retries: {addr.street}, {addr.number}"
-                )
+            unique.setdefault(addr.id, addr)
+        GraphService.snap(
+            origin_depot.address.city,
+            origin_depot.address.state,
+            origin_depot.address.country,
+            [
+                addr
+                for addr in unique.values()
+                if addr.graph_node is None
+                or addr.graph_version != G.graph.get("version")
+            ],
+        )
+        nodes = [unique[addr.id].graph_node for addr in address_objects]
 
-        print("2. Downloading the city map (this may be slow the first time)...")
-        G = ox.graph_from_place(area, network_type="drive")
+        return G, nodes, addresses
 
-        xs = [loc.longitude for loc in locations]
-        ys = [loc.latitude for loc in locations]
-        nodes = ox.distance.nearest_nodes(G, xs, ys)
+    @staticmethod
+    def route_geometry(G, nodes, route_order, segment_paths, addresses):
+        """Stops (in visiting order) and street paths of a route, as coordinates.
 
-        segment_paths = []
-        total_distance = 0
-        route_order = [0]
-        remaining = list(range(1, len(nodes)))
+        Stored with the trip, it is all the images and maps need to be drawn.
+        """
 
-        print("3. Calculating the best route (Nearest Neighbor - Dijkstra)...")
-        while remaining:
-            last = route_order[-1]
+        def point(node):
+            return [round(G.nodes[node]["y"], 6), round(G.nodes[node]["x"], 6)]
 
-            candidates = []
-            for r in remaining:
-                dist, path = pathing_route_dijkstra(G, nodes[last], nodes[r])
-                candidates.append((dist, r, path))
+        stops = []
+        for idx in route_order:
+            lat, lon = point(nodes[idx])
+            stops.append({"lat": lat, "lon": lon, "address": addresses[idx]})
 
-            candidates.sort(key=lambda x: x[0])
-            chosen_distance, chosen_index, chosen_path = candidates[0]
+        return {
+            "stops": stops,
+            "segments": [[point(node) for node in path] for path in segment_paths],
+        }
 
-            route_order.append(chosen_index)
-            remaining.remove(chosen_index)
-            total_distance += chosen_distance
+    @staticmethod
+    def route_legs(G, paths, weight="length", departure=None, factors=None):
+        """Length (m) and driving time (s) of each leg, leaving at ``departure``.
+
+        Returns the ``(length, time)`` pairs and the edges of the route, as
+        built by ``TrafficService.route_edges``.
+        """
+        edges = TrafficService.route_edges(G, paths, weight)
+        lengths = TrafficService.leg_sums(edges["length"], edges["legs"])
+        durations = TrafficService.leg_durations(edges, departure, factors)
+        return list(zip(lengths.tolist(), durations.tolist())), edges
+
+    @staticmethod
+    def route_stops(tour, legs, addresses, orders):
+        """Stops of a tour, each with the leg that arrives at it.
+
+        ``addresses[i]`` and ``orders[i]`` are the address and the order
+        (None for the depot) of stop ``i`` and ``legs`` the ``(length, time)``
+        between consecutive stops of the tour.
+        """
+        stops = []
+        for position, stop in enumerate(tour):
+            length, duration = legs[position - 1] if position else (0.0, 0.0)
+            stops.append(
+                {
+                    "address": addresses[stop],
+                    "order": orders[stop],
+                    "leg_distance_m": length,
+                    "leg_duration_s": duration,
+                }
+            )
+
+        return stops
 
-            segment_paths.append(chosen_path)
+    @staticmethod
+    def define_route(
+        origin_depot,
+        selected_orders,
+        strategy=None,
+        progress=None,
+        optimize=None,
+        departure=None,
+    ):
+        weight = TripService.routing_weight(optimize)
 
-        print("   Calculating the return to the departure depot...")
-        chosen_distance, return_path = pathing_route_dijkstra(
-            G, nodes[route_order[-1]], nodes[0]
+        address_objects = [origin_depot.address] + [
+            order.store.address for order in selected_orders
+        ]
+        G, nodes, addresses = TripService.locate_stops(
+            origin_depot, address_objects, progress
         )
-        segment_paths.append(return_path)
-        route_order.append(0)
-        total_distance += chosen_distance
+
+        if progress:
+            progress("Rout")
+        key = RouteCacheService.key(nodes, G.graph.get("version"), weight)
+        cached = RouteCacheService.get(key)
+        if cached:
+            print("   Same stops as a recent route, reusing it...")
+            route_order = RouteCacheService.tour_positions(cached["tour"], nodes)
+            edges = cached["edges"]
+            durations = TrafficService.leg_durations(edges, departure)
+            legs = list(zip(cached["lengths"], durations.tolist()))
+            initial_distance = cached["initial_distance_km"]
+            geometry = {
+                "stops": [
+                    {**stop, "address": addresses[idx]}
+                    for stop, idx in zip(cached["geometry"]["stops"], route_order)
+                ],
+                "segments": cached["geometry"]["segments"],
+            }
+        else:
+            route_order, legs, edges, initial_distance, geometry = (
+                TripService.solve_route(
+                    origin_depot, G, nodes, addresses, strategy, weight, departure
+                )
+            )
+            RouteCacheService.put(
+                key,
+                {
+                    "tour": [nodes[idx] for idx in route_order],
+                    "lengths": [length for length, _ in legs],
+                    "edges": edges,
+                    "initial_distance_km": initial_distance,
+                    "geometry": geometry,
+                },
+            )
 
         print("\nRoute stop order:")
         for i, idx in enumerate(route_order):
@@ -185,130 +287,275 @@ class TripService:
             else:
                 print(f"{i}° Stop: {addresses[idx]}")
 
-        total_distance = round(total_distance / 1000, 1)
+        total_distance = round(sum(length for length, _ in legs) / 1000, 1)
+        total_duration = round(sum(duration for _, duration in legs) / 60, 1)
         print(f"Distance traveled on the trip: {total_distance} km")
+        print(f"   (Nearest Neighbor order alone: {initial_distance} km)")
+        print(f"Driving time: {total_duration} min")
+
+        return {
+            "route_order": route_order,
+            "initial_distance_km": initial_distance,
+            "total_distance_km": total_distance,
+            "total_duration_min": total_duration,
+            "stops": TripService.route_stops(
+                route_order,
+                legs,
+                address_objects,
+                [None] + list(selected_orders),
+            ),
+            "geometry": geometry,
+            "edges": edges,
+        }
 
-        fig, ax = ox.plot_graph(G, node_size=0, show=False, close=False)
+    @staticmethod
+    def solve_route(origin_depot, G, nodes, addresses, strategy, weight, departure):
+        """Orders the stops and follows the streets between them.
+
+        Returns the tour, its ``(length, time)`` legs and edges, the distance
+        of the nearest neighbour tour alone (km) and the route geometry.
+        """
+        region = G if "tiles" in G.graph else None
+        matrix = TripService.stop_matrix(
+            origin_depot.address, nodes, strategy, weight, region
+        )
 
-        colors = ["cyan", "orange", "lime", "magenta", "yellow", "white"]
-        for i, path in enumerate(segment_paths):
-            c = colors[i % len(colors)]
-            ox.plot_graph_route(
+        print("   Ordering the stops...")
+        initial_order = nearest_neighbour_tour(matrix.distances)
+        if weight == "length":
+            initial_length = tour_length(matrix.distances, initial_order)
+        else:
+            # The matrix holds times: the length needs the streets of each leg
+            initial_length = TrafficService.route_edges(
                 G,
-                path,
-                ax=ax,
-                node_size=0,
-                route_linewidth=3,
-                route_color=c,
-                show=False,
-                close=False,
-            )
+                [matrix.path(a, b) for a, b in zip(initial_order, initial_order[1:])],
+                weight,
+            )["length"].sum()
+        route_order = solve_tour(
+            matrix.distances,
+            settings.ROUTING_TOUR_TIME_BUDGET,
+            settings.ROUTING_EXACT_MAX_STOPS,
+        )
+        segment_paths = [
+            matrix.path(a, b) for a, b in zip(route_order, route_order[1:])
+        ]
+        legs, edges = TripService.route_legs(G, segment_paths, weight, departure)
+
+        return (
+            route_order,
+            legs,
+            edges,
+            round(initial_length / 1000, 1),
+            TripService.route_geometry(G, nodes, route_order, segment_paths, addresses),
+        )
 
-        x = [G.nodes[n]["x"] for n in nodes]
-        y = [G.nodes[n]["y"] for n in nodes]
-        ax.scatter(x, y, s=120, c="red", zorder=5, edgecolors="white")
-
-        for stop_number, node_index in enumerate(route_order):
-            node = nodes[node_index]
-            x = G.nodes[node]["x"]
-            y = G.nodes[node]["y"]
-            ax.text(
-                x,
-                y,
-                str(stop_number),
-                fontsize=11,
-                color="yellow",
-                weight="bold",
-                zorder=10,
+    @staticmethod
+    def create_trip(origin_depot, orders, total_distance_km, route=None, truck=None):
+        """Creates the trip and schedules its orders.
+
+        ``route``, as built by ``define_route``, stores the stops with their
+        legs and the packed street path and edges along with the trip. A
+        ``truck`` is reserved for the trip until it starts.
+        """
+        with transaction.atomic():
+            trip = TripCrud.create(
+                depot_id=origin_depot.id,
+                total_loaded_weight_kg=sum(order.total_weight_kg for order in orders),
+                total_loaded_volume_m3=sum(order.total_volume_m3 for order in orders),
+                total_distance_km=total_distance_km,
+                route_path=route and pack_path(route["geometry"]["segments"]),
+                route_edges=route and TrafficService.pack_edges(route["edges"]),
+                truck=truck,
             )
+            if route:
+                TripStopCrud.create_stops(trip, route["stops"])
 
-        node_lats = [G.nodes[n]["y"] for n in nodes]
-        node_lons = [G.nodes[n]["x"] for n in nodes]
-        center_lat = sum(node_lats) / len(node_lats)
-        center_lon = sum(node_lons) / len(node_lons)
+            for order in orders:
+                order.status = "Sche"
+                order.trip = trip
+                order.save()
 
-        graph_map = folium.Map(location=[center_lat, center_lon], zoom_start=13)
-
-        folium_colors = [
-            "#00FFFF",
-            "#FFA500",
-            "#00FF00",
-            "#FF00FF",
-            "#FFFF00",
-            "#0000FF",
-        ]
+        return trip
 
-        for i, path in enumerate(segment_paths):
-            c = folium_colors[i % len(folium_colors)]
-            # Extract coordinates for the path
-            route_coords = [(G.nodes[node]["y"], G.nodes[node]["x"]) for node in path]
+    @staticmethod
+    def define_trip(
+        depot_id,
+        orders_id_list,
+        strategy=None,
+        progress=None,
+        render=False,
+        optimize=None,
+        departure=None,
+    ):
+        """Plans and creates a trip for the orders.
+
+        The route image and map are drawn on their first request, unless
+        ``render`` asks for them right away; a drawing that fails is left for
+        that first request.
+        """
+        origin_depot, selected_orders = DepotService.select_orders(
+            depot_id, orders_id_list
+        )
 
-            folium.PolyLine(route_coords, color=c, weight=5, opacity=0.7).add_to(
-                graph_map
-            )
+        route = TripService.define_route(
+            origin_depot, selected_orders, strategy, progress, optimize, departure
+        )
 
-        for i, idx in enumerate(route_order):
-            node = nodes[idx]
-            lat = G.nodes[node]["y"]
-            lon = G.nodes[node]["x"]
+        trip = TripService.create_trip(
+            origin_depot, selected_orders, route["total_distance_km"], route
+        )
 
-            if i == 0:
-                folium.Marker(
-                    [lat, lon],
-                    popup=f"Origem/Fim: {addresses[idx]}",
-                    icon=folium.Icon(color="red", icon="home"),
-                ).add_to(graph_map)
-            elif i == len(route_order) - 1:
-                pass
-            else:
-                folium.Marker(
-                    [lat, lon],
-                    popup=f"Parada {i}: {addresses[idx]}",
-                    icon=folium.Icon(color="blue", icon="info-sign"),
-                ).add_to(graph_map)
+        if render:
+            if progress:
+                progress("Rend")
+            for kind in RENDER_FORMATS:
+                # The trip is already created: it must reach the caller anyway
+                try:
+                    RenderService.render(trip, kind)
+                except Exception as e:
+                    print(f"   Could not draw the route {kind}: {e}")
 
-        return route_order, total_distance, fig, graph_map
+        return trip, route
 
     @staticmethod
-    def define_trip(depot_id, orders_id_list):
-        origin_depot, selected_orders = DepotService.select_orders(
-            depot_id, orders_id_list
-        )
+    def select_fleet(truck_plates=None):
+        if not truck_plates:
+            trucks = list(TruckCrud.read_available_trucks())
+        else:
+            trucks = [TruckCrud.read_by_plate(plate) for plate in truck_plates]
 
-        cargo_weight_kg = 0
-        cargo_volume_m3 = 0
+        TripService.check_fleet(trucks)
+        if not trucks:
+            raise ValueError("No available trucks to plan the trips")
 
-        for order in selected_orders:
-            cargo_weight_kg += order.total_weight_kg
-            cargo_volume_m3 += order.total_volume_m3
+        return trucks
 
-        route_order, total_distance, fig, graph_map = TripService.define_route(
-            origin_depot, selected_orders
-        )
+    @staticmethod
+    def check_fleet(trucks):
+        if any(truck.is_active for truck in trucks):
+            raise StatusError("Truck already being used")
 
-        trip = TripCrud.create(
-            depot_id=depot_id,
-            total_loaded_weight_kg=cargo_weight_kg,
-            total_loaded_volume_m3=cargo_volume_m3,
-            total_distance_km=total_distance,
+        reserved = {truck.id for truck in TruckCrud.read_reserved_trucks()}
+        if any(truck.id in reserved for truck in trucks):
+            raise StatusError("Truck already reserved for a planned trip")
+
+    @staticmethod
+    def plan_orders(depot_id, orders_id_list=None):
+        """The depot and the orders a plan covers.
+
+        Without an order list every pending order in the depot's city is
+        planned.
+        """
+        if orders_id_list:
+            return DepotService.select_orders(depot_id, orders_id_list)
+
+        origin_depot = DepotCrud.read_by_id(depot_id)
+        orders = list(
+            OrderCrud.read_pend_orders().filter(
+                store__address__city=origin_depot.address.city,
+                store__address__state=origin_depot.address.state,
+                store__address__country=origin_depot.address.country,
+            )
         )
+        if not orders:
+            raise ValueError("No pending orders in the depot's city")
 
-        # Construct the full path to save the image in the static directory
-        image_path = os.path.join(settings.BASE_DIR, "static", "routes")
-        os.makedirs(image_path, exist_ok=True)  # Ensure the directory exists
-        file_path = os.path.join(image_path, f"trip_{trip.id}.png")
-        fig.savefig(file_path, dpi=300)
+        return origin_depot, orders
 
-        # Save HTML map
-        html_path = os.path.join(image_path, f"trip_{trip.id}.html")
-        graph_map.save(html_path)
+    @staticmethod
+    def plan_trips(
+        depot_id,
+        orders_id_list=None,
+        truck_plates=None,
+        strategy=None,
+        optimize=None,
+        departure=None,
+        progress=None,
+    ):
+        """Splits the orders of a depot into trips that fit the available trucks.
+
+        Without an order list every pending order in the depot's city is
+        planned. Each trip gets the truck whose capacity its orders were
+        packed for, and every trip is created at once. ``progress``, when
+        given, is called with each phase as it starts.
+        """
+        origin_depot, orders = TripService.plan_orders(depot_id, orders_id_list)
+        weight = TripService.routing_weight(optimize)
+        trucks = TripService.select_fleet(truck_plates)
+
+        # Orders of the same store share a single stop in the distance matrix
+        address_objects = [origin_depot.address]
+        stop_of = {origin_depot.address.id: 0}
+        for order in orders:
+            if order.store.address.id not in stop_of:
+                stop_of[order.store.address.id] = len(address_objects)
+                address_objects.append(order.store.address)
 
-        for order in selected_orders:
-            order.status = "Sche"
-            order.trip = trip
-            order.save()
+        G, nodes, addresses = TripService.locate_stops(
+            origin_depot, address_objects, progress
+        )
+        if progress:
+            progress("Rout")
+        region = G if "tiles" in G.graph else None
+        matrix = TripService.stop_matrix(
+            origin_depot.address, nodes, strategy, weight, region
+        )
+
+        stops = [0] + [stop_of[order.store.address.id] for order in orders]
+        distances = matrix.distances[np.ix_(stops, stops)]
+        stop_addresses = [address_objects[stop] for stop in stops]
+
+        print(f"   Packing {len(orders)} orders into {len(trucks)} trucks...")
+        plan = plan_routes(
+            distances,
+            [[order.total_weight_kg, order.total_volume_m3] for order in orders],
+            [[truck.max_payload_kg, truck.cargo_volume_m3] for truck in trucks],
+            settings.ROUTING_TOUR_TIME_BUDGET,
+            settings.ROUTING_EXACT_MAX_STOPS,
+        )
 
-        return trip, route_order, fig
+        factors = TrafficService.speed_factors()
+        planned = []
+        with transaction.atomic():
+            # A plan running at the same time must not reserve the same trucks
+            TripService.check_fleet(
+                TruckCrud.lock_trucks([truck.id for truck in trucks])
+            )
+            for vehicle, tour in plan:
+                trip_orders = [orders[customer - 1] for customer in tour[1:-1]]
+                route_order = [stops[customer] for customer in tour]
+                segment_paths = [
+                    matrix.path(a, b) for a, b in zip(route_order, route_order[1:])
+                ]
+                legs, edges = TripService.route_legs(
+                    G, segment_paths, weight, departure, factors
+                )
+                trip = TripService.create_trip(
+                    origin_depot,
+                    trip_orders,
+                    round(sum(length for length, _ in legs) / 1000, 1),
+                    {
+                        "stops": TripService.route_stops(
+                            tour, legs, stop_addresses, [None] + orders
+                        ),
+                        "geometry": TripService.route_geometry(
+                            G, nodes, route_order, segment_paths, addresses
+                        ),
+                        "edges": edges,
+                    },
+                    trucks[vehicle],
+                )
+                planned.append((trip, trucks[vehicle], trip_orders))
+
+        print(f"{len(planned)} trips planned")
+        return [
+            {
+                "trip": trip,
+                "truck": truck,
+                "orders": [order.id for order in trip_orders],
+            }
+            for trip, truck, trip_orders in planned
+        ]
 
     @staticmethod
     def start_trip(truck_plate, trip_id, depot_id):
@@ -319,8 +566,15 @@ class TripService:
         if truck.is_active == True:
             raise StatusError("Truck already being used")
 
-        if not (trip.total_loaded_weight_kg <= truck.max_payload_kg) and (
-            trip.total_loaded_volume_m3 <= truck.cargo_volume_m3
+        if trip.truck is not None and trip.truck != truck:
+            raise StatusError(f"This trip is reserved for the truck {trip.truck.plate}")
+
+        if trip.truck is None and truck in TruckCrud.read_reserved_trucks():
+            raise StatusError("Truck already reserved for a planned trip")
+
+        if not (
+            trip.total_loaded_weight_kg <= truck.max_payload_kg
+            and trip.total_loaded_volume_m3 <= truck.cargo_volume_m3
         ):
             raise CapacityError(
                 f"The selected orders exceed the chosen truck's capacity in {trip.total_loaded_weight_kg - truck.max_payload_kg}kg and {trip.total_loaded_volume_m3 - truck.cargo_volume_m3}m3"
@@ -436,23 +690,48 @@ class TripService:
         order.save()
 
     @staticmethod
-    def simulate_trip(trip_id, truck_plate, traffic_status):
+    def simulate_trip(trip_id, truck_plate, traffic_status=None, departure=None):
+        """Arrival and emissions of the trip leaving at ``departure`` (now by default).
+
+        The driving time of each leg follows the hourly traffic profiles of
+        the roads of the route. ``traffic_status`` slows it down further.
+        """
         trip = TripCrud.read_by_id(trip_id)
         truck = TruckCrud.read_by_plate(truck_plate)
 
-        if traffic_status not in ["light", "medium", "heavy"]:
+        if traffic_status not in [None, "light", "medium", "heavy"]:
             raise StatusError("Traffic Status must be: light, medium or heavy.")
 
         match (traffic_status):
             case "light":
-                average_speed = 60
+                average_speed, delay = 60, 1.0
             case "medium":
-                average_speed = 40
+                average_speed, delay = 40, 1.5
             case "heavy":
-                average_speed = 20
-
-        departure_date = timezone.now()
-        full_time_route = trip.total_distance_km / average_speed
+                average_speed, delay = 20, 3.0
+            case None:
+                average_speed, delay = settings.ROUTING_DEFAULT_SPEED_KMH, 1.0
+
+        departure_date = departure or timezone.now()
+        if trip.route_edges:
+            edges = TrafficService.unpack_edges(trip.route_edges)
+            legs = TrafficService.leg_durations(edges, departure_date).tolist()
+        else:
+            # Trips planned before the route edges were stored
+            stops = TripStopCrud.read_by_trip(trip.id)
+            legs = [stop.leg_duration_s for stop in stops[1:]]
+
+        if legs:
+            legs = [leg * delay for leg in legs]
+            full_time_route = sum(legs) / 3600
+        else:
+            full_time_route = trip.total_distance_km / average_speed
+
+        stop_arrivals = []
+        elapsed = 0.0
+        for leg in legs:
+            elapsed += leg
+            stop_arrivals.append(departure_date + timedelta(seconds=round(elapsed)))
 
         days = full_time_route // 24
         hours = int(full_time_route - (days * 24))
@@ -484,6 +763,7 @@ class TripService:
             "trip_hours": hours,
             "trip_minutes": minutes,
             "trip_carbon_emission": carbon_kg_co2,
+            "stop_arrivals": stop_arrivals,
         }
 
         return simulation
@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection
+from ..cruds.depot_crud import DepotCrud
+from .graph_service import GraphService
+from .routing_service import ROUTING_WEIGHTS
+import os
+import time
+
+
+class WarmupService:
+    @staticmethod
+    def warm_city(city, state, country, build_hierarchies=False):
+        """Loads everything a trip from the city needs, building what is missing.
+
+        That is the road graph (downloaded when not cached), its snapping
+        index and, for every routing weight, the compact graph and the
+        contraction hierarchy, built only when ``build_hierarchies`` asks.
+        """
+        start = time.perf_counter()
+        G = GraphService.load_graph(city, state, country)
+        GraphService.load_snap_index(city, state, country)
+
+        hierarchies = []
+        for weight in ROUTING_WEIGHTS.values():
+            GraphService.load_compact_graph(city, state, country, weight=weight)
+            hierarchy = GraphService.load_hierarchy(city, state, country, weight=weight)
+            if hierarchy is None and build_hierarchies:
+                hierarchy = GraphService.build_hierarchy(
+                    city, state, country, weight=weight
+                )
+            if hierarchy is not None:
+                hierarchies.append(weight)
+
+        return {
+            "nodes": len(G),
+            "hierarchies": hierarchies,
+            "seconds": time.perf_counter() - start,
+        }
+
+    @staticmethod
+    def warm_place(place, build_hierarchies=False):
+        try:
+            return WarmupService.warm_city(*place, build_hierarchies)
+        # One city failing (offline without a cache, Overpass down...) must not
+        # stop the others, nor the worker being started
+        except Exception as e:
+            return {"error": str(e)}
+        finally:
+            # Each thread opens its own database connection
+            connection.close()
+
+    @staticmethod
+    def warm(workers=None, build_hierarchies=False, log=None):
+        """Warms the routing caches of every depot city, several cities at once.
+
+        Meant for deploys and for the start of each worker process: the
+        graphs stay loaded in the calling process, so its first trip is
+        planned from a warm cache. Cities are warmed in threads, since most of
+        the time goes to downloads and file reads. ``log``, when given, is
+        called with a line per city as it finishes. Returns the result of each
+        ``(city, state, country)``.
+        """
+        places = list(DepotCrud.read_cities())
+        if not places:
+            return {}
+
+        workers = min(workers or os.cpu_count(), len(places))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                place: pool.submit(WarmupService.warm_place, place, build_hierarchies)
+                for place in places
+            }
+            results = {}
+            for place, future in futures.items():
+                results[place] = future.result()
+                if log:
+                    log(WarmupService.describe(place, results[place]))
+
+        return results
+
+    @staticmethod
+    def describe(place, result):
+        city = ", ".join(place)
+        if "error" in result:
+            return f"{city}: failed: {result['error']}"
+
+        hierarchies = ", ".join(result["hierarchies"]) or "none"
+        return (
+            f"{city}: {result['nodes']} nodes, hierarchies: {hierarchies} "
+            f"({result['seconds']:.1f}s)"
+        )
@@ -1,7 +1,23 @@
+import io
+import itertools
 import json
-from django.test import TestCase, Client
+import math
+import os
+import pickle
+import random
+import tempfile
+import time
+import networkx as nx
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.utils import timezone
+from geopy.exc import GeocoderServiceError, GeocoderTimedOut
 from app.cruds.user_crud import UserCrud
 from app.cruds.address_crud import AddressCrud
 from app.cruds.store_crud import StoreCrud
@@ -12,7 +28,60 @@ from app.cruds.order_crud import OrderCrud
 from app.cruds.trip_crud import TripCrud
 from app.cruds.box_crud import BoxCrud
 from app.cruds.delivery_crud import DeliveryCrud
+from app.cruds.trip_job_crud import TripJobCrud
+from app.cruds.trip_stop_crud import TripStopCrud
+from app.cruds.traffic_profile_crud import TrafficProfileCrud
+from app.management.commands.benchmark_routing import grid_graph
+from app.management.commands.geocoder_standin import StandInGeocoder
+from app.services.geocoding_service import GeocodingService, TokenBucket
+from app.services.file_service import atomic_path
+from app.services.graph_service import GraphService
+from app.services.osm_file_service import OsmFileService
+from app.services.routing_service import (
+    CompactGraph,
+    DistanceMatrix,
+    SEARCH_STRATEGIES,
+    SnapIndex,
+    great_circle,
+    dijkstra,
+    distance_matrix,
+    shortest_path,
+)
+from app.services.hierarchy_service import ContractionHierarchy
+from app.services.fleet_service import (
+    clarke_wright,
+    plan_routes,
+    relocate,
+    route_length,
+    route_load,
+)
+from app.services.trip_service import TripService
+from app.services.job_service import JobService
+from app.services.render_service import RenderService
+from app.services.route_cache_service import RouteCacheService
+from app.services.tile_service import TileService
+from app.services.traffic_service import (
+    ROAD_CLASSES,
+    ROAD_CLASS_INDEX,
+    TrafficService,
+)
+from app.services.geometry_service import (
+    douglas_peucker,
+    encode_polyline,
+    pack_path,
+    route_geojson,
+    trip_geometry,
+    unpack_path,
+)
+from app.services.tour_service import (
+    nearest_neighbour_tour,
+    improve_tour,
+    held_karp,
+    solve_tour,
+    tour_length,
+)
 from app.exception_errors import (
+    CapacityError,
     UserRoleError,
     StatusError,
     BelongError,
@@ -99,6 +168,17 @@ class AddressCrudTest(TestCase):
         self.assertEqual(updated_address.street, "Rua Nova")
         self.assertEqual(updated_address.city, "Cidade Nova")
 
+    def test_update_address_clears_geocode(self):
+        """Testing if changing an address field drops its cached coordinates"""
+        AddressCrud.save_geocode(self.address, -22.37, -41.78, "Full")
+
+        address = AddressCrud.update(self.address.id, complement="Apto 101")
+        self.assertEqual(address.latitude, -22.37)
+
+        address = AddressCrud.update(self.address.id, number="321")
+        self.assertIsNone(address.latitude)
+        self.assertIsNone(AddressCrud.read_by_id(self.address.id).geocoded_at)
+
     def test_delete_address(self):
         """Testing if the address has been deleted by address crud"""
         address_id = self.address.id
@@ -1046,3 +1126,1857 @@ class UserAPITest(TestCase):
             content_type="application/json",
         )
         self.assertEqual(login_response.status_code, 200)
+
+
+class GraphServiceTest(TestCase):
+    "Tests to check the on-disk road graph cache"
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            ROUTING_GRAPH_CACHE_DIR=self.tmp_dir.name, ROUTING_GRAPH_CACHE_TTL=3600
+        )
+        self.settings_override.enable()
+        GraphService._graphs.clear()
+        GraphService._compact_graphs.clear()
+        GraphService._hierarchies.clear()
+        GraphService._snap_indexes.clear()
+
+        self.graph = nx.MultiDiGraph()
+        self.graph.add_edge(1, 2, length=10.0)
+        self.graph.add_edge(2, 3, length=5.0)
+        return super().setUp()
+
+    def tearDown(self):
+        GraphService._graphs.clear()
+        GraphService._compact_graphs.clear()
+        GraphService._hierarchies.clear()
+        GraphService._snap_indexes.clear()
+        self.settings_override.disable()
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+    def test_graph_is_built_once_and_reloaded_from_disk(self):
+        """Testing if a cached graph is read back without downloading it again"""
+        with patch.object(
+            GraphService, "build_graph", return_value=self.graph
+        ) as build_graph:
+            GraphService.load_graph("Campos", "RJ", "Brasil")
+            GraphService._graphs.clear()
+            G = GraphService.load_graph("Campos", "RJ", "Brasil")
+
+        self.assertEqual(build_graph.call_count, 1)
+        self.assertEqual(sorted(G.nodes), [1, 2, 3])
+        self.assertIn("version", G.graph)
+
+    def test_edges_get_travel_times(self):
+        """Testing if the edge speeds come from the speed limit or the road class"""
+        G = nx.MultiDiGraph()
+        G.add_edge(1, 2, length=1000.0, maxspeed="60", highway="residential")
+        G.add_edge(2, 3, length=1000.0, maxspeed=["30 mph", "50"])
+        G.add_edge(3, 4, length=1000.0, highway=["primary", "secondary"])
+        G.add_edge(4, 5, length=1000.0, highway="bridleway")
+
+        GraphService.add_travel_times(G)
+
+        speeds = [data["speed_kph"] for _, _, data in G.edges(data=True)]
+        self.assertEqual(speeds[0], 60)
+        self.assertAlmostEqual(speeds[1], (30 * 1.609344 + 50) / 2)
+        self.assertEqual(speeds[2:], [45, 30])
+        self.assertAlmostEqual(G[1][2][0]["travel_time"], 60)
+
+    def test_cached_graph_without_travel_times_gets_them(self):
+        """Testing if a graph cached before travel times existed is enriched on load"""
+        key = GraphService.cache_key("Campos", "RJ", "Brasil")
+        GraphService.save_graph(key, self.graph)
+        GraphService._graphs.clear()
+
+        G = GraphService.load_graph("Campos", "RJ", "Brasil")
+
+        self.assertTrue(G.graph["travel_times"])
+        self.assertAlmostEqual(G[1][2][0]["travel_time"], 10.0 / (30 / 3.6))
+
+    def test_refresh_snaps_geocoded_addresses(self):
+        """Testing if a new download recomputes the stored nearest nodes of the city"""
+        address = AddressCrud.create(
+            "Rua A", "1", "", "Centro", "Campos", "RJ", "", "Brasil"
+        )
+        AddressCrud.save_geocode(address, -21.7502, -41.2981, "Full")
+        AddressCrud.save_graph_nodes([address], [1], "old")
+        G = random_road_graph()
+
+        with patch.object(GraphService, "build_graph", return_value=G):
+            GraphService.load_graph("Campos", "RJ", "Brasil", refresh=True)
+
+        address = AddressCrud.read_by_id(address.id)
+        self.assertEqual(address.graph_node, 1002)
+        self.assertEqual(address.graph_version, G.graph["version"])
+
+    def test_known_nodes_skip_snapping(self):
+        """Testing if only addresses without a node of this graph version are snapped"""
+        with patch.object(
+            GraphService, "build_graph", return_value=random_road_graph()
+        ):
+            G = GraphService.load_graph("Campos", "RJ", "Brasil")
+
+        addresses = []
+        for i in range(3):
+            address = AddressCrud.create(
+                f"Rua {i}", "1", "", "Centro", "Campos", "RJ", "", "Brasil"
+            )
+            AddressCrud.save_geocode(address, -21.75 + i * 0.001, -41.3, "Full")
+            addresses.append(address)
+        AddressCrud.save_graph_nodes(addresses[:2], [1000, 1008], G.graph["version"])
+
+        with patch.object(
+            SnapIndex, "nearest", autospec=True, side_effect=SnapIndex.nearest
+        ) as nearest:
+            _, nodes, _ = TripService.locate_stops(
+                Mock(address=addresses[0]), addresses + addresses[:1]
+            )
+
+        self.assertEqual(nodes, [1000, 1008, 1016, 1000])
+        nearest.assert_called_once()
+        self.assertEqual(len(nearest.call_args.args[1]), 1)
+
+    def test_snap_index_is_stored_next_to_graph(self):
+        """Testing if the nearest node index is built once and matches a brute force search"""
+        G = random_road_graph()
+        with patch.object(GraphService, "build_graph", return_value=G):
+            GraphService.load_graph("Campos", "RJ", "Brasil")
+            index = GraphService.load_snap_index("Campos", "RJ", "Brasil")
+            GraphService._snap_indexes.clear()
+            with patch.object(SnapIndex, "from_graph") as from_graph:
+                GraphService.load_snap_index("Campos", "RJ", "Brasil")
+
+        from_graph.assert_not_called()
+        rng = random.Random(5)
+        lats = [rng.uniform(-21.751, -21.742) for _ in range(200)]
+        lons = [rng.uniform(-41.301, -41.292) for _ in range(200)]
+        expected = [
+            min(
+                G.nodes,
+                key=lambda n: great_circle(lat, lon, G.nodes[n]["y"], G.nodes[n]["x"]),
+            )
+            for lat, lon in zip(lats, lons)
+        ]
+        self.assertEqual(index.nearest(lats, lons), expected)
+
+    def test_expired_graph_is_rebuilt(self):
+        """Testing if a graph older than the TTL is downloaded again"""
+        with patch.object(
+            GraphService, "build_graph", return_value=self.graph
+        ) as build_graph:
+            GraphService.load_graph("Campos", "RJ", "Brasil")
+            key = GraphService.cache_key("Campos", "RJ", "Brasil")
+            os.utime(GraphService.graph_path(key), (0, 0))
+            GraphService.load_graph("Campos", "RJ", "Brasil")
+
+        self.assertEqual(build_graph.call_count, 2)
+
+    def test_compact_graph_is_stored_next_to_graph(self):
+        """Testing if the compact routing graph is cached with the city graph"""
+        with patch.object(GraphService, "build_graph", return_value=self.graph):
+            compact = GraphService.load_compact_graph("Campos", "RJ", "Brasil")
+
+        key = GraphService.cache_key("Campos", "RJ", "Brasil")
+        self.assertTrue(os.path.isfile(GraphService.compact_path(key)))
+        self.assertEqual(compact.weights.tolist(), [10.0, 5.0])
+
+    def test_mapped_compact_graph_skips_the_city_graph(self):
+        """Testing if a worker maps the compact graph without reading the city graph"""
+        with patch.object(GraphService, "build_graph", return_value=self.graph):
+            GraphService.load_compact_graph("Campos", "RJ", "Brasil")
+        GraphService._graphs.clear()
+        GraphService._compact_graphs.clear()
+
+        with patch.object(GraphService, "read_graph") as read_graph:
+            compact = GraphService.load_compact_graph("Campos", "RJ", "Brasil")
+
+        read_graph.assert_not_called()
+        self.assertIsInstance(compact.weights, np.memmap)
+        self.assertFalse(compact.weights.flags.writeable)
+
+    def test_cache_files_are_replaced_whole(self):
+        """Testing that each write has its own temporary file and a failed one changes nothing"""
+        path = os.path.join(self.tmp_dir.name, "graph.pickle")
+        with atomic_path(path) as first, atomic_path(path) as second:
+            self.assertNotEqual(first, second)
+            with open(first, "w") as f:
+                f.write("first")
+            with open(second, "w") as f:
+                f.write("second")
+
+        with self.assertRaises(OSError), atomic_path(path) as tmp_path:
+            with open(tmp_path, "w") as f:
+                f.write("half")
+            raise OSError("Disk full")
+
+        with open(path) as f:
+            self.assertEqual(f.read(), "first")
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["graph.pickle"])
+
+    def test_hierarchy_is_only_loaded_after_being_built(self):
+        """Testing if a hierarchy is only used once the command has built it"""
+        with patch.object(GraphService, "build_graph", return_value=self.graph):
+            self.assertIsNone(GraphService.load_hierarchy("Campos", "RJ", "Brasil"))
+            GraphService.build_hierarchy("Campos", "RJ", "Brasil")
+            GraphService._hierarchies.clear()
+            hierarchy = GraphService.load_hierarchy("Campos", "RJ", "Brasil")
+
+        self.assertEqual(hierarchy.shortest_path(1, 3), (15.0, [1, 2, 3]))
+
+    def test_hierarchy_command_checks_the_weight(self):
+        """Testing that a hierarchy is not built over a weight the edges lack"""
+        with self.assertRaises(CommandError):
+            call_command(
+                "build_contraction_hierarchy",
+                "--city=Campos",
+                "--state=RJ",
+                "--weight=lenght",
+            )
+
+        with (
+            patch.object(GraphService, "build_graph", return_value=self.graph),
+            patch.object(GraphService, "add_travel_times", side_effect=lambda G: G),
+            self.assertRaisesMessage(CommandError, "has no travel_time attribute"),
+        ):
+            call_command(
+                "build_contraction_hierarchy",
+                city="Campos",
+                state="RJ",
+                weight="travel_time",
+                stdout=io.StringIO(),
+            )
+
+    def test_invalidate_graph(self):
+        """Testing if an invalidated graph is removed from the cache"""
+        with patch.object(GraphService, "build_graph", return_value=self.graph):
+            GraphService.load_graph("Campos", "RJ", "Brasil")
+            GraphService.load_graph("Macae", "RJ", "Brasil")
+
+        removed = GraphService.invalidate("Campos", "RJ", "Brasil")
+        self.assertEqual(removed, ["campos-rj-brasil-drive"])
+        self.assertEqual(GraphService.cached_keys(), ["macae-rj-brasil-drive"])
+
+    def test_graph_imported_from_osm_extract(self):
+        """Testing if a graph read from a local extract is cached and never downloaded"""
+        osm_path = os.path.join(self.tmp_dir.name, "campos.osm")
+        boundary_path = os.path.join(self.tmp_dir.name, "campos.geojson")
+        with open(osm_path, "w") as f:
+            f.write(osm_extract())
+        with open(boundary_path, "w") as f:
+            json.dump(
+                {
+                    "type": "Feature",
+                    "geometry": {
+                        "type": "Polygon",
+                        "coordinates": [
+                            [
+                                [-41.3005, -21.7505],
+                                [-41.2965, -21.7505],
+                                [-41.2965, -21.7465],
+                                [-41.3005, -21.7465],
+                                [-41.3005, -21.7505],
+                            ]
+                        ],
+                    },
+                },
+                f,
+            )
+
+        call_command(
+            "import_osm_graph",
+            city="Campos",
+            state="RJ",
+            osm=osm_path,
+            boundary=boundary_path,
+            stdout=io.StringIO(),
+        )
+        GraphService._graphs.clear()
+        key = GraphService.cache_key("Campos", "RJ", "Brasil")
+        os.utime(GraphService.graph_path(key), (0, 0))
+        with patch.object(GraphService, "build_graph") as build_graph:
+            G = GraphService.load_graph("Campos", "RJ", "Brasil")
+
+        build_graph.assert_not_called()
+        # The footway and the street leaving the city are left out
+        self.assertEqual(sorted(G.nodes), [4, 5, 8, 9, 12, 16])
+        highways = {str(data["highway"]) for _, _, data in G.edges(data=True)}
+        self.assertNotIn("footway", highways)
+        self.assertEqual(G[5][9][0]["speed_kph"], 60)
+
+    def test_poly_boundary_with_hole(self):
+        """Testing if an Osmosis .poly boundary keeps the holes of its rings"""
+        boundary = OsmFileService.parse_poly(
+            "campos\n1\n0 0\n4 0\n4 4\n0 4\nEND\n!2\n1 1\n2 1\n2 2\n1 2\nEND\nEND\n"
+        )
+
+        self.assertEqual(boundary.area, 15)
+
+    def test_offline_cache_never_downloads(self):
+        """Testing if an offline cache refuses to download a missing graph"""
+        with (
+            override_settings(ROUTING_GRAPH_OFFLINE=True),
+            patch.object(GraphService, "build_graph") as build_graph,
+            self.assertRaises(ValueError),
+        ):
+            GraphService.load_graph("Campos", "RJ", "Brasil")
+
+        build_graph.assert_not_called()
+
+    def create_depots(self, *cities):
+        UserCrud.create(
+            role="Man",
+            name="Manager User",
+            age=40,
+            email="manageruser@test.com",
+            password="password",
+        )
+        for i, city in enumerate(cities):
+            DepotCrud.create(
+                user_email="manageruser@test.com",
+                name=f"Depot {i}",
+                contact="111222333",
+                registration="1122334455",
+                street="Depot St",
+                number=str(i),
+                complement="",
+                neighborhood="Centro",
+                city=city,
+                state="RJ",
+                cep="27910-000",
+                country="Brasil",
+            )
+
+    def test_warm_routing_loads_every_depot_city(self):
+        """Testing if the warm-up loads the caches of each depot city once"""
+        self.create_depots("Campos", "Macae", "Campos")
+        with patch.object(
+            GraphService, "build_graph", side_effect=lambda *args: random_road_graph(4)
+        ):
+            for city in ("Campos", "Macae"):
+                GraphService.load_graph(city, "RJ", "Brasil")
+        GraphService._graphs.clear()
+        GraphService._compact_graphs.clear()
+
+        out = io.StringIO()
+        with patch.object(GraphService, "build_graph") as build_graph:
+            call_command("warm_routing", "--build-hierarchies", stdout=out)
+
+        build_graph.assert_not_called()
+        self.assertIn("2 cities warmed", out.getvalue())
+        for city in ("Campos", "Macae"):
+            key = GraphService.cache_key(city, "RJ", "Brasil")
+            self.assertIn(key, GraphService._graphs)
+            self.assertIn(key, GraphService._snap_indexes)
+            for weight in ("length", "travel_time"):
+                self.assertIn((key, weight), GraphService._hierarchies)
+
+    def test_warm_routing_reports_the_cities_it_could_not_load(self):
+        """Testing if a city without a graph offline makes the warm-up fail"""
+        self.create_depots("Campos")
+        out = io.StringIO()
+        with (
+            override_settings(ROUTING_GRAPH_OFFLINE=True),
+            self.assertRaises(CommandError),
+        ):
+            call_command("warm_routing", stdout=out)
+
+        self.assertIn("Campos, RJ, Brasil: failed", out.getvalue())
+
+
+def osm_extract():
+    """OSM XML of a street grid with a primary road, a footway and an exit"""
+    nodes = [
+        f'<node id="{1 + i * 4 + j}" lat="{-21.75 + i * 0.001}" lon="{-41.3 + j * 0.001}"/>'
+        for i in range(4)
+        for j in range(4)
+    ]
+    nodes.append('<node id="99" lat="-21.7" lon="-41.3"/>')
+    ways = [(100 + i, range(1 + i * 4, 5 + i * 4), "residential") for i in range(4)]
+    ways += [
+        (200, [1, 5, 9, 13], "primary"),
+        (201, [4, 8, 12, 16], "footway"),
+        (202, [13, 99], "residential"),
+    ]
+    xml = []
+    for way_id, refs, highway in ways:
+        xml.append(f'<way id="{way_id}">')
+        xml += [f'<nd ref="{ref}"/>' for ref in refs]
+        xml.append(f'<tag k="highway" v="{highway}"/>')
+        if highway == "primary":
+            xml.append('<tag k="maxspeed" v="60"/>')
+        xml.append("</way>")
+    return f'<osm version="0.6">{"".join(nodes + xml)}</osm>'
+
+
+def random_road_graph(size=8, seed=0):
+    """Small street grid with random lengths, one-way streets and parallel edges"""
+    rng = random.Random(seed)
+    G = nx.MultiDiGraph()
+    for i in range(size):
+        for j in range(size):
+            node = 1000 + i * size + j
+            G.add_node(node, x=-41.3 + j * 0.001, y=-21.75 + i * 0.001)
+            for a, b in ((i, j + 1), (i + 1, j)):
+                if a < size and b < size:
+                    G.add_edge(node, 1000 + a * size + b, length=rng.uniform(100, 200))
+                    if rng.random() < 0.8:
+                        G.add_edge(
+                            1000 + a * size + b, node, length=rng.uniform(100, 200)
+                        )
+                    if rng.random() < 0.2:
+                        G.add_edge(
+                            node, 1000 + a * size + b, length=rng.uniform(50, 250)
+                        )
+    return G
+
+
+def line_graph(stops, length=1000.0, speed_kph=None):
+    """Stops on a street, each ``length`` meters from the previous one"""
+    G = nx.MultiDiGraph(crs="epsg:4326")
+    for node in range(stops):
+        G.add_node(node, x=-41.78 + node / 1000, y=-22.37 + node / 2000)
+    for node in range(stops - 1):
+        for u, v in ((node, node + 1), (node + 1, node)):
+            G.add_edge(u, v, length=length)
+            if speed_kph:
+                G[u][v][0]["travel_time"] = length / (speed_kph / 3.6)
+    return G
+
+
+def line_path(a, b):
+    """Nodes of a line graph between ``a`` and ``b``"""
+    return list(range(a, b, 1 if b >= a else -1)) + [b]
+
+
+PLACE = {
+    "contact": "111222333",
+    "registration": "1122334455",
+    "complement": "",
+    "neighborhood": "Centro",
+    "city": "Macae",
+    "state": "RJ",
+    "cep": "27910-000",
+    "country": "Brasil",
+}
+
+
+def depot_with_orders(cities):
+    """Manager, depot in Macae and one pending order from a store in each city"""
+    manager = UserCrud.create(
+        role="Man",
+        name="Manager User",
+        age=40,
+        email="manageruser@test.com",
+        password="password",
+    )
+    UserCrud.create(
+        role="Shop",
+        name="Shop User",
+        age=30,
+        email="shopuser@test.com",
+        password="password",
+    )
+    depot = DepotCrud.create(
+        user_email="manageruser@test.com",
+        name="Main Depot",
+        street="Depot St",
+        number="1",
+        **PLACE,
+    )
+    orders = []
+    for i, city in enumerate(cities):
+        store = StoreCrud.create(
+            user_email="shopuser@test.com",
+            name=f"Store {i}",
+            street=f"Street {i}",
+            number=str(i),
+            **{**PLACE, "city": city},
+        )
+        orders.append(OrderCrud.create(store.id))
+
+    return manager, depot, orders
+
+
+def define_line_route(G, depot, orders, planned):
+    """Plans the ``planned`` orders on ``G``, the store of ``orders[i]`` at node ``i + 1``
+
+    Returns the route and the mocked ``stop_matrix``.
+    """
+    node_of = {depot.address.id: 0}
+    for i, order in enumerate(orders):
+        node_of[order.store.address.id] = i + 1
+
+    def locate_stops(depot, address_objects, progress=None):
+        nodes = [node_of[address.id] for address in address_objects]
+        return G, nodes, [f"address {node}" for node in nodes]
+
+    def stop_matrix(address, nodes, *args):
+        return distance_matrix(CompactGraph.from_graph(G), nodes)
+
+    with (
+        patch.object(TripService, "locate_stops", side_effect=locate_stops),
+        patch.object(TripService, "stop_matrix", side_effect=stop_matrix) as mock,
+    ):
+        return TripService.define_route(depot, planned), mock
+
+
+@override_settings(
+    ROUTING_GRAPH_OFFLINE=True,
+    ROUTING_TILE_SIZE=0.002,
+    ROUTING_TILE_MARGIN=0.0005,
+    ROUTING_TILE_CACHE_SIZE=16,
+    ROUTING_MATRIX_WORKERS=1,
+)
+class TileServiceTest(TestCase):
+    "Tests to check the road graph stored in map tiles"
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            ROUTING_GRAPH_CACHE_DIR=self.tmp_dir.name
+        )
+        self.settings_override.enable()
+        TileService._tiles.clear()
+
+    def tearDown(self):
+        TileService._tiles.clear()
+        self.settings_override.disable()
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+    def test_tiles_cover_the_stops_with_a_margin(self):
+        """Testing if the tiles around the bounding box of the stops are picked"""
+        tiles = TileService.tiles_covering([0.0001, 0.0039], [0.0001, 0.0001])
+
+        self.assertEqual(
+            sorted(tiles), [(x, y) for x in (-1, 0) for y in (-1, 0, 1, 2)]
+        )
+
+    def test_tiles_stitch_back_into_the_graph(self):
+        """Testing if the tiles of a split graph load back as the same graph"""
+        G = random_road_graph()
+        G.graph["version"] = "20261018000000"
+        tiles = TileService.split_graph(G)
+        TileService._tiles.clear()
+
+        region = TileService.load_region(
+            [data["y"] for _, data in G.nodes(data=True)],
+            [data["x"] for _, data in G.nodes(data=True)],
+        )
+
+        self.assertGreater(len(tiles), 1)
+        self.assertNotIn("version", region.graph)
+        self.assertEqual(sorted(region.nodes), sorted(G.nodes))
+        self.assertEqual(
+            sorted(region.edges(keys=True, data="length")),
+            sorted(G.edges(keys=True, data="length")),
+        )
+
+    def test_least_recently_used_tiles_are_dropped(self):
+        """Testing if only the most recently used tiles stay loaded"""
+        first, second, third = TileService.split_graph(random_road_graph())[:3]
+        TileService._tiles.clear()
+
+        with override_settings(ROUTING_TILE_CACHE_SIZE=2):
+            for tile in (first, second, first, third):
+                TileService.load_tile(tile)
+
+        self.assertEqual(list(TileService._tiles), [("drive", first), ("drive", third)])
+
+    def test_tiles_loaded_from_several_threads(self):
+        """Testing if threads loading and evicting tiles at once keep the cache whole"""
+        tiles = TileService.split_graph(random_road_graph())
+        TileService._tiles.clear()
+
+        def load(thread):
+            for i in range(500):
+                TileService.load_tile(tiles[(thread + i) % len(tiles)])
+
+        with (
+            override_settings(ROUTING_TILE_CACHE_SIZE=2),
+            ThreadPoolExecutor(max_workers=8) as pool,
+        ):
+            for future in [pool.submit(load, thread) for thread in range(8)]:
+                future.result()
+
+        self.assertEqual(len(TileService._tiles), 2)
+
+    def test_imported_tiles_do_not_expire(self):
+        """Testing if imported tiles are kept past the TTL and downloaded ones are not"""
+        imported, downloaded = TileService.split_graph(
+            random_road_graph(), imported=True
+        )[:2]
+        os.remove(TileService.import_path(downloaded))
+        for tile in (imported, downloaded):
+            os.utime(TileService.tile_path(tile), (0, 0))
+        TileService._tiles.clear()
+
+        with (
+            override_settings(
+                ROUTING_GRAPH_OFFLINE=False, ROUTING_GRAPH_CACHE_TTL=3600
+            ),
+            patch.object(
+                TileService, "build_tile", return_value=nx.MultiDiGraph()
+            ) as build_tile,
+        ):
+            self.assertGreater(len(TileService.load_tile(imported)), 0)
+            TileService.load_tile(downloaded)
+
+        build_tile.assert_called_once_with(downloaded, "drive")
+
+    def test_offline_missing_tile_raises(self):
+        """Testing that a tile missing offline is never downloaded"""
+        with patch("app.services.tile_service.ox.graph_from_bbox") as download:
+            with self.assertRaises(ValueError):
+                TileService.load_tile((0, 0))
+
+        download.assert_not_called()
+
+    def plan_trip_between_cities(self):
+        """Trip from a depot in Macae to stores on a line graph split in tiles"""
+        _, depot, orders = depot_with_orders(["Rio das Ostras", "Macae"])
+        G = line_graph(4, speed_kph=36)
+        TileService.split_graph(G)
+        AddressCrud.save_geocode(
+            depot.address, G.nodes[0]["y"], G.nodes[0]["x"], "Full"
+        )
+        for order, node in zip(orders, (1, 3)):
+            AddressCrud.save_geocode(
+                order.store.address, G.nodes[node]["y"], G.nodes[node]["x"], "Full"
+            )
+
+        return TripService.define_trip(depot.id, [order.id for order in orders])
+
+    def test_trip_between_cities(self):
+        """Testing if a trip reaches stores in other cities over the tiles"""
+        with patch.object(GraphService, "load_graph") as load_graph:
+            trip, route = self.plan_trip_between_cities()
+
+        load_graph.assert_not_called()
+        self.assertEqual(trip.total_distance_km, 6.0)
+        self.assertEqual(len(route["geometry"]["segments"]), 3)
+
+    def test_trip_between_cities_is_drawn_on_the_tiles(self):
+        """Testing if the image of a trip between cities draws the tiled streets"""
+        trip, _ = self.plan_trip_between_cities()
+        TileService._tiles.clear()
+
+        with (
+            tempfile.TemporaryDirectory() as render_dir,
+            override_settings(ROUTING_RENDER_DIR=render_dir),
+            patch.object(GraphService, "load_graph") as load_graph,
+            patch.object(
+                RenderService, "plot_route", wraps=RenderService.plot_route
+            ) as plot_route,
+        ):
+            path = RenderService.render(trip, "image", preset="thumbnail")
+            self.assertTrue(os.path.isfile(path))
+
+        load_graph.assert_not_called()
+        self.assertEqual(sorted(plot_route.call_args.args[0].nodes), [0, 1, 2, 3])
+
+
+class RoutingServiceTest(TestCase):
+    "Tests to check the compact routing graph and its shortest path search"
+
+    def setUp(self):
+        self.G = random_road_graph()
+        self.graph = CompactGraph.from_graph(self.G)
+        return super().setUp()
+
+    def test_parallel_edges_are_collapsed(self):
+        """Testing if only the cheapest of the parallel edges is kept"""
+        self.assertEqual(len(self.graph.targets), len(nx.DiGraph(self.G).edges))
+
+    def test_dijkstra_matches_networkx(self):
+        """Testing if the CSR search finds the same distances as NetworkX"""
+        rng = random.Random(1)
+        nodes = list(self.G.nodes)
+        for _ in range(30):
+            start, target = rng.choice(nodes), rng.choice(nodes)
+            dist, path = dijkstra(self.graph, start, target)
+            try:
+                expected = nx.shortest_path_length(self.G, start, target, "length")
+            except nx.NetworkXNoPath:
+                self.assertEqual((dist, path), (float("inf"), []))
+                continue
+
+            self.assertAlmostEqual(dist, expected)
+            self.assertEqual((path[0], path[-1]), (start, target))
+            self.assertAlmostEqual(nx.path_weight(self.G, path, "length"), dist)
+
+    def test_save_and_load_compact_graph(self):
+        """Testing if the CSR arrays survive a round trip to disk"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "compact.bin")
+            self.graph.save(path)
+            loaded = CompactGraph.load(path)
+
+        self.assertEqual(loaded.weight, "length")
+        self.assertEqual(loaded.index, self.graph.index)
+        self.assertEqual(loaded.weights.tolist(), self.graph.weights.tolist())
+
+    def test_mapped_graph_routes_like_the_original(self):
+        """Testing if a mapped graph finds the same routes and pickles as its file"""
+        stops = random.Random(3).sample(list(self.G.nodes), 5)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "compact.bin")
+            self.graph.save(path)
+            mapped = CompactGraph.load(path)
+            copy = pickle.loads(pickle.dumps(mapped))
+
+            for strategy in SEARCH_STRATEGIES:
+                self.assertTrue(
+                    np.allclose(
+                        distance_matrix(copy, stops, strategy).distances,
+                        distance_matrix(self.graph, stops, strategy).distances,
+                    )
+                )
+
+        self.assertLess(len(pickle.dumps(mapped)), 1000)
+        self.assertEqual(copy.mapped_from, mapped.mapped_from)
+
+    def test_distance_matrix_matches_point_to_point_search(self):
+        """Testing if the one-to-many matrix matches a search for each pair"""
+        stops = random.Random(2).sample(list(self.G.nodes), 6)
+        matrix = distance_matrix(self.graph, stops)
+
+        for i, start in enumerate(stops):
+            for j, target in enumerate(stops):
+                dist, _ = dijkstra(self.graph, start, target)
+                self.assertAlmostEqual(matrix.distances[i][j], dist)
+                if dist < float("inf"):
+                    path = matrix.path(i, j)
+                    self.assertEqual((path[0], path[-1]), (start, target))
+                    self.assertAlmostEqual(nx.path_weight(self.G, path, "length"), dist)
+
+    def test_parallel_distance_matrix_matches_serial(self):
+        """Testing if splitting the source stops across processes changes nothing"""
+        stops = random.Random(4).sample(list(self.G.nodes), 7)
+        for strategy in ["dijkstra", "astar"]:
+            serial = distance_matrix(self.graph, stops, strategy)
+            parallel = distance_matrix(self.graph, stops, strategy, workers=3)
+
+            self.assertEqual(parallel.distances.tolist(), serial.distances.tolist())
+            for i, j in itertools.product(range(len(stops)), repeat=2):
+                self.assertEqual(parallel.path(i, j), serial.path(i, j))
+
+    def test_astar_matrix_bounds_each_target_once(self):
+        """Testing if the A* matrix computes the bounds of each stop only once"""
+        stops = random.Random(6).sample(list(self.G.nodes), 6)
+        with patch.object(
+            CompactGraph,
+            "lower_bounds",
+            autospec=True,
+            side_effect=CompactGraph.lower_bounds,
+        ) as lower_bounds:
+            matrix = distance_matrix(self.graph, stops, "astar")
+
+        self.assertEqual(lower_bounds.call_count, len(stops))
+        np.testing.assert_allclose(
+            matrix.distances, distance_matrix(self.graph, stops).distances
+        )
+
+    def test_search_strategies_match_dijkstra(self):
+        """Testing if A* and bidirectional search find the Dijkstra distance"""
+        rng = random.Random(3)
+        nodes = list(self.G.nodes)
+        for _ in range(30):
+            start, target = rng.choice(nodes), rng.choice(nodes)
+            expected, _ = dijkstra(self.graph, start, target)
+            for strategy in ["astar", "bidirectional"]:
+                dist, path = shortest_path(self.graph, start, target, strategy)
+                self.assertAlmostEqual(dist, expected)
+                if dist < float("inf"):
+                    self.assertEqual((path[0], path[-1]), (start, target))
+                    self.assertAlmostEqual(nx.path_weight(self.G, path, "length"), dist)
+
+    def test_astar_settles_fewer_nodes(self):
+        """Testing if the great-circle bound keeps A* from settling every node"""
+        leg = (1000 + 3 * 8, 1000 + 3 * 8 + 7)
+        dijkstra_stats, astar_stats = {}, {}
+        shortest_path(self.graph, *leg, "dijkstra", dijkstra_stats)
+        shortest_path(self.graph, *leg, "astar", astar_stats)
+        self.assertLess(astar_stats["settled"], dijkstra_stats["settled"])
+
+    def test_unknown_search_strategy_fails(self):
+        """Testing if an unknown search strategy is refused"""
+        with self.assertRaises(ValueError):
+            shortest_path(self.graph, 1000, 1001, "greedy")
+
+
+class HierarchyServiceTest(TestCase):
+    "Tests to check the contraction hierarchy queries"
+
+    def setUp(self):
+        self.G = random_road_graph(seed=4)
+        self.graph = CompactGraph.from_graph(self.G)
+        self.hierarchy = ContractionHierarchy.build(self.graph)
+        self.stops = random.Random(5).sample(list(self.G.nodes), 8)
+        return super().setUp()
+
+    def test_matrix_matches_dijkstra(self):
+        """Testing if the many-to-many query matches the Dijkstra matrix"""
+        expected = distance_matrix(self.graph, self.stops)
+        matrix = self.hierarchy.distance_matrix(self.stops)
+
+        for i, start in enumerate(self.stops):
+            for j, target in enumerate(self.stops):
+                self.assertAlmostEqual(matrix.distances[i][j], expected.distances[i][j])
+                if matrix.distances[i][j] < float("inf"):
+                    path = matrix.path(i, j)
+                    self.assertEqual((path[0], path[-1]), (start, target))
+                    self.assertAlmostEqual(
+                        nx.path_weight(self.G, path, "length"),
+                        matrix.distances[i][j],
+                    )
+
+    def test_point_to_point_query(self):
+        """Testing if a single query unpacks its shortcuts into road edges"""
+        start, target = self.stops[0], self.stops[1]
+        dist, path = self.hierarchy.shortest_path(start, target)
+        self.assertAlmostEqual(dist, dijkstra(self.graph, start, target)[0])
+        self.assertAlmostEqual(nx.path_weight(self.G, path, "length"), dist)
+
+    def test_save_and_load_hierarchy(self):
+        """Testing if a stored hierarchy answers the same queries"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "hierarchy.bin")
+            self.hierarchy.save(path)
+            loaded = ContractionHierarchy.load(self.graph, path)
+
+        self.assertEqual(
+            loaded.distance_matrix(self.stops).distances.tolist(),
+            self.hierarchy.distance_matrix(self.stops).distances.tolist(),
+        )
+
+
+class TourServiceTest(TestCase):
+    "Tests to check the stop ordering heuristics"
+
+    def setUp(self):
+        self.distances = [
+            [0, 2, 9, 10],
+            [1, 0, 6, 4],
+            [15, 7, 0, 8],
+            [6, 3, 12, 0],
+        ]
+        return super().setUp()
+
+    def test_nearest_neighbour_tour(self):
+        """Testing if the greedy tour always goes to the closest remaining stop"""
+        tour = nearest_neighbour_tour(self.distances)
+        self.assertEqual(tour, [0, 1, 3, 2, 0])
+        self.assertEqual(tour_length(self.distances, tour), 33)
+
+    def test_improve_tour_removes_crossing(self):
+        """Testing if 2-opt uncrosses a tour around the corners of a square"""
+        corners = [(0, 0), (0, 1), (1, 1), (1, 0)]
+        distances = [
+            [abs(ax - bx) + abs(ay - by) for bx, by in corners] for ax, ay in corners
+        ]
+        tour = improve_tour(distances, [0, 2, 1, 3, 0])
+        self.assertEqual(tour_length(distances, tour), 4)
+
+    def test_improve_tour_without_budget_left_keeps_the_tour(self):
+        """Testing if a used up time budget leaves the tour untouched"""
+        corners = [(0, 0), (0, 1), (1, 1), (1, 0)]
+        distances = [
+            [abs(ax - bx) + abs(ay - by) for bx, by in corners] for ax, ay in corners
+        ]
+        self.assertEqual(improve_tour(distances, [0, 2, 1, 3, 0], 0), [0, 2, 1, 3, 0])
+
+    def test_improve_tour_never_gets_worse(self):
+        """Testing if local search keeps every stop and never lengthens the tour"""
+        rng = random.Random(6)
+        for _ in range(10):
+            size = rng.randint(5, 20)
+            distances = [
+                [0 if a == b else rng.uniform(1, 100) for b in range(size)]
+                for a in range(size)
+            ]
+            initial = nearest_neighbour_tour(distances)
+            tour = improve_tour(distances, initial)
+
+            self.assertEqual((tour[0], tour[-1]), (0, 0))
+            self.assertEqual(sorted(tour[1:-1]), list(range(1, size)))
+            self.assertLessEqual(
+                tour_length(distances, tour), tour_length(distances, initial)
+            )
+
+    def test_held_karp_finds_optimal_tour(self):
+        """Testing if the exact solver matches a brute force search"""
+        rng = random.Random(7)
+        for size in range(1, 8):
+            distances = [
+                [0 if a == b else rng.uniform(1, 100) for b in range(size)]
+                for a in range(size)
+            ]
+            best = min(
+                tour_length(distances, [0, *order, 0])
+                for order in itertools.permutations(range(1, size))
+            )
+            tour = held_karp(distances)
+
+            self.assertEqual(sorted(tour[1:-1]), list(range(1, size)))
+            self.assertAlmostEqual(tour_length(distances, tour), best)
+
+    def test_solve_tour_uses_exact_solver_for_small_trips(self):
+        """Testing if small trips are solved exactly and larger ones heuristically"""
+        with patch("app.services.tour_service.held_karp") as exact:
+            solve_tour(self.distances, exact_max_stops=3)
+            solve_tour(self.distances, exact_max_stops=2)
+
+        self.assertEqual(exact.call_count, 1)
+
+
+def random_customers(count, seed=0):
+    """Depot in the middle of a square and customers with random loads."""
+    rng = random.Random(seed)
+    points = [(50.0, 50.0)] + [
+        (rng.uniform(0, 100), rng.uniform(0, 100)) for _ in range(count)
+    ]
+    distances = [[math.dist(a, b) for b in points] for a in points]
+    demands = [[rng.uniform(50, 400), rng.uniform(0.2, 2)] for _ in range(count)]
+    return distances, demands
+
+
+class FleetServiceTest(TestCase):
+    "Tests to check the capacity-aware fleet planner"
+
+    def test_clarke_wright_joins_customers_on_a_line(self):
+        """Testing if customers along the same road end up on a single route"""
+        points = [0, 1, 2, 3, 4]
+        distances = [[abs(a - b) for b in points] for a in points]
+        routes = clarke_wright(distances, [[1]] * 4, [10])
+        self.assertEqual(len(routes), 1)
+        self.assertEqual(sorted(routes[0]), [1, 2, 3, 4])
+
+    def test_clarke_wright_respects_capacity(self):
+        """Testing if every savings route fits the vehicle and no customer is lost"""
+        distances, demands = random_customers(60)
+        routes = clarke_wright(distances, demands, [1500, 12])
+
+        self.assertEqual(
+            sorted(c for route in routes for c in route), list(range(1, 61))
+        )
+        for route in routes:
+            load = route_load(np.array(demands), route)
+            self.assertLessEqual(load[0], 1500)
+            self.assertLessEqual(load[1], 12)
+
+    def test_relocate_never_gets_worse(self):
+        """Testing if relocating customers keeps the loads and shortens the plan"""
+        distances, demands = random_customers(40, seed=1)
+        distances, demands = np.array(distances), np.array(demands)
+        capacities = np.array([[3000, 25]] * 5)
+        plan = [(t, list(range(1 + t * 8, 9 + t * 8))) for t in range(5)]
+
+        improved = relocate(distances, demands, capacities, plan)
+
+        self.assertLess(
+            sum(route_length(distances, route) for _, route in improved),
+            sum(route_length(distances, route) for _, route in plan),
+        )
+        for vehicle, route in improved:
+            self.assertTrue(np.all(route_load(demands, route) <= capacities[vehicle]))
+
+    def test_plan_routes_uses_each_truck_once(self):
+        """Testing if a mixed fleet gets one feasible tour per truck"""
+        distances, demands = random_customers(200, seed=2)
+        capacities = [[3000, 26]] * 10 + [[14000, 55]] * 2
+
+        tours = plan_routes(distances, demands, capacities, time_budget=5)
+
+        vehicles = [vehicle for vehicle, _ in tours]
+        self.assertEqual(len(vehicles), len(set(vehicles)))
+        self.assertEqual(
+            sorted(c for _, tour in tours for c in tour[1:-1]), list(range(1, 201))
+        )
+        for vehicle, tour in tours:
+            self.assertEqual((tour[0], tour[-1]), (0, 0))
+            load = route_load(np.array(demands), tour[1:-1])
+            self.assertTrue(np.all(load <= np.array(capacities[vehicle])))
+
+    def test_plan_routes_out_of_time_keeps_the_savings_order(self):
+        """Testing that no route is improved once the time budget is used up"""
+        distances, demands = random_customers(30, seed=4)
+        capacities = [[3000, 26]] * 10
+
+        with patch("app.services.fleet_service.solve_tour") as solve_tour:
+            tours = plan_routes(distances, demands, capacities, time_budget=0)
+
+        solve_tour.assert_not_called()
+        self.assertEqual(
+            sorted(c for _, tour in tours for c in tour[1:-1]), list(range(1, 31))
+        )
+        for _, tour in tours:
+            self.assertEqual((tour[0], tour[-1]), (0, 0))
+
+    def test_plan_routes_without_enough_trucks_fails(self):
+        """Testing that orders beyond the fleet capacity raise an error"""
+        distances, demands = random_customers(30, seed=3)
+        with self.assertRaises(CapacityError):
+            plan_routes(distances, demands, [[1000, 10]])
+        with self.assertRaises(CapacityError):
+            plan_routes(distances, [[5000, 1]] * 30, [[3000, 30]] * 30)
+
+
+class PlanTripsTest(TestCase):
+    "Tests to check the creation of the trips planned for a depot"
+
+    def setUp(self):
+        _, self.depot, self.orders = depot_with_orders(["Macae"] * 6)
+        for order in self.orders:
+            order.total_weight_kg = 900.0
+            order.total_volume_m3 = 5.0
+            order.save()
+
+        UserCrud.create(
+            role="Carr",
+            name="Carrier User",
+            age=35,
+            email="carrieruser@test.com",
+            password="password",
+        )
+        carrier = CarrierCrud.create(
+            user_email="carrieruser@test.com",
+            name="Fast Carrier",
+            street="Carrier Ave",
+            number="2",
+            **PLACE,
+        )
+        TruckCrud.create(carrier.id, "LGT1111", "light", 2021)
+        TruckCrud.create(carrier.id, "LGT2222", "light", 2021)
+
+        # Stops on a line: the depot at 0 and each store 1 km further away
+        points = range(7)
+        self.matrix = DistanceMatrix(
+            None,
+            list(points),
+            np.array([[abs(a - b) * 1000.0 for b in points] for a in points]),
+        )
+
+    def routed(self, plan):
+        # Six stores on a line, routed without geocoding nor a real graph
+        with (
+            patch.object(
+                TripService,
+                "locate_stops",
+                return_value=(line_graph(7), list(range(7)), ["address"] * 7),
+            ),
+            patch.object(TripService, "stop_matrix", return_value=self.matrix),
+            patch.object(
+                TripService,
+                "route_geometry",
+                return_value={"stops": [], "segments": []},
+            ),
+            patch.object(DistanceMatrix, "path", side_effect=line_path),
+        ):
+            return plan()
+
+    def plan(self, **kwargs):
+        return self.routed(lambda: TripService.plan_trips(self.depot.id, **kwargs))
+
+    def test_plan_trips_splits_orders_by_capacity(self):
+        """Testing if the pending orders are split into trips that fit the trucks"""
+        planned = self.plan()
+
+        self.assertEqual(len(planned), 2)
+        self.assertEqual(
+            sorted(order_id for plan in planned for order_id in plan["orders"]),
+            sorted(order.id for order in self.orders),
+        )
+        for plan in planned:
+            trip = plan["trip"]
+            self.assertEqual(trip.status, "Plan")
+            self.assertEqual(trip.truck, plan["truck"])
+            self.assertLessEqual(
+                trip.total_loaded_weight_kg, plan["truck"].max_payload_kg
+            )
+            for order_id in plan["orders"]:
+                self.assertEqual(OrderCrud.read_by_id(order_id).trip, trip)
+
+    def test_planned_trucks_are_reserved(self):
+        """Testing that the trucks of a plan are not packed nor started for other trips"""
+        planned = self.plan()
+        reserved, other = planned[0]["truck"], planned[1]["truck"]
+
+        with self.assertRaises(ValueError):
+            TripService.select_fleet()
+        with self.assertRaises(StatusError):
+            TripService.select_fleet([reserved.plate])
+        with self.assertRaises(StatusError):
+            TripService.start_trip(other.plate, planned[0]["trip"].id, self.depot.id)
+
+        trip = TripService.start_trip(
+            reserved.plate, planned[0]["trip"].id, self.depot.id
+        )
+        self.assertEqual(trip.status, "InTr")
+
+    def test_plan_trips_without_enough_trucks_creates_nothing(self):
+        """Testing that a plan that does not fit the fleet leaves the orders pending"""
+        with self.assertRaises(CapacityError):
+            self.plan(truck_plates=["LGT1111"])
+
+        self.assertEqual(TripCrud.read().count(), 0)
+        self.assertEqual(OrderCrud.read_pend_orders().count(), 6)
+
+    def test_plan_trips_is_queued(self):
+        """Testing that planning the trips answers right away and a worker plans them"""
+        client = Client()
+        client.login(email="manageruser@test.com", password="password")
+        response = client.post(
+            reverse("Depot Plan Trips Route", kwargs={"id": self.depot.id}),
+            json.dumps({"trucks": ["LGT1111", "LGT2222"]}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 202)
+        data = response.json()["data"]
+        self.assertEqual(data["status"], "Queued")
+        self.assertEqual(TripCrud.read().count(), 0)
+
+        out = io.StringIO()
+        self.routed(lambda: call_command("run_trip_jobs", once=True, stdout=out))
+
+        job = TripJobCrud.read_by_id(data["id"])
+        self.assertEqual(job.status, "Done")
+        self.assertEqual(len(job.result["trips"]), 2)
+        self.assertIn(f"Trip job {job.id} planned 2 trips:", out.getvalue())
+        self.assertEqual(TripCrud.read().count(), 2)
+        self.assertEqual(OrderCrud.read_pend_orders().count(), 0)
+
+    def test_nearest_neighbour_distance_comes_from_the_matrix(self):
+        """Testing that only the legs of the planned route are searched street by street"""
+        with patch.object(
+            DistanceMatrix, "path", autospec=True, side_effect=DistanceMatrix.path
+        ) as path:
+            route, _ = define_line_route(
+                line_graph(7), self.depot, self.orders, [self.orders[4], self.orders[1]]
+            )
+
+        self.assertEqual(path.call_count, 3)
+        self.assertEqual(route["initial_distance_km"], 10.0)
+
+
+class RouteCacheServiceTest(TestCase):
+    "Tests to check the routes reused when the same stops are planned again"
+
+    def setUp(self):
+        _, self.depot, self.orders = depot_with_orders(["Macae"] * 6)
+        # A graph downloaded for the depot's city, each store one node further
+        self.G = line_graph(7)
+        self.G.graph["version"] = "20261018000000"
+        RouteCacheService._routes.clear()
+        self.addCleanup(RouteCacheService._routes.clear)
+
+    def define_route(self, orders, G=None):
+        route, self.stop_matrix = define_line_route(
+            self.G if G is None else G, self.depot, self.orders, orders
+        )
+        return route
+
+    def test_replanned_stops_reuse_the_route(self):
+        """Testing if planning the same stops again reuses the cached route"""
+        orders = [self.orders[4], self.orders[1], self.orders[2]]
+
+        first = self.define_route(orders)
+        second = self.define_route(list(reversed(orders)))
+
+        self.stop_matrix.assert_not_called()
+        self.assertEqual(second["total_distance_km"], first["total_distance_km"])
+        self.assertEqual(
+            [stop["order"] for stop in second["stops"]],
+            [stop["order"] for stop in first["stops"]],
+        )
+        self.assertEqual(
+            [stop["leg_distance_m"] for stop in second["stops"]],
+            [stop["leg_distance_m"] for stop in first["stops"]],
+        )
+        self.assertEqual(second["geometry"], first["geometry"])
+
+    @override_settings(ROUTING_ROUTE_CACHE_SIZE=1)
+    def test_route_cache_drops_the_least_recently_used(self):
+        """Testing if the route cache keeps only its most recent routes"""
+        self.define_route(self.orders[:2])
+        self.define_route(self.orders[2:4])
+        self.define_route(self.orders[:2])
+
+        self.stop_matrix.assert_called_once()
+        self.assertEqual(len(RouteCacheService._routes), 1)
+
+    @override_settings(
+        ROUTING_GRAPH_OFFLINE=True,
+        ROUTING_TILE_SIZE=0.002,
+        ROUTING_TILE_MARGIN=0.0005,
+    )
+    def test_tile_region_routes_are_not_cached(self):
+        """Testing that routes over map tiles, even imported ones, are planned again"""
+        TileService._tiles.clear()
+        self.addCleanup(TileService._tiles.clear)
+        with (
+            tempfile.TemporaryDirectory() as tmp_dir,
+            override_settings(ROUTING_GRAPH_CACHE_DIR=tmp_dir),
+        ):
+            TileService.split_graph(self.G, imported=True)
+            region = TileService.load_region(
+                [data["y"] for _, data in self.G.nodes(data=True)],
+                [data["x"] for _, data in self.G.nodes(data=True)],
+            )
+
+        self.define_route(self.orders[:2], region)
+        self.define_route(self.orders[:2], region)
+
+        self.stop_matrix.assert_called_once()
+        self.assertEqual(len(RouteCacheService._routes), 0)
+
+    @override_settings(ROUTING_ROUTE_CACHE_SIZE=4)
+    def test_route_cache_from_several_threads(self):
+        """Testing if threads reading and evicting routes at once keep the cache whole"""
+
+        def plan(thread):
+            for i in range(2000):
+                key = RouteCacheService.key([0, i % 8], 1, "length")
+                if RouteCacheService.get(key) is None:
+                    RouteCacheService.put(key, {"thread": thread})
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for future in [pool.submit(plan, thread) for thread in range(8)]:
+                future.result()
+
+        self.assertEqual(len(RouteCacheService._routes), 4)
+
+
+class TripJobTest(TestCase):
+    "Tests to check the trips planned in the background"
+
+    def setUp(self):
+        self.manager, self.depot, self.orders = depot_with_orders(["Macae"] * 3)
+
+        points = range(4)
+        self.matrix = DistanceMatrix(
+            None,
+            list(points),
+            np.array([[abs(a - b) * 1000.0 for b in points] for a in points]),
+        )
+        self.client = Client()
+        self.client.login(email="manageruser@test.com", password="password")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(ROUTING_RENDER_DIR=self.tmp_dir.name)
+        self.settings_override.enable()
+        # No traffic profile slows the streets down at 11 AM
+        self.midday = timezone.make_aware(datetime(2026, 10, 19, 11))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+    def run_jobs(self, speed_kph=None):
+        # Four stops on a line, 1 km apart
+        G = line_graph(4, speed_kph=speed_kph)
+
+        with (
+            patch.object(
+                TripService,
+                "locate_stops",
+                return_value=(G, list(range(4)), ["address"] * 4),
+            ),
+            patch.object(
+                TripService, "stop_matrix", return_value=self.matrix
+            ) as stop_matrix,
+            patch.object(GraphService, "load_graph", return_value=G),
+            patch.object(DistanceMatrix, "path", side_effect=line_path),
+            patch.object(
+                TripJobCrud, "set_phase", wraps=TripJobCrud.set_phase
+            ) as set_phase,
+        ):
+            jobs = JobService.run_pending()
+
+        self.weights = [call.args[3] for call in stop_matrix.call_args_list]
+
+        return jobs, [call.args[1] for call in set_phase.call_args_list]
+
+    def test_define_trip_is_queued(self):
+        """Testing that defining a trip answers right away with a queued job"""
+        response = self.client.post(
+            reverse("Depot Define Trip Route", kwargs={"id": self.depot.id}),
+            json.dumps({"orders": [order.id for order in self.orders]}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 202)
+        data = response.json()["data"]
+        self.assertEqual(data["status"], "Queued")
+        self.assertEqual(TripJobCrud.read_by_id(data["id"]).status, "Queu")
+        self.assertEqual(TripCrud.read().count(), 0)
+
+    def test_define_trip_checks_orders_before_queueing(self):
+        """Testing that orders that are not pending are refused without a job"""
+        self.orders[0].status = "Sche"
+        self.orders[0].save()
+
+        response = self.client.post(
+            reverse("Trips Route"),
+            json.dumps(
+                {
+                    "depot_id": self.depot.id,
+                    "orders_list": [order.id for order in self.orders],
+                }
+            ),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(JobService.run_pending())
+
+    def test_job_of_a_stopped_worker_fails(self):
+        """Testing that a job left running by a worker that stopped is failed"""
+        stopped = JobService.enqueue_trip(
+            self.manager, self.depot.id, [order.id for order in self.orders[:1]]
+        )
+        stopped = TripJobCrud.claim_next()
+        stopped.started_at = timezone.now() - timedelta(hours=1)
+        stopped.save()
+        running = JobService.enqueue_trip(
+            self.manager, self.depot.id, [order.id for order in self.orders[1:]]
+        )
+        self.assertEqual(TripJobCrud.claim_next().id, running.id)
+
+        with override_settings(ROUTING_JOB_TIMEOUT=600):
+            self.assertIsNone(TripJobCrud.claim_next())
+
+        stopped = TripJobCrud.read_by_id(stopped.id)
+        self.assertEqual(stopped.status, "Fail")
+        self.assertIn("worker stopped", stopped.error)
+        self.assertEqual(TripJobCrud.read_by_id(running.id).status, "Runn")
+
+    def test_job_plans_the_trip(self):
+        """Testing that the worker plans the trip and reports each phase"""
+        job = JobService.enqueue_trip(
+            self.manager, self.depot.id, [order.id for order in self.orders]
+        )
+
+        jobs, phases = self.run_jobs()
+
+        self.assertEqual([done.id for done in jobs], [job.id])
+        self.assertEqual(phases, ["Rout"])
+        self.assertEqual(os.listdir(self.tmp_dir.name), [])
+        response = self.client.get(reverse("Trip Job Route", kwargs={"id": job.id}))
+        data = response.json()["data"]
+        self.assertEqual(data["status"], "Done")
+        self.assertEqual(data["total_distance_km"], 6.0)
+        self.assertEqual(data["route_order"][0], 0)
+        self.assertEqual(data["trip"]["id"], TripCrud.read().get().id)
+        for order in self.orders:
+            self.assertEqual(OrderCrud.read_by_id(order.id).status, "Sche")
+
+        # The stops are stored in visiting order, with the leg to each one
+        response = self.client.get(
+            reverse("Trip Route", kwargs={"id": data["trip"]["id"]})
+        )
+        stops = response.json()["data"]["stops"]
+        self.assertEqual([stop["position"] for stop in stops], list(range(5)))
+        self.assertEqual(stops[0]["order"], None)
+        self.assertEqual(stops[-1]["address"], self.depot.address.id)
+        self.assertEqual(
+            sorted(stop["order"] for stop in stops[1:-1]),
+            sorted(order.id for order in self.orders),
+        )
+        self.assertEqual(sum(stop["leg_distance_km"] for stop in stops), 6.0)
+        self.assertGreater(stops[1]["leg_duration_min"], 0)
+
+    def test_job_optimizes_travel_time(self):
+        """Testing that a trip planned for time sums the travel time of its streets"""
+        with self.assertRaises(ValueError):
+            JobService.enqueue_trip(
+                self.manager,
+                self.depot.id,
+                [order.id for order in self.orders],
+                optimize="fuel",
+            )
+
+        job = JobService.enqueue_trip(
+            self.manager,
+            self.depot.id,
+            [order.id for order in self.orders],
+            optimize="time",
+            departure=self.midday,
+        )
+
+        self.run_jobs(speed_kph=50)
+
+        self.assertEqual(self.weights, ["travel_time"])
+        data = JobService.describe(TripJobCrud.read_by_id(job.id))
+        # 6 km at 50 km/h
+        self.assertEqual(data["total_duration_min"], 7.2)
+        stops = TripStopCrud.read_by_trip(data["trip"]["id"])
+        self.assertEqual(
+            sorted(stop.leg_duration_s for stop in stops), [0, 72, 72, 72, 216]
+        )
+
+    def test_simulation_follows_the_traffic_of_the_hour(self):
+        """Testing that the simulated arrival depends on the departure hour"""
+        carrier_user = UserCrud.create(
+            role="Carr",
+            name="Carrier User",
+            age=35,
+            email="carrieruser@test.com",
+            password="password",
+        )
+        carrier = CarrierCrud.create(
+            user_email=carrier_user.email,
+            name="Fast Carrier",
+            street="Carrier Ave",
+            number="2",
+            contact="111222333",
+            registration="1122334455",
+            complement="",
+            neighborhood="Centro",
+            city="Macae",
+            state="RJ",
+            cep="27910-000",
+            country="Brasil",
+        )
+        TruckCrud.create(carrier.id, "LGT1111", "light", 2021)
+        JobService.enqueue_trip(
+            self.manager, self.depot.id, [order.id for order in self.orders]
+        )
+        trip = self.run_jobs(speed_kph=50)[0][0].trip
+
+        midday = TripService.simulate_trip(trip.id, "LGT1111", None, self.midday)
+        heavy = TripService.simulate_trip(trip.id, "LGT1111", "heavy", self.midday)
+        peak = TripService.simulate_trip(
+            trip.id, "LGT1111", None, self.midday.replace(hour=8)
+        )
+
+        # 7.2 minutes of driving at midday, three times longer in heavy
+        # traffic, and at 75% of the speed on local streets at 8 AM
+        self.assertEqual((midday["trip_hours"], midday["trip_minutes"]), (0, 7))
+        self.assertEqual((heavy["trip_hours"], heavy["trip_minutes"]), (0, 22))
+        self.assertEqual((peak["trip_hours"], peak["trip_minutes"]), (0, 10))
+        self.assertEqual(
+            peak["stop_arrivals"][-1],
+            self.midday.replace(hour=8) + timedelta(seconds=576),
+        )
+
+    def test_route_is_rendered_on_first_request(self):
+        """Testing that the route map is drawn once, from the stored geometry"""
+        JobService.enqueue_trip(
+            self.manager, self.depot.id, [order.id for order in self.orders]
+        )
+        trip = self.run_jobs()[0][0].trip
+        self.assertEqual(len(trip_geometry(trip)["stops"]), 5)
+
+        url = reverse("Trip Route Render", kwargs={"id": trip.id, "kind": "map"})
+        with patch.object(
+            RenderService, "map_route", wraps=RenderService.map_route
+        ) as map_route:
+            first = b"".join(self.client.get(url).streaming_content)
+            second = b"".join(self.client.get(url).streaming_content)
+
+        self.assertEqual(map_route.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertIn(b"Parada 1: Street", first)
+        self.assertEqual(
+            os.listdir(self.tmp_dir.name),
+            [RenderService.artifact_name(trip_geometry(trip), "map")],
+        )
+
+    def test_route_of_a_deleted_address_is_drawn(self):
+        """Testing that the route image is drawn after a stop's address was deleted"""
+        JobService.enqueue_trip(
+            self.manager, self.depot.id, [order.id for order in self.orders]
+        )
+        trip = self.run_jobs()[0][0].trip
+        AddressCrud.delete(self.orders[0].store.address.id)
+
+        url = reverse("Trip Route Render", kwargs={"id": trip.id, "kind": "image"})
+        with patch.object(
+            GraphService, "load_graph", return_value=line_graph(4)
+        ) as load_graph:
+            response = self.client.get(url, {"preset": "thumbnail"})
+
+        self.assertEqual(response.status_code, 200)
+        load_graph.assert_called_once_with("Macae", "RJ", "Brasil")
+
+    def test_job_renders_when_asked(self):
+        """Testing that a job asked to render draws the image and the map"""
+        JobService.enqueue_trip(
+            self.manager,
+            self.depot.id,
+            [order.id for order in self.orders],
+            render=True,
+        )
+
+        jobs, phases = self.run_jobs()
+
+        self.assertEqual(phases, ["Rout", "Rend"])
+        self.assertEqual(
+            sorted(name.rsplit(".", 1)[1] for name in os.listdir(self.tmp_dir.name)),
+            ["html", "png"],
+        )
+
+    def test_job_keeps_the_trip_when_drawing_fails(self):
+        """Testing that a drawing that fails does not hide the trip already created"""
+        JobService.enqueue_trip(
+            self.manager,
+            self.depot.id,
+            [order.id for order in self.orders],
+            render=True,
+        )
+
+        with patch.object(RenderService, "render", side_effect=OSError("Disk full")):
+            job = self.run_jobs()[0][0]
+
+        self.assertEqual(job.status, "Done")
+        self.assertEqual(TripCrud.read().get(), job.trip)
+
+    def test_route_geometry_endpoint(self):
+        """Testing that the planned route is sent as GeoJSON or polylines"""
+        JobService.enqueue_trip(
+            self.manager, self.depot.id, [order.id for order in self.orders]
+        )
+        trip = self.run_jobs()[0][0].trip
+        url = reverse("Trip Route Geometry", kwargs={"id": trip.id})
+
+        geojson = self.client.get(url, {"zoom": 15}).json()["data"]
+        self.assertEqual(geojson["type"], "FeatureCollection")
+        kinds = [feature["geometry"]["type"] for feature in geojson["features"]]
+        self.assertEqual(kinds, ["LineString"] * 4 + ["Point"] * 4)
+
+        polylines = self.client.get(url, {"format": "polyline"}).json()["data"]
+        self.assertEqual(len(polylines["legs"]), 4)
+        self.assertEqual(polylines["stops"][0]["role"], "depot")
+
+        response = self.client.get(url, {"zoom": "far"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_failed_job_keeps_the_error(self):
+        """Testing that a job that fails in the worker reports the error"""
+        job = JobService.enqueue_trip(
+            self.manager, self.depot.id, [order.id for order in self.orders]
+        )
+        with patch.object(
+            TripService, "locate_stops", side_effect=ValueError("Address not found")
+        ):
+            JobService.run_pending()
+
+        job = TripJobCrud.read_by_id(job.id)
+        self.assertEqual(job.status, "Fail")
+        self.assertEqual(job.error, "Address not found")
+        self.assertEqual(OrderCrud.read_pend_orders().count(), 3)
+
+
+class RenderServiceTest(TestCase):
+    "Tests to check the drawing of the route images"
+
+    def setUp(self):
+        self.G = grid_graph(20)
+        self.geometry = {
+            "stops": [
+                {"lat": -21.74, "lon": -41.29, "address": "depot"},
+                {"lat": -21.738, "lon": -41.288, "address": "store"},
+                {"lat": -21.74, "lon": -41.29, "address": "depot"},
+            ],
+            "segments": [
+                [[-21.74, -41.29], [-21.739, -41.29], [-21.738, -41.288]],
+                [[-21.738, -41.288], [-21.74, -41.29]],
+            ],
+        }
+
+    def test_route_bounds_have_a_margin(self):
+        """Testing that the bounds cover the route plus the margin"""
+        west, south, east, north = RenderService.route_bounds(self.geometry, 1.25)
+
+        self.assertAlmostEqual(west, -41.2925)
+        self.assertAlmostEqual(east, -41.2855)
+        self.assertAlmostEqual(south, -21.7425)
+        self.assertAlmostEqual(north, -21.7355)
+
+    def test_crop_keeps_only_the_route_area(self):
+        """Testing that only the streets around the route are drawn"""
+        bounds = RenderService.route_bounds(self.geometry, 1.25)
+        cropped = RenderService.crop_graph(self.G, bounds)
+
+        # 7x7 nodes inside the bounds, plus the ring of their neighbours
+        self.assertEqual(len(cropped), 7 * 7 + 4 * 7)
+        self.assertLess(cropped.number_of_edges(), self.G.number_of_edges() / 4)
+
+    def test_map_popups_escape_the_address(self):
+        """Testing that an address with HTML is shown as text on the map"""
+        self.geometry["stops"][1]["address"] = "<img src=x onerror=alert(1)>"
+
+        page = RenderService.map_route(self.geometry).get_root().render()
+
+        self.assertNotIn("<img src=x", page)
+        self.assertIn("&lt;img src=x onerror=alert(1)&gt;", page)
+
+
+class GeometryServiceTest(TestCase):
+    "Tests to check the route geometry sent to the web maps"
+
+    def test_encode_polyline(self):
+        """Testing the encoded polyline against Google's reference example"""
+        self.assertEqual(
+            encode_polyline([(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]),
+            "_p~iF~ps|U_ulLnnqC_mqNvxq`@",
+        )
+
+    def test_douglas_peucker_keeps_only_the_corners(self):
+        """Testing that points along a straight street are dropped"""
+        street = [[-21.75, -41.3 + i * 0.0001] for i in range(11)]
+        corner = street + [[-21.75 + i * 0.0001, -41.299] for i in range(1, 11)]
+
+        self.assertEqual(
+            douglas_peucker(corner, 0.00001),
+            [[-21.75, -41.3], [-21.75, -41.299], [-21.749, -41.299]],
+        )
+        self.assertEqual(douglas_peucker(corner, 0), corner)
+
+    def test_packed_path_round_trip(self):
+        """Testing that a packed path reads back the same and is smaller"""
+        rng = random.Random(0)
+        segments = []
+        lat, lon = -21.75, -41.3
+        for length in [120, 1, 75]:
+            segment = []
+            for _ in range(length):
+                lat = round(lat + rng.uniform(-0.0005, 0.0005), 6)
+                lon = round(lon + rng.uniform(-0.0005, 0.0005), 6)
+                segment.append([lat, lon])
+            segments.append(segment)
+
+        packed = pack_path(segments)
+
+        self.assertEqual(unpack_path(packed), segments)
+        self.assertLess(len(packed), len(json.dumps(segments)) / 2)
+        self.assertEqual(unpack_path(pack_path([])), [])
+
+    def test_coarser_zoom_sends_fewer_points(self):
+        """Testing that the simplification follows the zoom level"""
+        rng = random.Random(0)
+        segment = [
+            [-21.75 + i * 0.0001, -41.3 + rng.uniform(-0.00005, 0.00005)]
+            for i in range(200)
+        ]
+        geometry = {
+            "stops": [
+                {"lat": -21.75, "lon": -41.3, "address": "depot"},
+                {"lat": -21.7301, "lon": -41.3, "address": "store"},
+                {"lat": -21.75, "lon": -41.3, "address": "depot"},
+            ],
+            "segments": [segment, segment[::-1]],
+        }
+
+        def points(zoom):
+            features = route_geojson(geometry, zoom)["features"]
+            return sum(
+                len(feature["geometry"]["coordinates"])
+                for feature in features
+                if feature["geometry"]["type"] == "LineString"
+            )
+
+        self.assertEqual(points(None), 400)
+        self.assertLess(points(12), points(18))
+        self.assertLessEqual(points(18), 400)
+        stops = [
+            feature["properties"]
+            for feature in route_geojson(geometry)["features"]
+            if feature["geometry"]["type"] == "Point"
+        ]
+        self.assertEqual([stop["role"] for stop in stops], ["depot", "delivery"])
+
+
+@override_settings(GEOCODING_RATE_LIMIT=1000, GEOCODING_BACKOFF=0)
+class TrafficServiceTest(TestCase):
+    "Tests to check the travel times that follow the traffic of each hour"
+
+    def setUp(self):
+        self.primary = ROAD_CLASS_INDEX["primary"]
+        self.morning = timezone.make_aware(datetime(2026, 10, 19, 7, 30))
+        return super().setUp()
+
+    def test_peak_hours_slow_the_roads_down(self):
+        """Testing that the stored profiles slow a road down at its peak hours"""
+        TrafficProfileCrud.set_speed_factor("primary", 8, 0.5)
+        times = np.array([60.0, 60.0])
+        classes = np.array([self.primary, ROAD_CLASS_INDEX["other"]])
+
+        peak = TrafficService.edge_durations(
+            times, classes, self.morning.replace(hour=8)
+        )
+        midday = TrafficService.edge_durations(
+            times, classes, self.morning.replace(hour=11)
+        )
+
+        self.assertEqual(peak[0], 120.0)
+        self.assertGreater(peak[1], 60.0)
+        self.assertEqual(midday.tolist(), [60.0, 60.0])
+        with self.assertRaises(ValueError):
+            TrafficProfileCrud.set_speed_factor("primary", 24, 0.5)
+
+    def test_edges_use_the_hour_they_are_entered(self):
+        """Testing that the vectorized durations match driving edge by edge"""
+        rng = np.random.default_rng(0)
+        factors = rng.uniform(0.3, 1.0, (len(ROAD_CLASSES), 24))
+        times = rng.uniform(10, 900, 300)
+        classes = rng.integers(0, len(ROAD_CLASSES), 300)
+
+        durations = TrafficService.edge_durations(times, classes, self.morning, factors)
+
+        clock = 7.5 * 3600
+        for time, road_class, duration in zip(times, classes, durations):
+            expected = time / factors[road_class, int(clock // 3600) % 24]
+            self.assertAlmostEqual(duration, expected)
+            clock += expected
+
+    def test_packed_edges_round_trip(self):
+        """Testing that packed route edges keep their legs, times and road classes"""
+        G = line_graph(4, speed_kph=50)
+        G[1][2][0]["highway"] = "primary"
+        edges = TrafficService.route_edges(G, [[0, 1, 2], [2], [2, 3]])
+
+        unpacked = TrafficService.unpack_edges(TrafficService.pack_edges(edges))
+
+        self.assertEqual(unpacked["legs"].tolist(), [2, 0, 1])
+        self.assertEqual(
+            unpacked["road_class"].tolist(),
+            [ROAD_CLASS_INDEX["other"], self.primary, ROAD_CLASS_INDEX["other"]],
+        )
+        np.testing.assert_allclose(unpacked["travel_time"], [72.0] * 3)
+        self.assertEqual(
+            TrafficService.leg_sums(edges["length"], edges["legs"]).tolist(),
+            [2000.0, 0.0, 1000.0],
+        )
+
+
+class GeocodingServiceTest(TestCase):
+    "Tests to check the geocoding cache stored on the addresses"
+
+    def setUp(self):
+        UserCrud.create(
+            role="Shop",
+            name="Shop User",
+            age=30,
+            email="shopuser@test.com",
+            password="password",
+        )
+        self.store = StoreCrud.create(
+            user_email="shopuser@test.com",
+            name="My Test Store",
+            contact="123456789",
+            registration="987654321",
+            street="Rua Exemplo",
+            number="10",
+            complement="",
+            neighborhood="Centro",
+            city="Macae",
+            state="RJ",
+            cep="27910-000",
+            country="Brasil",
+        )
+        return super().setUp()
+
+    def geocoder(self, *results):
+        geolocator = patch("app.services.geocoding_service.Nominatim").start()
+        self.addCleanup(patch.stopall)
+        geolocator.return_value.geocode.side_effect = list(results)
+        return geolocator.return_value.geocode
+
+    def test_miss_stores_coordinates_and_level(self):
+        """Testing if a geocoded address keeps the coordinates of the query that matched"""
+        geocode = self.geocoder(None, Mock(latitude=-22.37, longitude=-41.78))
+
+        locations, _ = GeocodingService.locate_addresses([self.store.address])
+
+        self.assertEqual(locations, [(-22.37, -41.78)])
+        self.assertEqual(geocode.call_count, 2)
+        address = AddressCrud.read_by_id(self.store.address.id)
+        self.assertEqual(address.geocode_level, "Numb")
+        self.assertIsNotNone(address.geocoded_at)
+
+    def test_hit_skips_geocoder(self):
+        """Testing if addresses already geocoded never reach the geocoder"""
+        AddressCrud.save_geocode(self.store.address, -22.37, -41.78, "Full")
+        geocode = self.geocoder()
+
+        copies = [AddressCrud.read_by_id(self.store.address.id) for _ in range(3)]
+        locations, _ = GeocodingService.locate_addresses(copies)
+
+        self.assertEqual(locations, [(-22.37, -41.78)] * 3)
+        geocode.assert_not_called()
+
+    def test_store_update_invalidates_geocode(self):
+        """Testing if moving a store makes its address be geocoded again"""
+        AddressCrud.save_geocode(self.store.address, -22.37, -41.78, "Full")
+        StoreCrud.update(self.store.id, street="Rua Nova")
+
+        geocode = self.geocoder(Mock(latitude=-22.38, longitude=-41.79))
+        store = StoreCrud.read_by_id(self.store.id)
+        locations, _ = GeocodingService.locate_addresses([store.address])
+
+        self.assertEqual(locations, [(-22.38, -41.79)])
+        geocode.assert_called_once()
+
+    def test_address_not_found_is_cached(self):
+        """Testing that an address no query can find fails without asking again"""
+        geocode = self.geocoder(None, None, None, None)
+        with self.assertRaises(ValueError):
+            GeocodingService.locate_addresses([self.store.address])
+
+        store = StoreCrud.read_by_id(self.store.id)
+        with self.assertRaises(ValueError):
+            GeocodingService.locate_addresses([store.address])
+        self.assertEqual(geocode.call_count, 4)
+
+    def test_failed_queries_are_not_cached(self):
+        """Testing that a geocoder failure is retried on the next trip"""
+        geocode = self.geocoder(*[GeocoderServiceError("down")] * 4)
+        with self.assertRaises(ValueError):
+            GeocodingService.locate_addresses([self.store.address])
+
+        store = StoreCrud.read_by_id(self.store.id)
+        self.assertIsNone(store.address.geocoded_at)
+
+    def test_timeouts_are_retried(self):
+        """Testing if a query that timed out is sent again before falling back"""
+        geocode = self.geocoder(
+            GeocoderTimedOut(), GeocoderTimedOut(), Mock(latitude=1.0, longitude=2.0)
+        )
+        GeocodingService.locate_addresses([self.store.address])
+
+        self.assertEqual(geocode.call_count, 3)
+        self.assertEqual(self.store.address.geocode_level, "Full")
+
+    def test_token_bucket_limits_rate(self):
+        """Testing if the token bucket spaces the requests out"""
+        bucket = TokenBucket(rate=50)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_batch_against_stand_in_geocoder(self):
+        """Testing if concurrent geocoding works over HTTP with the stand-in server"""
+        server = StandInGeocoder(("127.0.0.1", 0), latency=0).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        addresses = [
+            AddressCrud.create(
+                f"Rua {i}", str(i), "", "Centro", "Macae", "RJ", "", "Brasil"
+            )
+            for i in range(6)
+        ]
+
+        with override_settings(GEOCODING_DOMAIN=server.domain, GEOCODING_SCHEME="http"):
+            locations, _ = GeocodingService.locate_addresses(addresses)
+
+        self.assertEqual(server.requests, 6)
+        self.assertEqual(len(set(locations)), 6)
+        for address in addresses:
+            self.assertEqual(AddressCrud.read_by_id(address.id).geocode_level, "Full")
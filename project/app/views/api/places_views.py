@@ -12,9 +12,9 @@ from app.cruds.depot_crud import DepotCrud
 from app.cruds.trip_crud import TripCrud
 from app.cruds.carrier_crud import CarrierCrud
 from app.services.trip_service import TripService
+from app.services.job_service import JobService
 from django.forms.models import model_to_dict
-from app.exception_errors import RangeError, StatusError
-import mpld3
+from app.exception_errors import StatusError, CapacityError
 
 
 class AddressesAPIView(AuthBaseView):
@@ -282,27 +282,54 @@ class DefineTripAPIView(ManagerBaseView):
     def post(self, request, *args, **kwargs):
         try:
             depot = DepotCrud.read_by_id(kwargs["id"])
-            orders = json.loads(request.body).get("orders")
+            data = json.loads(request.body)
             if request.user != depot.user:
                 return self.ErrorJsonResponse("Depot don't match to user!", 401)
-            trip, route_order, fig = TripService.define_trip(depot.id, orders)
-            figure_html = mpld3.fig_to_html(fig)
+            job = JobService.enqueue_trip(
+                request.user,
+                depot.id,
+                data.get("orders"),
+                data.get("strategy"),
+                bool(data.get("render")),
+                data.get("optimize"),
+                TripService.parse_departure(data.get("departure")),
+            )
             return self.SuccessJsonResponse(
-                f"Trip successfully defined!",
-                {
-                    "trip": model_to_dict(trip),
-                    "route_order": route_order,
-                    "figure_html": figure_html,
-                },
+                "Trip planning queued!", JobService.describe(job), 202
             )
         except ValueError as e:
             return self.ErrorJsonResponse(e.args[0])
         except KeyError as e:
             return self.ErrorJsonResponse(e.args[0])
-        except RangeError as e:
+        except StatusError as e:
+            return self.ErrorJsonResponse(e.args[0])
+
+
+class PlanTripsAPIView(ManagerBaseView):
+    def post(self, request, *args, **kwargs):
+        try:
+            depot = DepotCrud.read_by_id(kwargs["id"])
+            data = json.loads(request.body) if request.body else {}
+            if request.user != depot.user:
+                return self.ErrorJsonResponse("Depot don't match to user!", 401)
+            job = JobService.enqueue_plan(
+                request.user,
+                depot.id,
+                data.get("orders"),
+                data.get("trucks"),
+                data.get("strategy"),
+                data.get("optimize"),
+                TripService.parse_departure(data.get("departure")),
+            )
+            return self.SuccessJsonResponse(
+                "Trips planning queued!", JobService.describe(job), 202
+            )
+        except ValueError as e:
             return self.ErrorJsonResponse(e.args[0])
         except StatusError as e:
             return self.ErrorJsonResponse(e.args[0])
+        except CapacityError as e:
+            return self.ErrorJsonResponse(e.args[0])
 
 
 class TripsByDepotAPIView(ManagerBaseView):
@@ -1,6 +1,7 @@
 import json
 from .base_views import ManagerBaseView, AuthBaseView
-from app.cruds.trip_crud import TripCrud
+from app.cruds.trip_crud import TripCrud, TRIP_FIELDS
+from app.cruds.trip_stop_crud import TripStopCrud
 from django.forms.models import model_to_dict
 from app.exception_errors import (
     StatusError,
@@ -12,12 +13,23 @@ from app.cruds.delivery_crud import DeliveryCrud
 from app.cruds.truck_crud import TruckCrud
 from app.cruds.depot_crud import DepotCrud
 from app.services.trip_service import TripService
+from app.services.job_service import JobService
+from app.services.render_service import RenderService
+from app.services.geometry_service import (
+    MAX_ZOOM,
+    MIN_ZOOM,
+    route_geojson,
+    route_polylines,
+    trip_geometry,
+)
+from django.http import FileResponse
+from app.cruds.trip_job_crud import TripJobCrud
 
 
 class TripsAPIView(ManagerBaseView):
     def get(self, request, *args, **kwargs):
         try:
-            trips = TripCrud.read().values()
+            trips = TripCrud.read().values(*TRIP_FIELDS)
             return self.SuccessJsonResponse(
                 "Trips successfully retrieved!", list(trips)
             )
@@ -35,18 +47,39 @@ class TripsAPIView(ManagerBaseView):
             )
 
         try:
-            trip, _, _ = TripService.define_trip(data["depot_id"], data["orders_list"])
+            job = JobService.enqueue_trip(
+                user,
+                data["depot_id"],
+                data["orders_list"],
+                optimize=data.get("optimize"),
+                departure=TripService.parse_departure(data.get("departure")),
+            )
             return self.SuccessJsonResponse(
-                "Trip successfully created", model_to_dict(trip), 201
+                "Trip planning queued!", JobService.describe(job), 202
             )
         except KeyError as e:
             return self.ErrorJsonResponse(e.args[0])
+        except StatusError as e:
+            return self.ErrorJsonResponse(e.args[0])
         except PermissionError as e:
             return self.ErrorJsonResponse(e.args[0])
         except ValueError as e:
             return self.ErrorJsonResponse(e.args[0])
 
 
+class TripJobAPIView(ManagerBaseView):
+    def get(self, request, *args, **kwargs):
+        try:
+            job = TripJobCrud.read_by_id(kwargs["id"])
+            if request.user != job.user:
+                return self.ErrorJsonResponse("Trip job don't match to user!", 401)
+            return self.SuccessJsonResponse(
+                "Trip job successfully retrieved!", JobService.describe(job)
+            )
+        except ValueError as e:
+            return self.ErrorJsonResponse(e.args[0], 404)
+
+
 class TripAPIView(AuthBaseView):
     def get(self, request, *args, **kwargs):
         try:
@@ -59,6 +92,16 @@ class TripAPIView(AuthBaseView):
                 return self.ErrorJsonResponse(
                     "User's depots don't match to the trip!", 401
                 )
+            dict_trip["stops"] = [
+                {
+                    "position": stop.position,
+                    "address": stop.address_id,
+                    "order": stop.order_id,
+                    "leg_distance_km": round(stop.leg_distance_m / 1000, 2),
+                    "leg_duration_min": round(stop.leg_duration_s / 60, 1),
+                }
+                for stop in TripStopCrud.read_by_trip(trip.id)
+            ]
             return self.SuccessJsonResponse("Trip successfully retrieved!", dict_trip)
         except ValueError as e:
             return self.ErrorJsonResponse(e.args[0])
@@ -84,11 +127,66 @@ class TripAPIView(AuthBaseView):
             return self.ErrorJsonResponse(e.args[0])
 
 
+class TripRouteAPIView(AuthBaseView):
+    formats = {"geojson": route_geojson, "polyline": route_polylines}
+
+    def get(self, request, *args, **kwargs):
+        try:
+            trip = TripCrud.read_by_id(kwargs["id"])
+            if request.user != trip.origin_depot.user:
+                return self.ErrorJsonResponse(
+                    "User's depots don't match to the trip!", 401
+                )
+            geometry = trip_geometry(trip)
+            if geometry is None:
+                return self.ErrorJsonResponse("Trip has no route", 404)
+
+            route_format = request.GET.get("format", "geojson")
+            if route_format not in self.formats:
+                return self.ErrorJsonResponse(
+                    f"Format must be one of: {', '.join(self.formats)}"
+                )
+
+            zoom = request.GET.get("zoom")
+            if zoom is not None:
+                if not zoom.isdigit() or not MIN_ZOOM <= int(zoom) <= MAX_ZOOM:
+                    return self.ErrorJsonResponse(
+                        f"Zoom must be an integer from {MIN_ZOOM} to {MAX_ZOOM}"
+                    )
+                zoom = int(zoom)
+
+            return self.SuccessJsonResponse(
+                "Trip route successfully retrieved!",
+                self.formats[route_format](geometry, zoom),
+            )
+        except ValueError as e:
+            return self.ErrorJsonResponse(e.args[0])
+
+
+class TripRouteRenderAPIView(AuthBaseView):
+    def get(self, request, *args, **kwargs):
+        try:
+            trip = TripCrud.read_by_id(kwargs["id"])
+            if request.user != trip.origin_depot.user:
+                return self.ErrorJsonResponse(
+                    "User's depots don't match to the trip!", 401
+                )
+            path = RenderService.render(
+                trip,
+                kwargs["kind"],
+                request.GET.get("preset"),
+                request.GET.get("area", "route"),
+            )
+            return FileResponse(open(path, "rb"))
+        except ValueError as e:
+            return self.ErrorJsonResponse(e.args[0])
+
+
 class TripsByStatusAPIView(ManagerBaseView):
     def get(self, request, *args, **kwargs):
         status = json.loads(request.body).get("status")
         try:
-            trips = TripCrud.read_by_status(status).values()
+            trips = TripCrud.read_by_status(status).values(*TRIP_FIELDS)
             if not trips:
                 return self.ErrorJsonResponse("Trips not founded!", 404)
 
@@ -181,11 +279,16 @@ class SimulateTripAPIView(AuthBaseView):
                 return self.ErrorJsonResponse("User's depots don't match to trip!", 401)
             truck = TruckCrud.read_by_plate(data["truck_plate"])
             simulation = TripService.simulate_trip(
-                trip.id, truck.plate, data["traffic_status"]
+                trip.id,
+                truck.plate,
+                data.get("traffic_status"),
+                TripService.parse_departure(data.get("departure")),
             )
             return self.SuccessJsonResponse("Simulation has been finished!", simulation)
         except StatusError as e:
             return self.ErrorJsonResponse(e.args[0])
+        except ValueError as e:
+            return self.ErrorJsonResponse(e.args[0])
 
 
 class CancelTripAPIView(ManagerBaseView):
@@ -151,3 +151,87 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Defining custom AUTH_USER
 AUTH_USER_MODEL = "app.Usuario"
+
+# Routing
+# Road graphs downloaded from OpenStreetMap are cached on disk, one directory per city
+
+ROUTING_GRAPH_CACHE_DIR = os.getenv(
+    "ROUTING_GRAPH_CACHE_DIR", os.path.join(BASE_DIR, "cache", "graphs")
+)
+
+# Seconds before a cached graph is downloaded again (0 keeps it forever)
+ROUTING_GRAPH_CACHE_TTL = int(os.getenv("ROUTING_GRAPH_CACHE_TTL", 60 * 60 * 24 * 30))
+
+# Never download road graphs: cities must be imported with import_osm_graph
+ROUTING_GRAPH_OFFLINE = os.getenv("ROUTING_GRAPH_OFFLINE", "") == "1"
+
+# Trips leaving the depot's city are routed on square tiles of this many
+# degrees, each cached on its own, with this margin (degrees) around the stops
+ROUTING_TILE_SIZE = float(os.getenv("ROUTING_TILE_SIZE", 0.1))
+ROUTING_TILE_MARGIN = float(os.getenv("ROUTING_TILE_MARGIN", 0.02))
+
+# Tiles kept in memory by each process; the least recently used go first
+ROUTING_TILE_CACHE_SIZE = int(os.getenv("ROUTING_TILE_CACHE_SIZE", 16))
+
+# Routes kept by each process to reuse when the same stops are planned
+# again; the least recently used go first. 0 turns the cache off
+ROUTING_ROUTE_CACHE_SIZE = int(os.getenv("ROUTING_ROUTE_CACHE_SIZE", 128))
+
+# Point-to-point search used between stops: dijkstra, astar or bidirectional
+ROUTING_SEARCH_STRATEGY = os.getenv("ROUTING_SEARCH_STRATEGY", "dijkstra")
+
+# Seconds the 2-opt / Or-opt local search may spend improving a trip's stop
+# order; 0 keeps the nearest neighbour order
+ROUTING_TOUR_TIME_BUDGET = float(os.getenv("ROUTING_TOUR_TIME_BUDGET", 2))
+
+# Trips with up to this many stops get the optimal order (Held-Karp) instead of
+# the nearest neighbour + local search heuristic
+ROUTING_EXACT_MAX_STOPS = int(os.getenv("ROUTING_EXACT_MAX_STOPS", 14))
+
+# Processes sharing the work of the stop distance matrix (0 uses every CPU core)
+ROUTING_MATRIX_WORKERS = int(os.getenv("ROUTING_MATRIX_WORKERS", 1))
+
+# Speed (km/h) of the streets without a travel time in the cached graph
+ROUTING_DEFAULT_SPEED_KMH = float(os.getenv("ROUTING_DEFAULT_SPEED_KMH", 40))
+
+# What planned routes minimize by default: distance or (driving) time
+ROUTING_OPTIMIZE = os.getenv("ROUTING_OPTIMIZE", "distance")
+
+# Route images and maps, rendered on their first request and named by a hash
+# of what they show
+ROUTING_RENDER_DIR = os.getenv(
+    "ROUTING_RENDER_DIR", os.path.join(BASE_DIR, "static", "routes")
+)
+
+# Size of the route images: thumbnail, standard or print
+ROUTING_RENDER_PRESET = os.getenv("ROUTING_RENDER_PRESET", "standard")
+
+# Streets drawn around the route, as a share of the route's width and height
+ROUTING_RENDER_MARGIN = float(os.getenv("ROUTING_RENDER_MARGIN", 0.15))
+
+# Seconds a trip job may stay running before it is failed as stopped with its
+# worker (0 never fails it)
+ROUTING_JOB_TIMEOUT = int(os.getenv("ROUTING_JOB_TIMEOUT", 60 * 30))
+
+# Geocoding
+# Nominatim (or a compatible stand-in, e.g. GEOCODING_DOMAIN=localhost:8080 with
+# GEOCODING_SCHEME=http) used to find the coordinates of the addresses
+
+GEOCODING_DOMAIN = os.getenv("GEOCODING_DOMAIN", "nominatim.openstreetmap.org")
+GEOCODING_SCHEME = os.getenv("GEOCODING_SCHEME", "https")
+GEOCODING_TIMEOUT = float(os.getenv("GEOCODING_TIMEOUT", 20))
+
+# Requests per second shared by every geocoding thread (the public Nominatim
+# usage policy allows at most one)
+GEOCODING_RATE_LIMIT = float(os.getenv("GEOCODING_RATE_LIMIT", 1))
+
+# Addresses of a trip geocoded at the same time
+GEOCODING_WORKERS = int(os.getenv("GEOCODING_WORKERS", 4))
+
+# Retries of a query that timed out or was refused, waiting GEOCODING_BACKOFF
+# seconds before the first one and doubling the wait after each
+GEOCODING_RETRIES = int(os.getenv("GEOCODING_RETRIES", 3))
+GEOCODING_BACKOFF = float(os.getenv("GEOCODING_BACKOFF", 1))
+
+# Seconds an address that could not be found is not looked up again
+GEOCODING_NEGATIVE_TTL = int(os.getenv("GEOCODING_NEGATIVE_TTL", 60 * 60 * 24))
@@ -15,6 +15,7 @@ from app.views.api.places_views import (
     CarrierApiView,
     CarriersApiView,
     DefineTripAPIView,
+    PlanTripsAPIView,
     TripsByDepotAPIView,
 )
 
@@ -23,6 +24,9 @@ from app.views.api.truck_views import TrucksApiView, TruckApiView, TruckByCarrie
 from app.views.api.trip_views import (
     TripsAPIView,
     TripAPIView,
+    TripJobAPIView,
+    TripRouteAPIView,
+    TripRouteRenderAPIView,
     TripsByStatusAPIView,
     TripsRemainingDeliveriesAPIView,
     StartTripsAPIView,
@@ -97,6 +101,11 @@ urlpatterns = [
         DefineTripAPIView.as_view(),
         name="Depot Define Trip Route",
     ),
+    path(
+        "api/depot/<int:id>/plan-trips",
+        PlanTripsAPIView.as_view(),
+        name="Depot Plan Trips Route",
+    ),
     path(
         "api/depot/<int:id>/trips",
         TripsByDepotAPIView.as_view(),
@@ -139,6 +148,17 @@ urlpatterns = [
         "api/filtered-trips", TripsByStatusAPIView.as_view(), name="Filtered Trip Route"
     ),
     path("api/trip/<int:id>", TripAPIView.as_view(), name="Trip Route"),
+    path("api/trip-jobs/<int:id>", TripJobAPIView.as_view(), name="Trip Job Route"),
+    path(
+        "api/trip/<int:id>/route",
+        TripRouteAPIView.as_view(),
+        name="Trip Route Geometry",
+    ),
+    path(
+        "api/trip/<int:id>/route/<str:kind>",
+        TripRouteRenderAPIView.as_view(),
+        name="Trip Route Render",
+    ),
     path(
         "api/trip/<int:id>/remaining-deliveries",
         TripsRemainingDeliveriesAPIView.as_view(),
@@ -0,0 +1,60 @@
+// Draws the route of a trip on a Leaflet map, from /api/trip/<id>/route.
+// The legs are simplified for the current zoom and fetched again, in more
+// detail, when the user zooms in.
+const ROUTE_COLORS = ["#00FFFF", "#FFA500", "#00FF00", "#FF00FF", "#FFFF00", "#0000FF"];
+
+// Leaflet inserts string popups as HTML: addresses are typed by the users
+function textPopup(text) {
+    const popup = document.createElement("span");
+    popup.textContent = text;
+    return popup;
+}
+
+async function drawTripRoute(elementId, tripId) {
+    const map = L.map(elementId).setView([0, 0], 13);
+    L.tileLayer("https://tile.openstreetmap.org/{z}/{x}/{y}.png", {
+        maxZoom: 19,
+        attribution: '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a>',
+    }).addTo(map);
+
+    let routeLayer = null;
+    let loadedZoom = null;
+
+    async function loadRoute(zoom) {
+        const res = await fetch(`/api/trip/${tripId}/route?format=geojson&zoom=${zoom}`);
+        const result = await res.json();
+        if (!res.ok) throw new Error(result.error || "Erro ao carregar a rota.");
+
+        const layer = L.geoJSON(result.data, {
+            style: (feature) => ({
+                color: ROUTE_COLORS[feature.properties.leg % ROUTE_COLORS.length],
+                weight: 5,
+                opacity: 0.7,
+            }),
+            pointToLayer: (feature, latlng) => L.marker(latlng),
+            onEachFeature: (feature, featureLayer) => {
+                const stop = feature.properties;
+                if (stop.role === "depot") {
+                    featureLayer.bindPopup(textPopup(`Origem/Fim: ${stop.address}`));
+                } else if (stop.role === "delivery") {
+                    featureLayer.bindPopup(textPopup(`Parada ${stop.stop}: ${stop.address}`));
+                }
+            },
+        });
+
+        if (routeLayer) map.removeLayer(routeLayer);
+        routeLayer = layer.addTo(map);
+        loadedZoom = zoom;
+        return layer;
+    }
+
+    const layer = await loadRoute(13);
+    map.fitBounds(layer.getBounds(), { padding: [20, 20] });
+
+    map.on("zoomend", () => {
+        // Coarser zooms can keep the more detailed legs already loaded
+        if (map.getZoom() > loadedZoom) loadRoute(map.getZoom());
+    });
+
+    return map;
+}